@@ -0,0 +1,344 @@
+"""
+Threat Detector Cluster Client
+------------------------------
+Routes /analyze calls across several shared-nothing threat detector nodes:
+
+1. Consistent hashing on the normalized input, so a repeated input lands on
+   the node that already holds its cached LLM verdict
+2. Health-based ejection: a node that can't be reached, returns a 5xx or
+   fails its /health probe is taken out of the ring, and let back in once
+   healthy again
+3. Rebalancing on membership change: only the keys owned by a node that
+   leaves or joins move to another node
+4. A /stats merger that adds up counts and latency histograms across nodes
+"""
+
+import bisect
+import hashlib
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import unquote
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Time reserved for a detector's reply to travel back when propagating deadlines
+DEADLINE_MARGIN_SECONDS = 1.0
+
+
+def normalize_input(input_text: str) -> str:
+    """Same normalization as threat_detector.normalize_input, so routing keys match verdict cache keys."""
+    decoded_input = unquote(input_text)
+    normalized_input = decoded_input.replace('+', ' ')
+    return re.sub(r'\s+', ' ', normalized_input).strip()
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes for an even key spread."""
+
+    def __init__(self, nodes: List[str], vnodes: int = 160):
+        self.nodes = list(nodes)
+        self.ring = sorted(
+            (self.hash_key(f'{node}#{replica}'), node)
+            for node in self.nodes
+            for replica in range(vnodes)
+        )
+        self.positions = [position for position, _ in self.ring]
+
+    @staticmethod
+    def hash_key(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode('utf-8', 'surrogatepass')).digest()[:8], 'big')
+
+    def lookup(self, key: str) -> List[str]:
+        """Return distinct nodes in ring order starting at the key's owner (owner first, then failovers)."""
+        if not self.ring:
+            return []
+
+        start = bisect.bisect(self.positions, self.hash_key(key)) % len(self.ring)
+        ordered = []
+        for offset in range(len(self.ring)):
+            node = self.ring[(start + offset) % len(self.ring)][1]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+
+class DetectorCluster:
+    """
+    Client for a set of threat detector nodes (base URLs such as http://host:8081).
+
+    A node is ejected when it refuses or drops a connection, times out while
+    connecting, returns a 5xx, or fails its /health probe. A read timeout is
+    not held against it: the request ran out of budget, not the node. It stays
+    out for at least ejection_seconds, and is re-admitted by the background
+    health checker once it answers again. Every ejection or re-admission
+    rebuilds the ring from the healthy members.
+    """
+
+    def __init__(self, nodes: List[str], vnodes: int = 160, ejection_seconds: float = 30.0,
+                 health_interval: float = 5.0, request_timeout: float = 90.0):
+        self.vnodes = vnodes
+        self.ejection_seconds = ejection_seconds
+        self.health_interval = health_interval
+        self.request_timeout = request_timeout
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+
+        self.nodes: List[str] = []
+        self.ejected_until: Dict[str, float] = {}
+        self.membership_changes = 0
+        self.ring = HashRing([], vnodes)
+        self.health_thread: Optional[threading.Thread] = None
+        self.set_nodes(nodes)
+
+    # Membership
+
+    def set_nodes(self, nodes: List[str]):
+        """Replace cluster membership; only keys owned by added/removed nodes move."""
+        with self.lock:
+            self.nodes = [node.rstrip('/') for node in nodes]
+            self.ejected_until = {node: until for node, until in self.ejected_until.items() if node in self.nodes}
+            self.rebuild_ring()
+
+            # A single node has nowhere to fail over to, so it is never probed
+            if len(self.nodes) > 1 and self.health_interval > 0 and self.health_thread is None:
+                self.health_thread = threading.Thread(target=self.health_check_loop, name='detector-health', daemon=True)
+                self.health_thread.start()
+
+    def rebuild_ring(self):
+        """Rebuild the ring from healthy nodes. Caller must hold self.lock."""
+        healthy = [node for node in self.nodes if node not in self.ejected_until]
+        self.ring = HashRing(healthy, self.vnodes)
+        self.membership_changes += 1
+        logger.info(f"Detector ring rebuilt: {len(healthy)}/{len(self.nodes)} nodes healthy")
+
+    def eject(self, node: str, reason: str):
+        with self.lock:
+            # A single node has nowhere to fail over to, so it is never ejected
+            if len(self.nodes) <= 1 or node not in self.nodes:
+                return
+            newly_ejected = node not in self.ejected_until
+            self.ejected_until[node] = time.monotonic() + self.ejection_seconds
+            if newly_ejected:
+                logger.warning(f"Ejecting detector node {node}: {reason}")
+                self.rebuild_ring()
+
+    def readmit(self, node: str):
+        with self.lock:
+            if node in self.ejected_until and time.monotonic() >= self.ejected_until[node]:
+                del self.ejected_until[node]
+                logger.info(f"Re-admitting detector node {node}")
+                self.rebuild_ring()
+
+    def health_check_loop(self):
+        """Probe every node's /health; eject failures, re-admit recovered nodes."""
+        while True:
+            time.sleep(self.health_interval)
+            # Snapshot under the lock; set_nodes may replace membership while probes run
+            with self.lock:
+                nodes = list(self.nodes)
+                ejected = set(self.ejected_until)
+            for node in nodes:
+                try:
+                    healthy = requests.get(f'{node}/health', timeout=2).status_code == 200
+                except requests.exceptions.RequestException:
+                    healthy = False
+
+                if healthy:
+                    self.readmit(node)
+                elif node not in ejected:
+                    self.eject(node, 'health check failed')
+
+    def route(self, input_text: str) -> List[str]:
+        """Return candidate nodes for an input: its owner first, then failover order."""
+        with self.lock:
+            ring = self.ring
+            nodes = list(self.nodes)
+        # With every node ejected, still try them all rather than failing outright
+        return ring.lookup(normalize_input(input_text)) or nodes
+
+    # Requests
+
+    def analyze(self, analysis_request: Dict) -> requests.Response:
+        """
+        POST to the owning node's /analyze, failing over along the ring on errors.
+
+        All attempts share one request_timeout budget. Each node is told how much
+        of it remains via X-Request-Timeout-Ms, less a small margin for the reply
+        to get back here, so it can shed work it cannot finish in time.
+        """
+        deadline = time.monotonic() + self.request_timeout
+        last_error: Optional[Exception] = None
+
+        for node in self.route(analysis_request.get('input', '')):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            headers = {'X-Request-Timeout-Ms': str(int(max(0.0, remaining - DEADLINE_MARGIN_SECONDS) * 1000))}
+            if analysis_request.get('ip_address'):
+                # Honored only if this webapp is in the detector's TRUSTED_FORWARDERS
+                headers['X-Client-IP'] = analysis_request['ip_address']
+            try:
+                response = self.session.post(f'{node}/analyze', json=analysis_request,
+                                             headers=headers, timeout=remaining)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout) as e:
+                self.eject(node, str(e))
+                last_error = e
+                continue
+            except requests.exceptions.RequestException as e:
+                # A read timeout only means this request outlived its budget (e.g. a slow LLM);
+                # the node itself is up, so it stays in the ring
+                last_error = e
+                continue
+
+            if response.status_code >= 500:
+                self.eject(node, f'HTTP {response.status_code}')
+                last_error = requests.exceptions.HTTPError(f'{node} returned {response.status_code}', response=response)
+                continue
+
+            return response
+
+        raise last_error or requests.exceptions.ConnectionError('No threat detector node answered in time')
+
+    def merged_stats(self) -> Dict:
+        """Fetch /stats from every node concurrently and merge them."""
+        def fetch(node):
+            try:
+                response = requests.get(f'{node}/stats', timeout=10)
+                if response.status_code == 200:
+                    return node, response.json(), None
+                return node, None, f'HTTP {response.status_code}'
+            except (requests.exceptions.RequestException, ValueError) as e:
+                return node, None, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.nodes))) as pool:
+            results = list(pool.map(fetch, list(self.nodes)))
+
+        merged = merge_detector_stats([stats for _, stats, _ in results if stats])
+        with self.lock:
+            merged['cluster'] = {
+                'nodes': [
+                    {
+                        'url': node,
+                        'node_id': stats.get('node_id') if stats else None,
+                        'healthy': node not in self.ejected_until,
+                        'total_requests': stats.get('total_requests', 0) if stats else None,
+                        'error': error
+                    }
+                    for node, stats, error in results
+                ],
+                'healthy_nodes': len(self.nodes) - len(self.ejected_until),
+                'total_nodes': len(self.nodes),
+                'membership_changes': self.membership_changes
+            }
+        return merged
+
+
+def merge_detector_stats(per_node: List[Dict]) -> Dict:
+    """
+    Merge threat detector /stats responses.
+
+    Counts and histogram buckets are summed, min/max are combined, and the
+    average processing time is weighted by each node's request count.
+    """
+    total = sum(stats.get('total_requests', 0) for stats in per_node)
+    threats_blocked = sum(stats.get('threats_blocked', 0) for stats in per_node)
+    safe_inputs = sum(stats.get('safe_inputs', 0) for stats in per_node)
+    ai_calls = sum(stats.get('llm_usage_metrics', {}).get('total_llm_calls', 0) for stats in per_node)
+
+    active = [stats for stats in per_node if stats.get('total_requests')]
+    metrics = [stats.get('performance_metrics', {}) for stats in active]
+    weighted_time = sum(m.get('avg_processing_time', 0.0) * s['total_requests'] for m, s in zip(metrics, active))
+
+    histogram = None
+    for stats in per_node:
+        node_histogram = stats.get('processing_time_histogram')
+        if not node_histogram:
+            continue
+        if histogram is None:
+            histogram = {'buckets': list(node_histogram['buckets']), 'counts': list(node_histogram['counts'])}
+        elif node_histogram['buckets'] == histogram['buckets']:
+            histogram['counts'] = [a + b for a, b in zip(histogram['counts'], node_histogram['counts'])]
+        else:
+            logger.warning(f"Skipping histogram from node {stats.get('node_id')}: bucket bounds differ")
+
+    admission_fields = ('max_concurrency', 'max_queue', 'active', 'queued', 'admitted', 'shed_total', 'queue_wait_total')
+    admission = {
+        field: sum(stats.get('admission', {}).get(field, 0) for stats in per_node)
+        for field in admission_fields
+    }
+    admission['queue_wait_max'] = max(
+        (stats.get('admission', {}).get('queue_wait_max', 0.0) for stats in per_node), default=0.0
+    )
+    admission['shed'] = {}
+    for stats in per_node:
+        for reason, count in stats.get('admission', {}).get('shed', {}).items():
+            admission['shed'][reason] = admission['shed'].get(reason, 0) + count
+
+    cache_fields = ('entries', 'max_entries', 'hits', 'misses')
+    verdict_cache = {
+        field: sum(stats.get('verdict_cache', {}).get(field, 0) for stats in per_node)
+        for field in cache_fields
+    }
+
+    shadow_fields = ('sampled', 'completed', 'agreed', 'disagreed', 'candidate_errors',
+                     'dropped_backlog', 'dropped_busy', 'pending')
+    shadow = {
+        field: sum(stats.get('shadow', {}).get(field, 0) for stats in per_node)
+        for field in shadow_fields
+    }
+    compared = shadow['agreed'] + shadow['disagreed']
+    shadow['agreement_rate'] = shadow['agreed'] / compared * 100 if compared else None
+
+    # Inputs are partitioned across nodes by the hash ring, so distinct inputs add up; client IPs
+    # are not, so the largest node's distinct-IP estimate is only a lower bound for the cluster
+    node_telemetry = [stats.get('telemetry', {}) for stats in per_node]
+    telemetry = {
+        field: sum(node.get(field, 0) for node in node_telemetry)
+        for field in ('total_processing_time', 'distinct_inputs_estimate', 'memory_bytes', 'max_bytes')
+    }
+    telemetry['distinct_ips_estimate'] = max((node.get('distinct_ips_estimate', 0) for node in node_telemetry), default=0)
+    telemetry['detections_by_type'] = {}
+    top_ips = {}
+    for node in node_telemetry:
+        for detection_type, count in node.get('detections_by_type', {}).items():
+            telemetry['detections_by_type'][detection_type] = telemetry['detections_by_type'].get(detection_type, 0) + count
+        for entry in node.get('top_ips', []):
+            top_ips[entry['ip_address']] = top_ips.get(entry['ip_address'], 0) + entry['requests_estimate']
+    top_k = max((len(node.get('top_ips', [])) for node in node_telemetry), default=0)
+    telemetry['top_ips'] = [
+        {'ip_address': ip, 'requests_estimate': count}
+        for ip, count in sorted(top_ips.items(), key=lambda item: -item[1])[:top_k]
+    ]
+
+    return {
+        'service': 'advanced-security',
+        'status': 'healthy' if per_node else 'unavailable',
+        'detection_mode': 'llm-based',
+        'total_requests': total,
+        'threats_blocked': threats_blocked,
+        'safe_inputs': safe_inputs,
+        'threat_detection_rate': (threats_blocked / max(total, 1)) * 100,
+        'llm_enabled': True,
+        'performance_metrics': {
+            'avg_processing_time': weighted_time / total if total else 0.0,
+            'min_processing_time': min((m.get('min_processing_time', 0.0) for m in metrics), default=0.0),
+            'max_processing_time': max((m.get('max_processing_time', 0.0) for m in metrics), default=0.0)
+        },
+        'llm_usage_metrics': {
+            'total_llm_calls': ai_calls
+        },
+        'processing_time_histogram': histogram,
+        'verdict_cache': verdict_cache,
+        'admission': admission,
+        'shadow': shadow,
+        'telemetry': telemetry
+    }
@@ -0,0 +1,29 @@
+"""
+Gunicorn production serving profile for the authentication web application.
+
+Run from this directory (gunicorn loads ./gunicorn.conf.py automatically):
+    gunicorn login_app:app
+
+Each login blocks on the threat detector, so each worker process runs a
+pool of threads. Scale with WEB_CONCURRENCY (processes) and WEB_THREADS.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '3000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# gunicorn switches to the gthread worker whenever threads > 1
+threads = int(os.getenv('WEB_THREADS', '8'))
+
+# The detector call itself times out after 90s
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# The tracker singleton is created lazily per process, so preloading is safe
+preload_app = os.getenv('PRELOAD_APP', 'false').lower() == 'true'
+
+accesslog = os.getenv('ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
@@ -10,22 +10,54 @@ Flask-based web application that provides:
 """
 
 from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, session
+from werkzeug.exceptions import RequestEntityTooLarge
 import requests
 import json
 import logging
 import os
+import sys
+import threading
 from datetime import datetime
-import sqlite3
+
+from detector_cluster import DetectorCluster
+
+# storage.py and profiler.py are shared with the threat detector and live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from profiler import install_profiler  # noqa: E402
+from storage import open_storage  # noqa: E402
 
 # Flask application setup
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
 
+# Input size limits - the body cap is enforced by Flask before form parsing
+MAX_REQUEST_BYTES = int(os.getenv('WEBAPP_MAX_REQUEST_BYTES', 16 * 1024))
+MAX_FIELD_CHARS = int(os.getenv('MAX_FIELD_CHARS', 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Opt-in sampling profiler: /admin/profile and PROFILER_SIGNAL (see profiler.py)
+install_profiler(app, 'login_app')
+
 # Threat detector service configuration
 THREAT_DETECTOR_HOST = os.getenv('THREAT_DETECTOR_HOST', 'localhost')
 THREAT_DETECTOR_PORT = os.getenv('THREAT_DETECTOR_PORT', '8081')
 SECURITY_DETECTION_URL = os.getenv('THREAT_DETECTOR_URL', f'http://{THREAT_DETECTOR_HOST}:{THREAT_DETECTOR_PORT}/analyze')
-SECURITY_METRICS_URL = SECURITY_DETECTION_URL.replace('/analyze', '/stats')
+
+# Detector cluster: comma-separated node base URLs, e.g. http://10.0.0.5:8081,http://10.0.0.6:8081
+# Defaults to the single detector above.
+THREAT_DETECTOR_NODES = [
+    node.strip() for node in os.getenv('THREAT_DETECTOR_NODES', '').split(',') if node.strip()
+] or [SECURITY_DETECTION_URL.rsplit('/analyze', 1)[0]]
+HASH_RING_VNODES = int(os.getenv('HASH_RING_VNODES', 160))
+NODE_EJECTION_SECONDS = float(os.getenv('NODE_EJECTION_SECONDS', 30))
+NODE_HEALTH_INTERVAL = float(os.getenv('NODE_HEALTH_INTERVAL', 5))
+# Membership set through PUT /api/detector-nodes is written here so every worker process picks it up.
+# Once written it overrides THREAT_DETECTOR_NODES; delete the file to fall back to the variable.
+DETECTOR_NODES_FILE = os.getenv('DETECTOR_NODES_FILE', os.path.join(os.getenv('DATA_DIR', 'data'), 'detector_nodes.json'))
+# Required in X-Admin-Token for /api/detector-nodes; when unset the endpoint only answers localhost
+DETECTOR_ADMIN_TOKEN = os.getenv('DETECTOR_ADMIN_TOKEN', '')
+# Total time budget for a login's threat analysis, propagated to the detector as a deadline
+DETECTOR_TIMEOUT_SECONDS = float(os.getenv('DETECTOR_TIMEOUT_SECONDS', 90))
 
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
@@ -38,23 +70,56 @@ class AuthenticationTracker:
 
     Handles:
     - Recording login attempts
-    - Forwarding attempts to threat detector service
+    - Forwarding attempts to the threat detector cluster (consistent-hash routed)
     - Storing results in local database
     - Tracking authentication events in memory
     """
 
     def __init__(self):
         """Initialize the authentication tracker."""
+        self.detectors = DetectorCluster(
+            THREAT_DETECTOR_NODES,
+            vnodes=HASH_RING_VNODES,
+            ejection_seconds=NODE_EJECTION_SECONDS,
+            health_interval=NODE_HEALTH_INTERVAL,
+            request_timeout=DETECTOR_TIMEOUT_SECONDS
+        )
+        self.nodes_file_mtime = None
+        self.sync_detector_nodes()
+        self.storage = open_storage('web_sessions.db')
         self.setup_database()
 
-    def setup_database(self):
-        """Create SQLite database and table for storing login attempts."""
-        os.makedirs('data', exist_ok=True)
+    def sync_detector_nodes(self):
+        """Apply membership from DETECTOR_NODES_FILE if another worker has rewritten it since the last check."""
+        try:
+            mtime = os.stat(DETECTOR_NODES_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self.nodes_file_mtime:
+            return
 
-        conn = sqlite3.connect('data/web_sessions.db')
-        cursor = conn.cursor()
+        try:
+            with open(DETECTOR_NODES_FILE) as f:
+                nodes = json.load(f)['nodes']
+            self.detectors.set_nodes(nodes)
+            self.nodes_file_mtime = mtime
+        except Exception as e:
+            logger.error(f"Ignoring unreadable {DETECTOR_NODES_FILE}: {e}")
+
+    def save_detector_nodes(self, nodes):
+        """Write membership for all workers (atomically, so readers never see a partial file) and apply it here."""
+        directory = os.path.dirname(DETECTOR_NODES_FILE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_file = f'{DETECTOR_NODES_FILE}.{os.getpid()}.tmp'
+        with open(temporary_file, 'w') as f:
+            json.dump({'nodes': nodes}, f)
+        os.replace(temporary_file, DETECTOR_NODES_FILE)
+        self.sync_detector_nodes()
 
-        cursor.execute('''
+    def setup_database(self):
+        """Create the table for storing login attempts."""
+        self.storage.create_schema(['''
             CREATE TABLE IF NOT EXISTS login_sessions (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -65,10 +130,7 @@ class AuthenticationTracker:
                 login_blocked BOOLEAN DEFAULT 0,
                 threat_analysis TEXT
             )
-        ''')
-
-        conn.commit()
-        conn.close()
+        '''])
 
     def record_attempt(self, username, password, ip_address):
         """
@@ -81,10 +143,11 @@ class AuthenticationTracker:
         4. Determine whether to allow or block the login
         5. Store the result in both memory and database
         """
+        # Only clipped fields are kept; the detector sees them in full, so a payload in the tail is never missed
         attempt_data = {
             'timestamp': datetime.now().isoformat(),
-            'username': username,
-            'password': password,
+            'username': username[:MAX_FIELD_CHARS],
+            'password': password[:MAX_FIELD_CHARS],
             'ip_address': ip_address,
             'threat_analysis': None,
             'threat_detected': False,
@@ -98,12 +161,9 @@ class AuthenticationTracker:
                 'ip_address': ip_address
             }
 
-            # Send request to threat detector API
-            response = requests.post(
-                SECURITY_DETECTION_URL,
-                json=analysis_request,
-                timeout=90
-            )
+            # Send request to the detector node that owns this input
+            self.sync_detector_nodes()
+            response = self.detectors.analyze(analysis_request)
 
             # Process threat analysis response
             if response.status_code == 200:
@@ -112,10 +172,20 @@ class AuthenticationTracker:
                 attempt_data['threat_detected'] = security_analysis.get('threat_detected', False)
                 attempt_data['login_blocked'] = False  # Never block login
 
+                if security_analysis.get('degraded'):
+                    logger.warning(f"Degraded verdict for {ip_address}: detector shed the LLM call ({security_analysis.get('shed_reason')})")
+
                 if security_analysis.get('threat_detected', False):
                     logger.warning(f"Threat detected from {ip_address}: {security_analysis.get('explanation', 'Threat detected')} - Login allowed for monitoring")
                 else:
                     logger.info(f"Safe login attempt from {ip_address}")
+            elif response.status_code == 413:
+                # The detector refuses inputs it won't scan (OVERSIZED_INPUT_STRATEGY=reject)
+                logger.warning(f"Oversized input from {ip_address} refused by the detector - Login allowed for monitoring")
+                attempt_data['threat_analysis'] = {'threat_detected': True, 'threat_type': 'OVERSIZED_INPUT',
+                                                   'detection_method': 'input_size_guard'}
+                attempt_data['threat_detected'] = True
+                attempt_data['login_blocked'] = False
             else:
                 logger.error(f"Security detection service error: {response.status_code}")
                 attempt_data['threat_detected'] = False
@@ -133,12 +203,9 @@ class AuthenticationTracker:
         return attempt_data
 
     def store_session_record(self, attempt_data):
-        """Store login attempt record in SQLite database."""
+        """Store login attempt record in the database."""
         try:
-            conn = sqlite3.connect('data/web_sessions.db')
-            cursor = conn.cursor()
-
-            cursor.execute('''
+            self.storage.execute('''
                 INSERT INTO login_sessions
                 (username, password, ip_address, threat_detected, login_blocked, threat_analysis)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -150,15 +217,34 @@ class AuthenticationTracker:
                 attempt_data['login_blocked'],
                 json.dumps(attempt_data['threat_analysis']) if attempt_data['threat_analysis'] else None
             ))
-
-            conn.commit()
-            conn.close()
         except Exception as e:
             logger.error(f"Database error: {str(e)}")
 
 
-# Create singleton instance of AuthenticationTracker
-auth_tracker = AuthenticationTracker()
+# Per-process AuthenticationTracker singleton, created on first use and
+# discarded in forked children so pre-fork workers never share it
+_auth_tracker = None
+_auth_tracker_lock = threading.Lock()
+
+
+def get_auth_tracker():
+    """Return this process's AuthenticationTracker, creating it on first use."""
+    global _auth_tracker
+    if _auth_tracker is None:
+        with _auth_tracker_lock:
+            if _auth_tracker is None:
+                _auth_tracker = AuthenticationTracker()
+    return _auth_tracker
+
+
+def _reset_auth_tracker_after_fork():
+    """Drop the parent's tracker and lock in a freshly forked worker."""
+    global _auth_tracker, _auth_tracker_lock
+    _auth_tracker = None
+    _auth_tracker_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_auth_tracker_after_fork)
 
 
 # Flask route handlers
@@ -184,8 +270,14 @@ def process_authentication():
     4. If threat detected: Block login and show error
     5. If safe: Allow login and show success page
     """
-    username = request.form.get('username', '')
-    password = request.form.get('password', '')
+    try:
+        username = request.form.get('username', '')
+        password = request.form.get('password', '')
+    except RequestEntityTooLarge:
+        logger.warning(f"Oversized login request from {request.remote_addr}: {request.content_length} bytes")
+        flash('Login request too large', 'error')
+        return redirect(url_for('authentication_portal'))
+
     ip_address = request.remote_addr
 
     # Input validation
@@ -193,11 +285,15 @@ def process_authentication():
         flash('Please provide both username and password', 'error')
         return redirect(url_for('authentication_portal'))
 
+    # Oversized fields still go to the detector whole (the body cap bounds them); only stored copies are clipped
+    if len(username) > MAX_FIELD_CHARS or len(password) > MAX_FIELD_CHARS:
+        logger.warning(f"Oversized login fields from {ip_address}: username={len(username)}, password={len(password)} chars")
+
     # Threat detection and logging
-    attempt_record = auth_tracker.record_attempt(username, password, ip_address)
+    attempt_record = get_auth_tracker().record_attempt(username, password, ip_address)
 
     # Login successful (never blocked)
-    return render_template('success.html', username=username)
+    return render_template('success.html', username=attempt_record['username'])
 
 
 @app.route('/monitor')
@@ -210,20 +306,15 @@ def security_dashboard():
 def get_authentication_attempts():
     """API endpoint to retrieve login attempt history."""
     try:
-        conn = sqlite3.connect('data/web_sessions.db')
-        cursor = conn.cursor()
-
-        cursor.execute('''
+        # Ids increase with insertion time, so the primary key gives newest-first order without a sort
+        results = get_auth_tracker().storage.query('''
             SELECT username, password, ip_address, timestamp,
                    threat_detected, login_blocked, threat_analysis
             FROM login_sessions
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT 100
         ''')
 
-        results = cursor.fetchall()
-        conn.close()
-
         attempt_records = []
         for row in results:
             username, password, ip_address, timestamp, threat_detected, login_blocked, threat_analysis = row
@@ -239,7 +330,7 @@ def get_authentication_attempts():
                 'username': username,
                 'password': password[:10] + '...' if len(password) > 10 else password,
                 'ip_address': ip_address,
-                'timestamp': timestamp,
+                'timestamp': str(timestamp),
                 'threat_detected': bool(threat_detected),
                 'login_blocked': bool(login_blocked),
                 'threat_analysis': parsed_analysis
@@ -253,28 +344,58 @@ def get_authentication_attempts():
 
 @app.route('/api/agent-stats')
 def get_security_service_stats():
-    """Proxy endpoint to fetch statistics from threat detector service."""
-    try:
-        response = requests.get(SECURITY_METRICS_URL, timeout=10)
-        if response.status_code == 200:
-            return jsonify(response.json())
-        else:
-            return jsonify({'error': 'Failed to fetch security service stats'}), 502
-    except requests.exceptions.RequestException as e:
-        return jsonify({'error': f'Security service unreachable: {str(e)}'}), 503
+    """Statistics merged across all threat detector nodes."""
+    auth_tracker = get_auth_tracker()
+    auth_tracker.sync_detector_nodes()
+    merged_stats = auth_tracker.detectors.merged_stats()
+    if not merged_stats['cluster']['nodes'] or all(node['error'] for node in merged_stats['cluster']['nodes']):
+        return jsonify({'error': 'Security service unreachable', 'cluster': merged_stats['cluster']}), 503
+    return jsonify(merged_stats)
+
+
+@app.route('/api/detector-nodes', methods=['GET', 'PUT'])
+def manage_detector_nodes():
+    """
+    Inspect or replace detector cluster membership (localhost only, or X-Admin-Token
+    when DETECTOR_ADMIN_TOKEN is set). A PUT is saved to DETECTOR_NODES_FILE and
+    picked up by every worker process on its next request.
+
+    PUT /api/detector-nodes
+    Request body: {"nodes": ["http://host1:8081", "http://host2:8081"]}
+    """
+    if DETECTOR_ADMIN_TOKEN:
+        if request.headers.get('X-Admin-Token') != DETECTOR_ADMIN_TOKEN:
+            return jsonify({'error': 'Invalid admin token'}), 403
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        return jsonify({'error': 'Detector membership is only managed from localhost unless DETECTOR_ADMIN_TOKEN is set'}), 403
+
+    auth_tracker = get_auth_tracker()
+    detectors = auth_tracker.detectors
+
+    if request.method == 'PUT':
+        nodes = (request.get_json(silent=True) or {}).get('nodes')
+        if not isinstance(nodes, list) or not nodes or not all(isinstance(node, str) for node in nodes):
+            return jsonify({'error': 'Send {"nodes": ["http://host:port", ...]}'}), 400
+        try:
+            auth_tracker.save_detector_nodes(nodes)
+        except OSError as e:
+            return jsonify({'error': str(e)}), 500
+    else:
+        auth_tracker.sync_detector_nodes()
+
+    with detectors.lock:
+        return jsonify({
+            'nodes': detectors.nodes,
+            'ejected': sorted(detectors.ejected_until),
+            'membership_changes': detectors.membership_changes
+        })
 
 
 @app.route('/clear-data', methods=['POST'])
 def clear_authentication_data():
     """Clear all login attempt data from the database."""
     try:
-        conn = sqlite3.connect('data/web_sessions.db')
-        cursor = conn.cursor()
-
-        cursor.execute('DELETE FROM login_sessions')
-
-        conn.commit()
-        conn.close()
+        get_auth_tracker().storage.execute('DELETE FROM login_sessions')
 
         return jsonify({'success': True, 'message': 'Data cleared'})
 
@@ -288,22 +409,25 @@ def application_health_status():
     return jsonify({
         'status': 'healthy',
         'service': 'authentication-webapp',
-        'security_detector_url': SECURITY_DETECTION_URL
+        'security_detector_url': SECURITY_DETECTION_URL,
+        'security_detector_nodes': THREAT_DETECTOR_NODES
     })
 
 
 if __name__ == '__main__':
     print("🚀 Starting Authentication Application...")
-    print(f"🔗 Security Detector URL: {SECURITY_DETECTION_URL}")
+    print(f"🔗 Security Detector nodes: {', '.join(THREAT_DETECTOR_NODES)}")
     print("🌐 Web Application listening on http://0.0.0.0:3000")
     print("\n📋 Available endpoints:")
     print("   GET    /                      - Login page")
     print("   POST   /login                 - Process login")
     print("   GET    /monitor               - Security monitoring dashboard")
     print("   GET    /api/attempts          - Get login attempts")
-    print("   GET    /api/agent-stats       - Get threat detector stats")
+    print("   GET    /api/agent-stats       - Get threat detector stats (merged across nodes)")
+    print("   GET    /api/detector-nodes    - Detector cluster membership (PUT to change; localhost or admin token)")
     print("   POST   /clear-data            - Clear all data")
     print("   GET    /health                - Health check")
+    print("\n💡 Production mode: gunicorn login_app:app (see gunicorn.conf.py)")
     print("\n✅ Application ready!")
 
     app.run(host='0.0.0.0', port=3000, debug=False)
@@ -0,0 +1,159 @@
+"""
+LLM Admission Control
+---------------------
+Bounded, prioritised admission in front of the LLM call:
+
+1. Concurrency cap: at most max_concurrency LLM calls in flight per process
+2. Bounded priority queue: waiting requests are served lowest priority
+   number first; when the queue is full, a more urgent arrival evicts the
+   least urgent waiter
+3. Deadline propagation: a request is never admitted once its caller's
+   deadline (minus min_service_time for the LLM call itself) has passed
+
+Rejected requests raise AdmissionRejected with a reason ('queue_full',
+'deadline' or 'preempted'). The caller is expected to answer them with a
+fast degraded verdict.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict, List
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed instead of admitted."""
+
+    def __init__(self, reason: str, queue_wait: float = 0.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.queue_wait = queue_wait
+
+
+class AdmissionController:
+    """
+    Priority admission controller with a concurrency cap and bounded queue.
+
+    Usage:
+        queue_wait = controller.acquire(priority, deadline)   # may raise AdmissionRejected
+        try:
+            ... call the LLM ...
+        finally:
+            controller.release()
+
+    Deadlines are time.monotonic() values.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, min_service_time: float,
+                 wait_buckets: List[float]):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.min_service_time = min_service_time
+        self.wait_buckets = wait_buckets
+
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = []  # heap of [priority, sequence, state]
+        self.sequence = itertools.count()
+
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'deadline': 0, 'preempted': 0}
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.queue_wait_counts = [0] * (len(wait_buckets) + 1)
+        self.max_queue_depth = 0
+
+    def acquire(self, priority: int, deadline: float) -> float:
+        """Block until admitted and return seconds spent queued, or raise AdmissionRejected."""
+        start = time.monotonic()
+        with self.condition:
+            # Even with a free slot, a request that can't finish before its deadline isn't worth starting
+            if deadline - start <= self.min_service_time:
+                self.reject('deadline')
+
+            if self.active < self.max_concurrency and not self.waiting:
+                self.active += 1
+                self.record_admission(0.0)
+                return 0.0
+
+            if len(self.waiting) >= self.max_queue:
+                self.evict_for(priority)
+
+            entry = [priority, next(self.sequence), 'waiting']
+            heapq.heappush(self.waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self.waiting))
+
+            while True:
+                if entry[2] == 'evicted':
+                    self.reject('preempted', time.monotonic() - start)
+
+                if self.waiting[0] is entry and self.active < self.max_concurrency:
+                    heapq.heappop(self.waiting)
+                    self.active += 1
+                    queue_wait = time.monotonic() - start
+                    self.record_admission(queue_wait)
+                    # The next waiter may also fit if several slots freed up
+                    self.condition.notify_all()
+                    return queue_wait
+
+                remaining = deadline - self.min_service_time - time.monotonic()
+                if remaining <= 0:
+                    self.waiting.remove(entry)
+                    heapq.heapify(self.waiting)
+                    self.condition.notify_all()
+                    self.reject('deadline', time.monotonic() - start)
+
+                self.condition.wait(remaining)
+
+    def release(self):
+        """Free a concurrency slot and wake the queue."""
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def evict_for(self, priority: int):
+        """Make room for a new arrival by evicting the least urgent waiter, or reject it. Caller holds the lock."""
+        worst = max(self.waiting, default=None)
+        if worst is None or worst[0] <= priority:
+            self.reject('queue_full')
+
+        self.waiting.remove(worst)
+        heapq.heapify(self.waiting)
+        worst[2] = 'evicted'
+        self.condition.notify_all()
+
+    def reject(self, reason: str, queue_wait: float = 0.0):
+        """Count a shed request and raise. Caller holds the lock."""
+        self.shed[reason] += 1
+        raise AdmissionRejected(reason, queue_wait)
+
+    def record_admission(self, queue_wait: float):
+        """Caller holds the lock."""
+        self.admitted += 1
+        self.queue_wait_total += queue_wait
+        self.queue_wait_max = max(self.queue_wait_max, queue_wait)
+        for index, bound in enumerate(self.wait_buckets):
+            if queue_wait <= bound:
+                self.queue_wait_counts[index] += 1
+        self.queue_wait_counts[-1] += 1
+
+    def snapshot(self) -> Dict:
+        """Current admission metrics for /stats."""
+        with self.condition:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'active': self.active,
+                'queued': len(self.waiting),
+                'max_queue_depth': self.max_queue_depth,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'shed_total': sum(self.shed.values()),
+                'queue_wait_total': self.queue_wait_total,
+                'queue_wait_max': self.queue_wait_max,
+                'queue_wait_histogram': {
+                    'buckets': self.wait_buckets,
+                    'counts': list(self.queue_wait_counts)
+                }
+            }
@@ -0,0 +1,20 @@
+"""
+Detection Labels
+----------------
+The detection_method / threat_type vocabulary of threat_detector verdicts.
+Plain data only, so offline tools can import it without starting the
+detector (no app, logging or environment setup):
+
+1. DETECTION_METHOD_THREAT_TYPES: every detection_method a verdict can
+   carry, mapped to (threat_type when a threat, threat_type when not),
+   None where that verdict never happens
+"""
+
+DETECTION_METHOD_THREAT_TYPES = {
+    'input_size_guard': ('OVERSIZED_INPUT', None),
+    'legitimate_pattern_whitelist': (None, 'BENIGN_LOGIN'),
+    'llm_analysis': ('SQL_INJECTION_DETECTED', 'NO_SQL_INJECTION'),
+    'llm_analysis_cached': ('SQL_INJECTION_DETECTED', 'NO_SQL_INJECTION'),
+    'degraded_prefilter': ('SQL_INJECTION_PREFILTER', 'NO_SQL_INJECTION_PREFILTER'),
+    'degraded_fail_open': (None, 'UNVERIFIED_FAIL_OPEN'),
+}
@@ -0,0 +1,29 @@
+"""
+Gunicorn production serving profile for the SQL injection detection service.
+
+Run from this directory (gunicorn loads ./gunicorn.conf.py automatically):
+    gunicorn threat_detector:app
+
+Detection is dominated by waiting on the LLM, so each worker process runs a
+pool of threads. Scale with WEB_CONCURRENCY (processes) and WEB_THREADS.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8081')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# gunicorn switches to the gthread worker whenever threads > 1
+threads = int(os.getenv('WEB_THREADS', '8'))
+
+# LLM calls can take tens of seconds; keep workers alive past the webapp's 90s timeout
+timeout = int(os.getenv('WORKER_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# The analyzer singleton is created lazily per process, so preloading is safe
+preload_app = os.getenv('PRELOAD_APP', 'false').lower() == 'true'
+
+accesslog = os.getenv('ACCESS_LOG', None)
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
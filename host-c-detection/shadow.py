@@ -0,0 +1,132 @@
+"""
+Shadow Model Evaluation
+-----------------------
+Sends a sample of live LLM-analysed inputs to a candidate model and/or
+prompt variant, off the request path, and records how it compares:
+
+1. Sampling: each primary LLM verdict is shadowed with probability
+   `fraction`; /analyze never waits for the candidate
+2. Isolation: candidate calls run on a small thread pool with a bounded
+   backlog. Samples are dropped (and counted) when the backlog is full or
+   when live requests are queueing for the LLM
+3. Recording: every evaluation (verdicts, agreement, latency, token counts)
+   is handed to a record callback that writes the shadow_evaluations table
+
+Summarise the table with tools/shadow_report.py.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowEvaluator:
+    """
+    Runs candidate analyses for a sample of primary LLM verdicts.
+
+    analyze(input_text) -> result dict with 'threat_detected', 'ai_response',
+    'prompt_tokens' and 'completion_tokens' (the candidate's verdict).
+    record(evaluation) stores one evaluation dict.
+    busy() returns True while live requests are waiting for the LLM.
+    """
+
+    def __init__(self, candidate_model: str, candidate_prompt: str, fraction: float,
+                 analyze: Callable[[str], Dict], record: Callable[[Dict], None],
+                 busy: Callable[[], bool] = lambda: False, max_workers: int = 2, max_pending: int = 32):
+        self.candidate_model = candidate_model
+        self.candidate_prompt = candidate_prompt
+        self.fraction = max(0.0, min(1.0, fraction))
+        self.analyze = analyze
+        self.record = record
+        self.busy = busy
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+
+        self.random = random.Random()
+        self.lock = threading.Lock()
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.counts = {
+            'sampled': 0, 'completed': 0, 'agreed': 0, 'disagreed': 0, 'candidate_errors': 0,
+            'dropped_backlog': 0, 'dropped_busy': 0
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.fraction > 0
+
+    def maybe_submit(self, input_text: str, primary: Dict, primary_latency: float) -> bool:
+        """Sample this primary verdict for shadowing; return True if a candidate call was queued."""
+        if not self.enabled or self.random.random() >= self.fraction:
+            return False
+
+        with self.lock:
+            self.counts['sampled'] += 1
+            if self.busy():
+                self.counts['dropped_busy'] += 1
+                return False
+            if self.pending >= self.max_pending:
+                self.counts['dropped_backlog'] += 1
+                return False
+            self.pending += 1
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='shadow')
+
+        self.executor.submit(self.evaluate, input_text, primary, primary_latency)
+        return True
+
+    def evaluate(self, input_text: str, primary: Dict, primary_latency: float):
+        """Run the candidate for one input and record the comparison."""
+        try:
+            start = time.perf_counter()
+            candidate = self.analyze(input_text)
+            candidate_latency = time.perf_counter() - start
+
+            candidate_verdict = candidate.get('threat_detected')
+            agreed = None if candidate_verdict is None else candidate_verdict == primary['threat_detected']
+            with self.lock:
+                self.counts['completed'] += 1
+                if agreed is None:
+                    self.counts['candidate_errors'] += 1
+                else:
+                    self.counts['agreed' if agreed else 'disagreed'] += 1
+
+            self.record({
+                'input_text': input_text,
+                'candidate_model': self.candidate_model,
+                'candidate_prompt': self.candidate_prompt,
+                'primary_verdict': primary['threat_detected'],
+                'candidate_verdict': candidate_verdict,
+                'agreed': agreed,
+                'primary_latency': primary_latency,
+                'candidate_latency': candidate_latency,
+                'primary_prompt_tokens': primary.get('prompt_tokens'),
+                'primary_completion_tokens': primary.get('completion_tokens'),
+                'candidate_prompt_tokens': candidate.get('prompt_tokens'),
+                'candidate_completion_tokens': candidate.get('completion_tokens'),
+                'candidate_response': candidate.get('ai_response', '')
+            })
+        except Exception as e:
+            logger.error(f"Shadow evaluation error: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def snapshot(self) -> Dict:
+        """Current shadow metrics for /stats."""
+        with self.lock:
+            completed = self.counts['agreed'] + self.counts['disagreed']
+            return dict(
+                self.counts,
+                enabled=self.enabled,
+                candidate_model=self.candidate_model,
+                candidate_prompt=self.candidate_prompt,
+                fraction=self.fraction,
+                pending=self.pending,
+                agreement_rate=(self.counts['agreed'] / completed * 100) if completed else None
+            )
@@ -0,0 +1,335 @@
+"""
+Bounded Detector Telemetry
+--------------------------
+In-process counters and per-client tracking for the threat detector, in a
+fixed memory budget that does not grow with traffic or with the number of
+distinct IPs or inputs:
+
+1. Detection counters: one array slot per known detection type (plus
+   'other'), not a dict keyed by whatever string a caller passes
+2. Count-Min Sketches (conservative update) for per-IP request counts,
+   per-IP LLM-confirmed threats (reputation) and per-input sightings
+   (first-seen detection). Estimates never undercount; collisions can only
+   overcount
+3. Aging: each sketch halves all its counters after a fixed number of
+   additions, so it tracks recent behaviour and its error stays bounded
+   instead of saturating. An IP or input seen once is forgotten after a
+   halving, much like eviction from a bounded LRU
+4. HyperLogLog estimates of distinct client IPs and distinct inputs
+   (~0.8% standard error at precision 14)
+5. Top-k heavy-hitter IPs, tracked alongside the request sketch
+
+All sizes are derived from max_bytes (TELEMETRY_MAX_BYTES) at construction
+and never change; memory_bytes() reports the fixed footprint.
+
+The budget covers these telemetry structures only. The analyzer's verdict
+cache and LLM admission queue are bounded separately, by entry count
+(VERDICT_CACHE_SIZE, LLM_QUEUE_SIZE), and count towards neither max_bytes
+nor memory_bytes().
+"""
+
+import hashlib
+import sys
+import threading
+from array import array
+from math import log
+from typing import Dict, List, Sequence, Tuple
+
+HASH_MASK = (1 << 64) - 1
+WIDE_HASH = sys.hash_info.width >= 64
+HALVE_CHUNK_ITEMS = 16384
+
+
+def hash_key(key) -> int:
+    """
+    64-bit hash of a str or bytes key.
+
+    The builtin hash is SipHash, cached on str objects and randomly seeded per
+    process, which is all in-process sketches need (and keeps collisions from
+    being precomputed). Narrow builds fall back to blake2b.
+    """
+    if WIDE_HASH:
+        return hash(key) & HASH_MASK
+    if isinstance(key, str):
+        key = key.encode('utf-8', 'surrogatepass')
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little')
+
+
+class CountMinSketch:
+    """
+    depth x width 32-bit counters with conservative update and periodic halving.
+
+    Indices come from one 64-bit hash by double hashing. After reset_after
+    additions every counter is halved (TinyLFU-style aging).
+    """
+
+    __slots__ = ('width', 'depth', 'reset_after', 'additions', 'table', 'halve_mask')
+
+    def __init__(self, width: int, depth: int = 4, reset_after: int = 0):
+        self.width = max(16, width)
+        self.depth = max(1, depth)
+        self.reset_after = reset_after
+        self.additions = 0
+        self.table = array('I', bytes(4 * self.width * self.depth))
+        # Clears the bit each counter gains from its neighbour when a whole chunk is shifted right as one integer
+        lane_mask = ((1 << (8 * self.table.itemsize - 1)) - 1).to_bytes(self.table.itemsize, sys.byteorder)
+        self.halve_mask = int.from_bytes(lane_mask * HALVE_CHUNK_ITEMS, sys.byteorder)
+
+    def indices(self, hashed: int) -> List[int]:
+        low, high = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        width = self.width
+        return [row * width + (low + row * high) % width for row in range(self.depth)]
+
+    def add(self, hashed: int, count: int = 1) -> int:
+        """Add count for a hashed key and return its new estimate."""
+        table = self.table
+        slots = self.indices(hashed)
+        estimate = min(table[slot] for slot in slots) + count
+        for slot in slots:
+            if table[slot] < estimate:
+                table[slot] = estimate
+
+        self.additions += count
+        if self.reset_after and self.additions >= self.reset_after:
+            self.halve()
+        return estimate
+
+    def estimate(self, hashed: int) -> int:
+        table = self.table
+        return min(table[slot] for slot in self.indices(hashed))
+
+    def halve(self):
+        """Halve every counter, a chunk at a time, without a per-counter Python loop."""
+        table = self.table
+        item_size = table.itemsize
+        for start in range(0, len(table), HALVE_CHUNK_ITEMS):
+            chunk = table[start:start + HALVE_CHUNK_ITEMS]
+            shifted = (int.from_bytes(chunk.tobytes(), sys.byteorder) >> 1) & self.halve_mask
+            table[start:start + len(chunk)] = array('I', shifted.to_bytes(len(chunk) * item_size, sys.byteorder))
+        self.additions //= 2
+
+    def clear(self):
+        self.table = array('I', bytes(len(self.table) * self.table.itemsize))
+        self.additions = 0
+
+    def memory_bytes(self) -> int:
+        return (len(self.table) + HALVE_CHUNK_ITEMS) * self.table.itemsize
+
+
+class HyperLogLog:
+    """Distinct-count estimator with 2^precision one-byte registers."""
+
+    __slots__ = ('precision', 'registers', 'alpha')
+
+    def __init__(self, precision: int = 14):
+        self.precision = max(4, min(16, precision))
+        self.registers = bytearray(1 << self.precision)
+        m = len(self.registers)
+        self.alpha = 0.7213 / (1 + 1.079 / m)
+
+    def add(self, hashed: int):
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        raw = self.alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            # Small-range correction: linear counting over empty registers
+            return int(round(m * log(m / zeros)))
+        return int(round(raw))
+
+    def clear(self):
+        self.registers = bytearray(len(self.registers))
+
+    def memory_bytes(self) -> int:
+        return len(self.registers)
+
+
+class HeavyHitter:
+    """One tracked top-k key and its latest sketch estimate."""
+
+    __slots__ = ('key', 'count')
+
+    def __init__(self, key: str, count: int):
+        self.key = key
+        self.count = count
+
+
+class HeavyHitters:
+    """
+    The k keys with the highest sketch estimates seen so far.
+
+    A new key displaces the smallest tracked one only when its estimate is
+    larger, so the table never exceeds k entries. Keys are clipped to
+    max_key_chars.
+    """
+
+    __slots__ = ('k', 'max_key_chars', 'entries', 'floor')
+
+    ENTRY_BYTES = 256  # budget per entry: record, dict slot and a clipped key
+
+    def __init__(self, k: int, max_key_chars: int = 64):
+        self.k = max(1, k)
+        self.max_key_chars = max_key_chars
+        self.entries: Dict[str, HeavyHitter] = {}
+        self.floor = 0
+
+    def offer(self, key: str, estimate: int):
+        key = key[:self.max_key_chars]
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry.count = estimate
+            return
+        if len(self.entries) < self.k:
+            self.entries[key] = HeavyHitter(key, estimate)
+            self.floor = min(self.floor, estimate) if len(self.entries) > 1 else estimate
+            return
+        if estimate <= self.floor:
+            return
+
+        victim = min(self.entries.values(), key=lambda item: item.count)
+        if estimate > victim.count:
+            del self.entries[victim.key]
+            self.entries[key] = HeavyHitter(key, estimate)
+        self.floor = min(item.count for item in self.entries.values())
+
+    def halve(self):
+        for entry in self.entries.values():
+            entry.count //= 2
+        self.floor //= 2
+
+    def top(self) -> List[Tuple[str, int]]:
+        return sorted(((entry.key, entry.count) for entry in self.entries.values()), key=lambda item: -item[1])
+
+    def clear(self):
+        self.entries = {}
+        self.floor = 0
+
+    def memory_bytes(self) -> int:
+        return self.k * self.ENTRY_BYTES
+
+
+class DetectorTelemetry:
+    """
+    Fixed-footprint telemetry for one analyzer. max_bytes bounds only the
+    structures in this class, not the analyzer's other per-process state.
+
+    Usage:
+        telemetry.record_detection('verdict_cache_hit', processing_time)
+        telemetry.observe_request(ip_address, normalized_input)
+        first_seen = telemetry.first_seen_input(normalized_input)
+        telemetry.record_threat(ip_address); telemetry.threat_count(ip_address)
+    """
+
+    __slots__ = ('max_bytes', 'detection_types', 'type_index', 'detection_counts', 'processing_time_total',
+                 'ip_requests', 'ip_threats', 'inputs', 'distinct_ips', 'distinct_inputs', 'top_ips', 'lock')
+
+    SKETCH_DEPTH = 4
+    HLL_PRECISION = 14
+
+    def __init__(self, max_bytes: int, detection_types: Sequence[str], top_k: int = 10):
+        self.max_bytes = max_bytes
+        self.detection_types = tuple(detection_types) + ('other',)
+        self.type_index = {name: i for i, name in enumerate(self.detection_types)}
+        self.detection_counts = array('Q', bytes(8 * len(self.detection_types)))
+        self.processing_time_total = 0.0
+
+        self.distinct_ips = HyperLogLog(self.HLL_PRECISION)
+        self.distinct_inputs = HyperLogLog(self.HLL_PRECISION)
+        self.top_ips = HeavyHitters(top_k)
+
+        # Whatever the fixed parts leave goes to the sketches: half to inputs, a quarter each to IPs
+        counter_bytes = 4 * self.SKETCH_DEPTH
+        overhead = (self.detection_counts.itemsize * len(self.detection_counts)
+                    + self.distinct_ips.memory_bytes() + self.distinct_inputs.memory_bytes()
+                    + self.top_ips.memory_bytes() + 3 * 4 * HALVE_CHUNK_ITEMS)
+        sketch_budget = max_bytes - overhead
+        if sketch_budget < 8 * counter_bytes * 1024:
+            raise ValueError(f"TELEMETRY_MAX_BYTES={max_bytes} is too small (need at least "
+                             f"{overhead + 8 * counter_bytes * 1024} bytes)")
+        input_width = sketch_budget // 2 // counter_bytes
+        ip_width = sketch_budget // 4 // counter_bytes
+
+        # Request counts age slowly (heavy hitters stand out over a long window); threat and
+        # sighting counts age once the sketch holds about half its width in keys
+        self.ip_requests = CountMinSketch(ip_width, self.SKETCH_DEPTH, reset_after=10 * ip_width)
+        self.ip_threats = CountMinSketch(ip_width, self.SKETCH_DEPTH, reset_after=ip_width // 2)
+        self.inputs = CountMinSketch(input_width, self.SKETCH_DEPTH, reset_after=input_width // 2)
+        self.lock = threading.Lock()
+
+    def record_detection(self, detection_type: str, processing_time: float):
+        index = self.type_index.get(detection_type, len(self.detection_types) - 1)
+        with self.lock:
+            self.detection_counts[index] += 1
+            self.processing_time_total += processing_time
+
+    def observe_request(self, ip_address: str, normalized_input: str):
+        """Count one analysed request towards per-IP, top-IP and distinct-count estimates."""
+        input_hash = hash_key(normalized_input)
+        with self.lock:
+            self.distinct_inputs.add(input_hash)
+            if not ip_address:
+                return
+            ip_hash = hash_key(ip_address)
+            self.distinct_ips.add(ip_hash)
+            additions = self.ip_requests.additions
+            estimate = self.ip_requests.add(ip_hash)
+            if self.ip_requests.additions < additions:
+                self.top_ips.halve()
+            self.top_ips.offer(ip_address, estimate)
+
+    def first_seen_input(self, normalized_input: str) -> bool:
+        """Record a sighting of an LLM-bound input; True if it has not been seen recently."""
+        hashed = hash_key(normalized_input)
+        with self.lock:
+            return self.inputs.add(hashed) == 1
+
+    def record_threat(self, ip_address: str):
+        if not ip_address:
+            return
+        hashed = hash_key(ip_address)
+        with self.lock:
+            self.ip_threats.add(hashed)
+
+    def threat_count(self, ip_address: str) -> int:
+        if not ip_address:
+            return 0
+        hashed = hash_key(ip_address)
+        with self.lock:
+            return self.ip_threats.estimate(hashed)
+
+    def clear(self):
+        with self.lock:
+            self.detection_counts = array('Q', bytes(8 * len(self.detection_types)))
+            self.processing_time_total = 0.0
+            for structure in (self.ip_requests, self.ip_threats, self.inputs,
+                              self.distinct_ips, self.distinct_inputs, self.top_ips):
+                structure.clear()
+
+    def memory_bytes(self) -> int:
+        return (self.detection_counts.itemsize * len(self.detection_counts)
+                + sum(structure.memory_bytes() for structure in (
+                    self.ip_requests, self.ip_threats, self.inputs,
+                    self.distinct_ips, self.distinct_inputs, self.top_ips)))
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts = dict(zip(self.detection_types, self.detection_counts))
+            processing_time_total = self.processing_time_total
+            top_ips = self.top_ips.top()
+            distinct_ips = self.distinct_ips.estimate()
+            distinct_inputs = self.distinct_inputs.estimate()
+        return {
+            'detections_by_type': {name: count for name, count in counts.items() if count},
+            'total_processing_time': processing_time_total,
+            'distinct_ips_estimate': distinct_ips,
+            'distinct_inputs_estimate': distinct_inputs,
+            'top_ips': [{'ip_address': ip, 'requests_estimate': count} for ip, count in top_ips],
+            'memory_bytes': self.memory_bytes(),
+            'max_bytes': self.max_bytes
+        }
@@ -7,18 +7,42 @@ This module implements an LLM-powered SQL injection detection system:
 
 The LLM specifically analyzes inputs to detect SQL injection attempts.
 Focus: SQL injection detection only, not general security threats.
+
+Importing this module is cheap: the Ollama client library is imported on
+the first LLM call and the database is set up on first use. Build the web
+app with create_app(); the module-level `app` is kept for gunicorn and
+`python threat_detector.py`.
 """
 
-from flask import Flask, request, jsonify
-import sqlite3
+from flask import Blueprint, Flask, request, jsonify
+from werkzeug.exceptions import RequestEntityTooLarge
 import datetime
+import hashlib
+import ipaddress
+import json
+import math
 import os
 import re
+import socket
+import sys
+import threading
 import time
 import logging
-from typing import Dict, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional
 from urllib.parse import unquote
-import ollama
+
+from admission import AdmissionController, AdmissionRejected
+from shadow import ShadowEvaluator
+from telemetry import DetectorTelemetry
+
+# storage.py and profiler.py are shared with the webapp and live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from profiler import install_profiler  # noqa: E402
+from storage import open_storage  # noqa: E402
+
+if TYPE_CHECKING:
+    import ollama
 
 # Configure logging
 logging.basicConfig(
@@ -27,6 +51,195 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Input size limits - enforced before any parsing, normalization or LLM call
+MAX_REQUEST_BYTES = int(os.getenv('DETECTOR_MAX_REQUEST_BYTES', 64 * 1024))
+MAX_INPUT_CHARS = int(os.getenv('MAX_INPUT_CHARS', 4096))
+# Inputs over MAX_INPUT_CHARS are never scanned (a prefix scan would miss a payload in the tail):
+# 'flag':   answer 200 with an OVERSIZED_INPUT threat verdict
+# 'reject': answer 413
+OVERSIZED_INPUT_STRATEGY = os.getenv('OVERSIZED_INPUT_STRATEGY', 'flag')
+if OVERSIZED_INPUT_STRATEGY not in ('flag', 'reject'):
+    logger.error(f"Unknown OVERSIZED_INPUT_STRATEGY '{OVERSIZED_INPUT_STRATEGY}', using 'flag' (choices: flag, reject)")
+    OVERSIZED_INPUT_STRATEGY = 'flag'
+
+# Callers (the webapp) allowed to forward the end client's IP in X-Client-IP. Everyone else is
+# identified by their own address, since admission priority and IP reputation are keyed on it.
+TRUSTED_FORWARDERS = {
+    address.strip() for address in os.getenv('TRUSTED_FORWARDERS', '127.0.0.1,::1').split(',') if address.strip()
+}
+
+# Cluster node identity and per-node LLM verdict cache (see login_app DetectorCluster)
+PORT = int(os.getenv('PORT', '8081'))
+NODE_ID = os.getenv('NODE_ID', f'{socket.gethostname()}:{PORT}')
+VERDICT_CACHE_SIZE = int(os.getenv('VERDICT_CACHE_SIZE', 10000))
+
+# Cumulative processing-time histogram bucket bounds (seconds) reported by /stats.
+# Fixed bounds let the webapp merge histograms from several nodes by summing.
+LATENCY_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+# /stats summary followed by one cumulative "<= bound" count per LATENCY_BUCKETS entry.
+# Booleans are tested bare (not "= 1") so the query runs on both SQLite and PostgreSQL.
+STATS_QUERY = 'SELECT ' + ', '.join([
+    'COUNT(*)',
+    'SUM(CASE WHEN threat_detected THEN 1 ELSE 0 END)',
+    'SUM(CASE WHEN NOT threat_detected THEN 1 ELSE 0 END)',
+    'AVG(processing_time)',
+    'MIN(processing_time)',
+    'MAX(processing_time)',
+    'SUM(CASE WHEN api_called THEN 1 ELSE 0 END)'
+] + [f'SUM(CASE WHEN processing_time <= {bound} THEN 1 ELSE 0 END)' for bound in LATENCY_BUCKETS]) + \
+    ' FROM hybrid_detections'
+
+# LLM admission control (per worker process - divide LLM capacity by WEB_CONCURRENCY)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 4))
+LLM_QUEUE_SIZE = int(os.getenv('LLM_QUEUE_SIZE', 64))
+# Upper bound per LLM call; each call also stops at the request's deadline
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', 90))
+# Callers send X-Request-Timeout-Ms; this applies when they don't
+DEFAULT_DEADLINE_SECONDS = float(os.getenv('DEFAULT_DEADLINE_SECONDS', 85))
+# Don't admit a request with less than this much of its deadline left
+MIN_LLM_SECONDS = float(os.getenv('MIN_LLM_SECONDS', 1.0))
+# Verdict for shed requests: 'prefilter' (regex heuristic) or 'fail_open' (not a threat)
+SHED_VERDICT_MODE = os.getenv('SHED_VERDICT_MODE', 'prefilter')
+# IPs with at least this many LLM-confirmed threats are queued ahead of everyone else
+BAD_REPUTATION_THRESHOLD = int(os.getenv('BAD_REPUTATION_THRESHOLD', 1))
+# Hard cap on in-memory telemetry and IP/input tracking per worker process (see telemetry.py).
+# Telemetry only: the verdict cache and LLM queue are bounded by VERDICT_CACHE_SIZE / LLM_QUEUE_SIZE
+TELEMETRY_MAX_BYTES = int(os.getenv('TELEMETRY_MAX_BYTES', 8 * 1024 * 1024))
+TELEMETRY_TOP_K = int(os.getenv('TELEMETRY_TOP_K', 10))
+
+# LLM prompt variants for perform_ai_analysis. Each keeps the Input/Respond
+# block the stub LLM (host-d-llm-stub) parses the input back out of.
+PROMPT_VARIANTS = {
+    'default': """Is this a SQL injection attempt?
+
+Input: "{input_text}"
+
+Respond with ONLY valid JSON (no other text):
+{{"sql_injection": "YES"}} OR {{"sql_injection": "NO"}}""",
+    'strict': """You are a web application firewall. Decide whether the login form input below
+tries to alter a SQL query (tautologies, UNION, stacked queries, comments,
+time delays, encoded quotes). Ordinary usernames and passwords are not attacks,
+even when they contain punctuation.
+
+Input: "{input_text}"
+
+Respond with ONLY valid JSON (no other text):
+{{"sql_injection": "YES"}} OR {{"sql_injection": "NO"}}""",
+    'few_shot': """Classify login form inputs as SQL injection attempts or not.
+
+Input "username: alice, password: Winter2024!" -> {{"sql_injection": "NO"}}
+Input "username: admin' OR '1'='1, password: x" -> {{"sql_injection": "YES"}}
+Input "username: o'brien, password: hunter2" -> {{"sql_injection": "NO"}}
+Input "username: x'; DROP TABLE users--, password: x" -> {{"sql_injection": "YES"}}
+
+Input: "{input_text}"
+
+Respond with ONLY valid JSON (no other text):
+{{"sql_injection": "YES"}} OR {{"sql_injection": "NO"}}"""
+}
+PROMPT_VARIANT = os.getenv('PROMPT_VARIANT', 'default')
+
+# Shadow evaluation: a fraction of LLM-analysed inputs is also sent, off the
+# request path, to a candidate model and/or prompt variant (empty = same as primary)
+SHADOW_FRACTION = float(os.getenv('SHADOW_FRACTION', 0))
+SHADOW_MODEL = os.getenv('SHADOW_MODEL', '')
+SHADOW_PROMPT_VARIANT = os.getenv('SHADOW_PROMPT_VARIANT', '')
+SHADOW_OLLAMA_HOST = os.getenv('SHADOW_OLLAMA_HOST', '')
+SHADOW_WORKERS = int(os.getenv('SHADOW_WORKERS', 2))
+SHADOW_MAX_PENDING = int(os.getenv('SHADOW_MAX_PENDING', 32))
+
+# Admission priorities (lower is served first)
+PRIORITY_BAD_REPUTATION = 0
+PRIORITY_FIRST_SEEN = 1
+PRIORITY_REPEAT = 2
+
+# Every detection type passed to refresh_stats; anything else is counted as 'other'
+DETECTION_TYPES = ('oversized_input', 'legitimate_login', 'verdict_cache_hit',
+                   'shed_queue_full', 'shed_deadline', 'shed_preempted')
+
+# Cheap SQL injection heuristic used only for degraded (shed) verdicts
+SQLI_PREFILTER_PATTERN = re.compile(
+    r"('|\")\s*(or|and)\s+[\w'\"]+\s*(=|like|>|<)"
+    r"|\bunion\b[\s\S]*\bselect\b"
+    r"|;\s*(drop|delete|insert|update|shutdown|exec)\b"
+    r"|\b(sleep|benchmark|pg_sleep)\s*\(|\bwaitfor\s+delay\b"
+    r"|(--|#|/\*)\s*$"
+    r"|\bor\s+\d+\s*=\s*\d+",
+    re.IGNORECASE
+)
+
+
+def fingerprint_input(input_text: str, limit: int = MAX_INPUT_CHARS) -> str:
+    """Return input_text, or a bounded prefix plus SHA-256 digest if it exceeds limit."""
+    if len(input_text) <= limit:
+        return input_text
+
+    digest = hashlib.sha256(input_text.encode('utf-8', 'surrogatepass')).hexdigest()
+    return f"{input_text[:limit]}...[truncated, {len(input_text)} chars, sha256={digest}]"
+
+
+def normalize_input(input_text: str) -> str:
+    """URL-decode input, turn '+' into spaces and collapse whitespace."""
+    decoded_input = unquote(input_text)
+    normalized_input = decoded_input.replace('+', ' ')
+    return re.sub(r'\s+', ' ', normalized_input).strip()
+
+
+class VerdictCache:
+    """
+    Bounded LRU cache of LLM verdicts keyed by normalized input.
+
+    Keys are SHA-256 digests, so memory is bounded by max_entries regardless
+    of input length. The webapp routes repeats of an input to the same node,
+    which is what makes this per-node cache effective in a cluster.
+    """
+
+    def __init__(self, max_entries: int = VERDICT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(normalized_input: str) -> bytes:
+        return hashlib.sha256(normalized_input.encode('utf-8', 'surrogatepass')).digest()
+
+    def get(self, normalized_input: str) -> Optional[Dict]:
+        key = self.make_key(normalized_input)
+        with self.lock:
+            verdict = self.entries.get(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def put(self, normalized_input: str, verdict: Dict):
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(normalized_input)
+        with self.lock:
+            self.entries[key] = verdict
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
 
 class AdvancedSecurityAnalyzer:
     """
@@ -47,6 +260,38 @@ class AdvancedSecurityAnalyzer:
         # AI Configuration - AWS Remote LLM
         self.ollama_host = os.getenv('OLLAMA_HOST', 'http://54.83.245.211:11434')
         self.ai_model = os.getenv('OLLAMA_MODEL', 'codellama:13b')
+        self.prompt_variant = PROMPT_VARIANT if PROMPT_VARIANT in PROMPT_VARIANTS else 'default'
+        if self.prompt_variant != PROMPT_VARIANT:
+            logger.error(f"Unknown PROMPT_VARIANT '{PROMPT_VARIANT}', using 'default' (choices: {', '.join(PROMPT_VARIANTS)})")
+        self.llm_transport = None
+        self.verdict_cache = VerdictCache(VERDICT_CACHE_SIZE)
+
+        # Admission control in front of the LLM, plus fixed-size input/IP tracking for prioritisation
+        self.admission = AdmissionController(LLM_MAX_CONCURRENCY, LLM_QUEUE_SIZE, MIN_LLM_SECONDS, LATENCY_BUCKETS)
+        self.telemetry = DetectorTelemetry(TELEMETRY_MAX_BYTES, DETECTION_TYPES, TELEMETRY_TOP_K)
+
+        # Shadow evaluation of a candidate model/prompt on sampled live inputs
+        self.shadow_client = None
+        shadow_prompt = SHADOW_PROMPT_VARIANT or self.prompt_variant
+        shadow_fraction = SHADOW_FRACTION
+        if shadow_prompt not in PROMPT_VARIANTS:
+            logger.error(f"Unknown SHADOW_PROMPT_VARIANT '{shadow_prompt}', shadow evaluation disabled")
+            shadow_fraction = 0.0
+        self.shadow = ShadowEvaluator(
+            SHADOW_MODEL or self.ai_model,
+            shadow_prompt,
+            shadow_fraction,
+            analyze=self.perform_shadow_analysis,
+            record=self.store_shadow_evaluation,
+            busy=lambda: bool(self.admission.waiting),
+            max_workers=SHADOW_WORKERS,
+            max_pending=SHADOW_MAX_PENDING
+        )
+
+        # Connections are opened and the schema created on first use, see ensure_database()
+        self.storage = open_storage('regex_analytics.db')
+        self.database_ready = False
+        self.database_lock = threading.Lock()
 
         # Legitimate authentication patterns (whitelist)
         self.legitimate_auth_patterns = {
@@ -59,20 +304,40 @@ class AdvancedSecurityAnalyzer:
             ]
         }
 
-        self.setup_database()
+    def get_llm_client(self, timeout: float = LLM_TIMEOUT_SECONDS) -> 'ollama.Client':
+        """
+        Return an Ollama client with the given timeout for one call.
+
+        Clients are cheap wrappers around the analyzer's single HTTP transport, so
+        every call reuses the same connection pool whatever its timeout.
+        """
+        import ollama  # deferred: pulls in httpx and pydantic
+        if self.llm_transport is None:
+            import httpx
+            self.llm_transport = httpx.HTTPTransport()
+        return ollama.Client(host=self.ollama_host, timeout=timeout, transport=self.llm_transport)
+
+    def get_shadow_client(self) -> 'ollama.Client':
+        """Separate client for shadow calls, so they never share the live connection pool."""
+        if self.shadow_client is None:
+            import ollama
+            self.shadow_client = ollama.Client(host=SHADOW_OLLAMA_HOST or self.ollama_host,
+                                               timeout=LLM_TIMEOUT_SECONDS)
+        return self.shadow_client
+
+    def ensure_database(self):
+        """Run setup_database() once, on the first call that needs the database."""
+        if not self.database_ready:
+            with self.database_lock:
+                if not self.database_ready:
+                    self.setup_database()
 
     def setup_database(self):
-        """Set up the SQLite database for logging detections and analytics."""
+        """Set up the database for logging detections and analytics."""
         try:
-            data_dir = os.getenv('DATA_DIR', 'data')
-            os.makedirs(data_dir, exist_ok=True)
-
-            db_path = os.path.join(data_dir, 'regex_analytics.db')
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-
-            # Main detection logging table
-            cursor.execute('''
+            self.storage.create_schema([
+                # Main detection logging table
+                '''
                 CREATE TABLE IF NOT EXISTS hybrid_detections (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
@@ -86,15 +351,37 @@ class AdvancedSecurityAnalyzer:
                     api_called BOOLEAN DEFAULT 0,
                     ai_response TEXT
                 )
-            ''')
-
-            # Create indexes for performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON hybrid_detections(timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_threat_detected ON hybrid_detections(threat_detected)')
-
-            conn.commit()
-            conn.close()
-            logger.info(f"Database setup complete at {db_path}")
+                ''',
+                # Create indexes for performance
+                'CREATE INDEX IF NOT EXISTS idx_timestamp ON hybrid_detections(timestamp)',
+                'CREATE INDEX IF NOT EXISTS idx_threat_detected ON hybrid_detections(threat_detected)',
+                # Shadow model/prompt evaluations (see shadow.py)
+                '''
+                CREATE TABLE IF NOT EXISTS shadow_evaluations (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    input_data TEXT,
+                    primary_model TEXT,
+                    primary_prompt TEXT,
+                    candidate_model TEXT,
+                    candidate_prompt TEXT,
+                    primary_verdict BOOLEAN,
+                    candidate_verdict BOOLEAN,
+                    agreed BOOLEAN,
+                    primary_latency REAL,
+                    candidate_latency REAL,
+                    primary_prompt_tokens INTEGER,
+                    primary_completion_tokens INTEGER,
+                    candidate_prompt_tokens INTEGER,
+                    candidate_completion_tokens INTEGER,
+                    candidate_response TEXT,
+                    node_id TEXT
+                )
+                ''',
+                'CREATE INDEX IF NOT EXISTS idx_shadow_candidate ON shadow_evaluations(candidate_model, candidate_prompt)'
+            ])
+            self.database_ready = True
+            logger.info("Database setup complete")
         except Exception as e:
             logger.error(f"Database setup error: {e}")
 
@@ -108,21 +395,72 @@ class AdvancedSecurityAnalyzer:
 
         return False
 
-    def comprehensive_security_scan(self, input_text: str, ip_address: str = None) -> Optional[Dict]:
+    def admission_priority(self, normalized_input: str, ip_address: str = None) -> int:
+        """Queue bad-reputation IPs first, then first-seen inputs, then repeats."""
+        if ip_address and self.telemetry.threat_count(ip_address) >= BAD_REPUTATION_THRESHOLD:
+            return PRIORITY_BAD_REPUTATION
+        return PRIORITY_FIRST_SEEN if self.telemetry.first_seen_input(normalized_input) else PRIORITY_REPEAT
+
+    def record_client_threat(self, ip_address: str):
+        """Count an LLM-confirmed threat against an IP (sketch-based, ages out over time)."""
+        self.telemetry.record_threat(ip_address)
+
+    def degraded_verdict(self, normalized_input: str) -> Dict:
+        """Fast verdict for a request shed by admission control."""
+        if SHED_VERDICT_MODE == 'fail_open':
+            return {
+                'threat_detected': False,
+                'threat_type': 'UNVERIFIED_FAIL_OPEN',
+                'detection_method': 'degraded_fail_open',
+                'pattern_matched': 'none'
+            }
+
+        match = SQLI_PREFILTER_PATTERN.search(normalized_input)
+        return {
+            'threat_detected': bool(match),
+            'threat_type': 'SQL_INJECTION_PREFILTER' if match else 'NO_SQL_INJECTION_PREFILTER',
+            'detection_method': 'degraded_prefilter',
+            'pattern_matched': match.group(0)[:100] if match else 'none'
+        }
+
+    def comprehensive_security_scan(self, input_text: str, ip_address: str = None,
+                                    deadline: Optional[float] = None) -> Optional[Dict]:
         """
         Perform SQL injection detection with LLM-based analysis.
 
         Detection Flow:
+        0. Size Guard (inputs over MAX_INPUT_CHARS get an OVERSIZED_INPUT verdict, unscanned)
         1. Input Normalization
         2. Whitelist Check (legitimate logins bypass LLM)
-        3. LLM SQL Injection Detection (all other inputs sent to LLM server)
+        3. Verdict Cache (repeats reuse this node's LLM verdict)
+        4. Admission Control (prioritised queue; shed requests get a degraded verdict)
+        5. LLM SQL Injection Detection (all other inputs sent to LLM server)
+        6. Shadow Evaluation (a sample is re-run on a candidate model/prompt, off the request path)
+
+        deadline is a time.monotonic() value by which the caller needs an answer.
         """
         start_time = time.time()
+        if deadline is None:
+            deadline = time.monotonic() + DEFAULT_DEADLINE_SECONDS
+
+        # Size guard - oversized inputs get a cheap verdict without normalization
+        if len(input_text) > MAX_INPUT_CHARS:
+            processing_time = time.time() - start_time
+            self.refresh_stats('oversized_input', processing_time)
+            return {
+                'threat_detected': True,
+                'threat_type': 'OVERSIZED_INPUT',
+                'detection_method': 'input_size_guard',
+                'processing_time': processing_time,
+                'model_version': 'advanced-security-v1.0',
+                'pattern_matched': f'input_length>{MAX_INPUT_CHARS}',
+                'api_called': False,
+                'input_length': len(input_text)
+            }
 
         # Input normalization
-        decoded_input = unquote(input_text)
-        normalized_input = decoded_input.replace('+', ' ')
-        normalized_input = re.sub(r'\s+', ' ', normalized_input).strip()
+        normalized_input = normalize_input(input_text)
+        self.telemetry.observe_request(ip_address, normalized_input)
 
         # Whitelist check - legitimate logins bypass LLM
         if self.validate_legitimate_login(normalized_input):
@@ -139,10 +477,62 @@ class AdvancedSecurityAnalyzer:
             self.refresh_stats('legitimate_login', processing_time)
             return result
 
-        # All other inputs go directly to LLM for analysis
-        ai_result = self.perform_ai_analysis(normalized_input)
+        # Repeated inputs reuse this node's cached LLM verdict
+        cached_result = self.verdict_cache.get(normalized_input)
+        if cached_result is not None:
+            processing_time = time.time() - start_time
+            self.refresh_stats('verdict_cache_hit', processing_time)
+            return {
+                'threat_detected': cached_result['threat_detected'],
+                'threat_type': cached_result['threat_type'],
+                'detection_method': 'llm_analysis_cached',
+                'processing_time': processing_time,
+                'model_version': 'advanced-security-v1.0',
+                'pattern_matched': 'none',
+                'api_called': False,
+                'ai_response': cached_result['ai_response'],
+                'node_id': NODE_ID
+            }
+
+        # Wait for an LLM slot; requests that can't be served in time get a degraded verdict
+        try:
+            queue_wait = self.admission.acquire(self.admission_priority(normalized_input, ip_address), deadline)
+        except AdmissionRejected as rejection:
+            processing_time = time.time() - start_time
+            self.refresh_stats(f'shed_{rejection.reason}', processing_time)
+            logger.warning(f"Shed LLM request ({rejection.reason}) after {rejection.queue_wait:.3f}s in queue")
+            result = self.degraded_verdict(normalized_input)
+            result.update({
+                'processing_time': processing_time,
+                'model_version': 'advanced-security-v1.0',
+                'api_called': False,
+                'degraded': True,
+                'shed_reason': rejection.reason,
+                'queue_wait': rejection.queue_wait,
+                'node_id': NODE_ID
+            })
+            return result
+
+        try:
+            llm_start = time.perf_counter()
+            # The LLM call gets whatever is left of the caller's deadline, never more
+            llm_timeout = max(0.001, min(LLM_TIMEOUT_SECONDS, deadline - time.monotonic()))
+            ai_result = self.perform_ai_analysis(normalized_input, client=self.get_llm_client(llm_timeout))
+            llm_latency = time.perf_counter() - llm_start
+        finally:
+            self.admission.release()
         total_processing_time = time.time() - start_time
 
+        # Off the request path: maybe compare a candidate model/prompt on this input
+        if ai_result['threat_detected'] is not None:
+            self.shadow.maybe_submit(normalized_input, ai_result, llm_latency)
+
+        # Only definite verdicts are cached; errors are retried next time
+        if ai_result['threat_detected'] is not None:
+            self.verdict_cache.put(normalized_input, ai_result)
+        if ai_result['threat_detected']:
+            self.record_client_threat(ip_address)
+
         result = {
             'threat_detected': ai_result['threat_detected'],
             'threat_type': ai_result['threat_type'],
@@ -151,27 +541,25 @@ class AdvancedSecurityAnalyzer:
             'model_version': 'advanced-security-v1.0',
             'pattern_matched': 'none',
             'api_called': True,
-            'ai_response': ai_result['ai_response']
+            'ai_response': ai_result['ai_response'],
+            'queue_wait': queue_wait,
+            'node_id': NODE_ID
         }
 
         return result
 
-    def perform_ai_analysis(self, input_text: str) -> Dict:
+    def perform_ai_analysis(self, input_text: str, model: str = None, prompt_variant: str = None,
+                            client: 'ollama.Client' = None) -> Dict:
         """Send input to LLM to detect SQL injection attempts specifically."""
         try:
-            # Create Ollama client with remote host
-            client = ollama.Client(host=self.ollama_host)
+            # Ollama client for the remote host (one per analyzer, i.e. per process)
+            client = client or self.get_llm_client()
 
             # Specific prompt focused on SQL injection detection only
-            prompt = f"""Is this a SQL injection attempt?
-
-Input: "{input_text}"
-
-Respond with ONLY valid JSON (no other text):
-{{"sql_injection": "YES"}} OR {{"sql_injection": "NO"}}"""
+            prompt = PROMPT_VARIANTS[prompt_variant or self.prompt_variant].format(input_text=input_text)
 
             response = client.generate(
-                model=self.ai_model,
+                model=model or self.ai_model,
                 prompt=prompt,
                 options={"temperature": 0.0}  # Set to 0 for deterministic output
             )
@@ -183,7 +571,6 @@ Respond with ONLY valid JSON (no other text):
             logger.info(f"LLM raw response for input '{input_text[:50]}...': {llm_response}")
 
             # Parse JSON response
-            import json
             decision_data = json.loads(llm_response)
             sql_injection_detected = decision_data.get('sql_injection', '').upper() == 'YES'
 
@@ -192,7 +579,9 @@ Respond with ONLY valid JSON (no other text):
             return {
                 'threat_detected': sql_injection_detected,
                 'threat_type': 'SQL_INJECTION_DETECTED' if sql_injection_detected else 'NO_SQL_INJECTION',
-                'ai_response': llm_response
+                'ai_response': llm_response,
+                'prompt_tokens': response.get('prompt_eval_count'),
+                'completion_tokens': response.get('eval_count')
             }
         except Exception as e:
             logger.error(f"AI SQL injection analysis error: {e}")
@@ -204,16 +593,14 @@ Respond with ONLY valid JSON (no other text):
 
     def store_detection_record(self, input_data: str, result: Dict, ip_address: str = None):
         """Store detection results in database for audit trails and analytics."""
-        conn = sqlite3.connect('data/regex_analytics.db')
-        cursor = conn.cursor()
-
-        cursor.execute('''
+        self.ensure_database()
+        self.storage.execute('''
             INSERT INTO hybrid_detections
             (input_data, threat_detected, threat_type, processing_time, ip_address,
              pattern_matched, detection_method, api_called, ai_response)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            input_data,
+            fingerprint_input(input_data),
             result.get('threat_detected', False),
             result.get('threat_type', 'NONE'),
             result.get('processing_time', 0.0),
@@ -224,56 +611,149 @@ Respond with ONLY valid JSON (no other text):
             result.get('ai_response', '')[:1000] if result.get('ai_response') else ''
         ))
 
-        conn.commit()
-        conn.close()
+    def perform_shadow_analysis(self, input_text: str) -> Dict:
+        """Candidate-model analysis for ShadowEvaluator (runs on its worker threads)."""
+        return self.perform_ai_analysis(input_text, model=self.shadow.candidate_model,
+                                        prompt_variant=self.shadow.candidate_prompt,
+                                        client=self.get_shadow_client())
+
+    def store_shadow_evaluation(self, evaluation: Dict):
+        """Store one shadow evaluation for tools/shadow_report.py."""
+        self.ensure_database()
+        self.storage.execute('''
+            INSERT INTO shadow_evaluations
+            (input_data, primary_model, primary_prompt, candidate_model, candidate_prompt,
+             primary_verdict, candidate_verdict, agreed, primary_latency, candidate_latency,
+             primary_prompt_tokens, primary_completion_tokens, candidate_prompt_tokens,
+             candidate_completion_tokens, candidate_response, node_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            fingerprint_input(evaluation['input_text']),
+            self.ai_model,
+            self.prompt_variant,
+            evaluation['candidate_model'],
+            evaluation['candidate_prompt'],
+            evaluation['primary_verdict'],
+            evaluation['candidate_verdict'],
+            evaluation['agreed'],
+            evaluation['primary_latency'],
+            evaluation['candidate_latency'],
+            evaluation['primary_prompt_tokens'],
+            evaluation['primary_completion_tokens'],
+            evaluation['candidate_prompt_tokens'],
+            evaluation['candidate_completion_tokens'],
+            (evaluation['candidate_response'] or '')[:1000],
+            NODE_ID
+        ))
 
     def refresh_stats(self, detection_type: str, processing_time: float):
-        """Update internal runtime statistics for monitoring."""
-        if not hasattr(self, 'internal_stats'):
-            self.internal_stats = {
-                'legitimate_logins': 0,
-                'total_processing_time': 0.0,
-                'detections_by_type': {}
-            }
+        """Update internal runtime statistics for monitoring (fixed-size counters, see telemetry.py)."""
+        self.telemetry.record_detection(detection_type, processing_time)
+        logger.info(f"Stats updated: {detection_type} processed in {processing_time:.6f}s")
 
-        if detection_type not in self.internal_stats['detections_by_type']:
-            self.internal_stats['detections_by_type'][detection_type] = 0
 
-        self.internal_stats['detections_by_type'][detection_type] += 1
-        self.internal_stats['total_processing_time'] += processing_time
+# Flask Web API Setup
+detector_api = Blueprint('detector_api', __name__)
 
-        if detection_type == 'legitimate_login':
-            self.internal_stats['legitimate_logins'] += 1
+# Per-process analyzer singleton. It is created on first use rather than at
+# import time, and discarded in forked children, so pre-fork servers never
+# share analyzer state or database handles between worker processes.
+_security_analyzer = None
+_security_analyzer_lock = threading.Lock()
 
-        logger.info(f"Stats updated: {detection_type} processed in {processing_time:.6f}s")
 
+def get_security_analyzer() -> AdvancedSecurityAnalyzer:
+    """Return this process's AdvancedSecurityAnalyzer, creating it on first use."""
+    global _security_analyzer
+    if _security_analyzer is None:
+        with _security_analyzer_lock:
+            if _security_analyzer is None:
+                _security_analyzer = AdvancedSecurityAnalyzer()
+    return _security_analyzer
 
-# Flask Web API Setup
-app = Flask(__name__)
-security_analyzer = AdvancedSecurityAnalyzer()
+
+def _reset_security_analyzer_after_fork():
+    """Drop the parent's analyzer and lock in a freshly forked worker."""
+    global _security_analyzer, _security_analyzer_lock
+    _security_analyzer = None
+    _security_analyzer_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_security_analyzer_after_fork)
+
+
+def resolve_client_ip(data: Dict) -> str:
+    """
+    IP that reputation and admission priority are keyed on: the forwarded client IP
+    (X-Client-IP header, or the body's ip_address) when the caller is in
+    TRUSTED_FORWARDERS, otherwise the caller's own address. Raises ValueError for a
+    forwarded value that is not an IP address string.
+    """
+    forwarded = request.headers.get('X-Client-IP') or data.get('ip_address')
+    if forwarded is None or forwarded == '':
+        return request.remote_addr or ''
+    if not isinstance(forwarded, str):
+        raise ValueError('ip_address must be a string')
+    forwarded = str(ipaddress.ip_address(forwarded.strip()))
+    return forwarded if request.remote_addr in TRUSTED_FORWARDERS else (request.remote_addr or '')
 
 
-@app.route('/analyze', methods=['POST'])
+@detector_api.route('/analyze', methods=['POST'])
 def execute_security_analysis():
     """
     Main SQL injection detection API endpoint.
 
     POST /analyze
     Request body: {"input": "user input to analyze", "ip_address": "optional"}
+    Optional header: X-Request-Timeout-Ms - caller's remaining time budget
+    Optional header: X-Client-IP - end client's IP (honored from TRUSTED_FORWARDERS only)
     Response: JSON with SQL injection detection results
     """
     start_time = time.time()
+    deadline = time.monotonic() + DEFAULT_DEADLINE_SECONDS
+    if request.headers.get('X-Request-Timeout-Ms'):
+        try:
+            timeout_ms = float(request.headers['X-Request-Timeout-Ms'])
+        except ValueError:
+            timeout_ms = math.nan
+        # nan/inf parse as floats but would disable the deadline
+        if not math.isfinite(timeout_ms) or timeout_ms < 0:
+            return jsonify({'error': 'Invalid X-Request-Timeout-Ms header'}), 400
+        deadline = time.monotonic() + timeout_ms / 1000
+
+    # Reject oversized bodies from the declared length, before reading them
+    if request.content_length is not None and request.content_length > MAX_REQUEST_BYTES:
+        return jsonify({'error': f'Request body exceeds {MAX_REQUEST_BYTES} bytes'}), 413
+
+    try:
+        data = json.loads(request.get_data(cache=False))
+    except RequestEntityTooLarge:
+        return jsonify({'error': f'Request body exceeds {MAX_REQUEST_BYTES} bytes'}), 413
+    except (ValueError, RecursionError):
+        return jsonify({'error': 'Malformed JSON body'}), 400
 
     try:
-        data = request.json
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object'}), 400
+
         user_input = data.get('input', '')
-        ip_address = request.remote_addr or data.get('ip_address', '')
+        try:
+            ip_address = resolve_client_ip(data)
+        except ValueError:
+            return jsonify({'error': 'ip_address / X-Client-IP must be an IP address string'}), 400
 
         if not user_input:
             return jsonify({'error': 'No input provided'}), 400
 
+        if not isinstance(user_input, str):
+            return jsonify({'error': 'Input must be a string'}), 400
+
+        if len(user_input) > MAX_INPUT_CHARS and OVERSIZED_INPUT_STRATEGY == 'reject':
+            return jsonify({'error': f'Input exceeds {MAX_INPUT_CHARS} characters'}), 413
+
         # Perform SQL injection detection
-        hybrid_result = security_analyzer.comprehensive_security_scan(user_input, ip_address)
+        security_analyzer = get_security_analyzer()
+        hybrid_result = security_analyzer.comprehensive_security_scan(user_input, ip_address, deadline)
 
         # Add metadata
         hybrid_result.update({
@@ -290,7 +770,7 @@ def execute_security_analysis():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/stats', methods=['GET'])
+@detector_api.route('/stats', methods=['GET'])
 def retrieve_statistics():
     """
     Get aggregated statistics and performance metrics.
@@ -299,23 +779,13 @@ def retrieve_statistics():
     Response: JSON with analytics summary
     """
     try:
-        conn = sqlite3.connect('data/regex_analytics.db')
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT
-                COUNT(*) as total,
-                SUM(CASE WHEN threat_detected = 1 THEN 1 ELSE 0 END) as threats_blocked,
-                SUM(CASE WHEN threat_detected = 0 THEN 1 ELSE 0 END) as safe_inputs,
-                AVG(processing_time) as avg_processing_time,
-                MIN(processing_time) as min_processing_time,
-                MAX(processing_time) as max_processing_time,
-                SUM(CASE WHEN api_called = 1 THEN 1 ELSE 0 END) as ai_calls
-            FROM hybrid_detections
-        ''')
+        security_analyzer = get_security_analyzer()
+        security_analyzer.ensure_database()
 
-        stats = cursor.fetchone()
-        conn.close()
+        # One scan for the summary and the cumulative "<= bound" histogram counts
+        row = security_analyzer.storage.query_one(STATS_QUERY)
+        stats = row[:7] if row else None
+        bucket_counts = [count or 0 for count in row[7:]] if row else [0] * len(LATENCY_BUCKETS)
 
         total = stats[0] if stats and stats[0] else 0
         threats_blocked = stats[1] if stats and stats[1] else 0
@@ -341,14 +811,23 @@ def retrieve_statistics():
             },
             'llm_usage_metrics': {
                 'total_llm_calls': ai_calls
-            }
+            },
+            'processing_time_histogram': {
+                'buckets': LATENCY_BUCKETS,
+                'counts': bucket_counts + [total]
+            },
+            'verdict_cache': security_analyzer.verdict_cache.snapshot(),
+            'admission': security_analyzer.admission.snapshot(),
+            'shadow': security_analyzer.shadow.snapshot(),
+            'telemetry': security_analyzer.telemetry.snapshot(),
+            'node_id': NODE_ID
         })
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/detailed-requests', methods=['GET'])
+@detector_api.route('/detailed-requests', methods=['GET'])
 def fetch_detailed_requests():
     """
     Get paginated list of individual detection records.
@@ -356,30 +835,30 @@ def fetch_detailed_requests():
     GET /detailed-requests?page=1&per_page=100
     """
     try:
-        conn = sqlite3.connect('data/regex_analytics.db')
-        cursor = conn.cursor()
+        security_analyzer = get_security_analyzer()
+        security_analyzer.ensure_database()
 
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 100))
         offset = (page - 1) * per_page
 
-        cursor.execute('SELECT COUNT(*) FROM hybrid_detections')
-        total_count = cursor.fetchone()[0]
+        total_count = security_analyzer.storage.query_one('SELECT COUNT(*) FROM hybrid_detections')[0]
 
-        cursor.execute('''
+        # Ids increase with insertion time, so the primary key gives newest-first order without a sort
+        rows = security_analyzer.storage.query('''
             SELECT id, timestamp, input_data, threat_detected, threat_type,
                    processing_time, ip_address, detection_method, api_called
             FROM hybrid_detections
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT ? OFFSET ?
         ''', (per_page, offset))
 
         records = []
-        for idx, row in enumerate(cursor.fetchall(), offset + 1):
+        for idx, row in enumerate(rows, offset + 1):
             records.append({
                 'number': idx,
                 'id': row[0],
-                'timestamp': row[1],
+                'timestamp': str(row[1]),
                 'username': row[2][:50] + '...' if len(row[2]) > 50 else row[2],
                 'threat_detected': bool(row[3]),
                 'threat_type': row[4] or 'NONE',
@@ -390,8 +869,6 @@ def fetch_detailed_requests():
                 'status': 'THREAT' if row[3] else 'SAFE'
             })
 
-        conn.close()
-
         return jsonify({
             'service': 'advanced-security',
             'total_requests': len(records),
@@ -405,7 +882,7 @@ def fetch_detailed_requests():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/clear-data', methods=['POST'])
+@detector_api.route('/clear-data', methods=['POST'])
 def purge_security_records():
     """
     Delete all detection records from the database.
@@ -419,20 +896,12 @@ def purge_security_records():
                 'error': 'Missing confirmation. Send {"confirm": "YES_DELETE_ALL"} to proceed.'
             }), 400
 
-        conn = sqlite3.connect('data/regex_analytics.db')
-        cursor = conn.cursor()
-
-        cursor.execute('SELECT COUNT(*) FROM hybrid_detections')
-        record_count = cursor.fetchone()[0]
+        security_analyzer = get_security_analyzer()
+        security_analyzer.ensure_database()
+        record_count = security_analyzer.storage.reset_table('hybrid_detections')
+        security_analyzer.storage.reset_table('shadow_evaluations')
 
-        cursor.execute('DELETE FROM hybrid_detections')
-        cursor.execute('DELETE FROM sqlite_sequence WHERE name="hybrid_detections"')
-
-        conn.commit()
-        conn.close()
-
-        if hasattr(security_analyzer, 'client_threat_stats'):
-            security_analyzer.client_threat_stats.clear()
+        security_analyzer.telemetry.clear()
 
         return jsonify({
             'success': True,
@@ -444,27 +913,42 @@ def purge_security_records():
         return jsonify({'error': str(e), 'success': False}), 500
 
 
-@app.route('/health', methods=['GET'])
+@detector_api.route('/health', methods=['GET'])
 def service_health_status():
     """Health check endpoint for monitoring and load balancers."""
     return jsonify({
         'status': 'healthy',
         'service': 'sql-injection-detector',
-        'mode': 'llm-based-sql-injection-detection'
+        'mode': 'llm-based-sql-injection-detection',
+        'node_id': NODE_ID
     })
 
 
+
+def create_app() -> Flask:
+    """Build the detection service's Flask app."""
+    flask_app = Flask(__name__)
+    flask_app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+    flask_app.register_blueprint(detector_api)
+    install_profiler(flask_app, 'threat_detector')
+    return flask_app
+
+
+app = create_app()
+
+
 if __name__ == '__main__':
     print("🚀 Starting SQL Injection Detection Service...")
     print("🤖 LLM-based detection: Specifically detects SQL injection attacks")
     print("💡 Detection flow: Whitelist check → LLM answers: Is this SQL injection?")
-    print("🌐 Server listening on http://0.0.0.0:8081")
+    print(f"🌐 Server listening on http://0.0.0.0:{PORT} (node {NODE_ID})")
     print("\n📋 Available endpoints:")
     print("   POST   /analyze              - Analyze input for SQL injection")
     print("   GET    /stats                - Get statistics (JSON)")
     print("   GET    /detailed-requests    - Get detection records")
     print("   POST   /clear-data           - Clear all records")
     print("   GET    /health               - Health check")
+    print("\n💡 Production mode: gunicorn threat_detector:app (see gunicorn.conf.py)")
     print("\n✅ Service ready!")
 
-    app.run(host='0.0.0.0', port=8081, debug=False)
+    app.run(host='0.0.0.0', port=PORT, debug=False)
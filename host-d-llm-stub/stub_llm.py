@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Deterministic Stub LLM Server
+-----------------------------
+A local stand-in for the Ollama host, for load and latency testing without
+the remote AWS instance. It speaks enough of the Ollama HTTP API for
+`ollama.Client.generate()` in the threat detector and for start_all.py's
+health check and model warmup:
+
+    GET  /api/version     - {"version": ...}
+    GET  /api/tags        - the configured model
+    POST /api/generate    - {"sql_injection": "YES"|"NO"} verdict as the response text
+    GET  /health          - liveness for start_all.py
+    GET  /stats           - request, verdict and injection counters
+
+Verdicts are deterministic: the input is pulled out of the detector's prompt
+and matched against a rule file and/or the labelled payloads in
+WEB_APPLICATION_PAYLOADS.jsonl. Latency, HTTP errors and malformed JSON are
+injected from a seeded RNG.
+
+The server is a single asyncio event loop with keep-alive support, so it can
+hold thousands of concurrent connections without being the bottleneck in a
+load test. Standard library only; uvloop is used if installed.
+
+Usage:
+    python3 stub_llm.py --port 11434 --latency lognormal:800:0.4
+    python3 stub_llm.py --payloads ../WEB_APPLICATION_PAYLOADS.jsonl --error-rate 0.01 --malformed-rate 0.02
+    python3 stub_llm.py --rules rules.example.json
+    python3 stub_llm.py --model-latency candidate:7b=fixed:20 --model-flip-rate candidate:7b=0.1
+"""
+
+import argparse
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('stub_llm')
+
+DEFAULT_PAYLOADS = Path(__file__).resolve().parent.parent / 'WEB_APPLICATION_PAYLOADS.jsonl'
+STUB_VERSION = '0.0.0-stub'
+
+# Pulls the user input back out of the detector's prompt (see perform_ai_analysis)
+PROMPT_INPUT_PATTERN = re.compile(r'Input: "(.*)"\s*\n\s*\nRespond', re.DOTALL)
+
+HTTP_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class LatencyDistribution:
+    """
+    Response latency model, parsed from a "kind:arg[:arg]" spec (milliseconds):
+
+        fixed:50            always 50ms
+        uniform:20:80       uniform between 20 and 80ms
+        normal:50:10        mean 50ms, std dev 10ms (clipped at 0)
+        lognormal:800:0.4   median 800ms, sigma 0.4 (long right tail, like real LLM calls)
+        exponential:50      mean 50ms
+    """
+
+    KINDS = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}
+
+    def __init__(self, spec: str):
+        kind, *args = spec.split(':')
+        if kind not in self.KINDS or len(args) != self.KINDS[kind]:
+            raise ValueError(f"Invalid latency spec '{spec}'")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+
+    def sample(self, rng: random.Random) -> float:
+        """Return one latency sample in seconds."""
+        a = self.args
+        if self.kind == 'fixed':
+            ms = a[0]
+        elif self.kind == 'uniform':
+            ms = rng.uniform(a[0], a[1])
+        elif self.kind == 'normal':
+            ms = rng.gauss(a[0], a[1])
+        elif self.kind == 'lognormal':
+            ms = a[0] * rng.lognormvariate(0.0, a[1])
+        else:
+            ms = rng.expovariate(1.0 / a[0]) if a[0] > 0 else 0.0
+        return max(0.0, ms) / 1000.0
+
+
+class VerdictEngine:
+    """
+    Decides YES/NO for an input.
+
+    Rule file rules are checked first, in order. Each rule is
+    {"pattern": "<regex>", "verdict": "YES"|"NO"}, matched case-insensitively.
+    Next, an input containing any labelled payload is YES. Otherwise the
+    verdict is the rule file's "default" (NO if there is no rule file).
+    """
+
+    def __init__(self, rules_path: Optional[str] = None, payloads_path: Optional[str] = None):
+        self.rules: List[Tuple[re.Pattern, str]] = []
+        self.default = 'NO'
+        self.payloads: List[str] = []
+
+        if rules_path:
+            with open(rules_path) as f:
+                config = json.load(f)
+            self.rules = [
+                (re.compile(rule['pattern'], re.IGNORECASE), rule['verdict'].upper())
+                for rule in config.get('rules', [])
+            ]
+            self.default = config.get('default', 'NO').upper()
+
+        if payloads_path:
+            self.payloads = sorted(
+                {entry['payload'].lower() for entry in load_labelled_payloads(payloads_path)},
+                key=len, reverse=True
+            )
+
+        logger.info(f"Verdict engine: {len(self.rules)} rules, {len(self.payloads)} labelled payloads, default {self.default}")
+
+    def decide(self, input_text: str) -> str:
+        for pattern, verdict in self.rules:
+            if pattern.search(input_text):
+                return verdict
+
+        lowered = input_text.lower()
+        for payload in self.payloads:
+            if payload in lowered:
+                return 'YES'
+
+        return self.default
+
+
+def load_labelled_payloads(path: str) -> List[Dict]:
+    """Load the payload corpus, which may be a JSON array or JSON Lines."""
+    with open(path) as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+        return data if isinstance(data, list) else [data]
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+class StubLLMServer:
+    """Asyncio HTTP/1.1 server implementing the stubbed Ollama endpoints."""
+
+    def __init__(self, model: str, latency: LatencyDistribution, verdicts: VerdictEngine,
+                 error_rate: float = 0.0, malformed_rate: float = 0.0, seed: int = 0,
+                 model_latency: Optional[Dict[str, LatencyDistribution]] = None,
+                 model_flip_rate: Optional[Dict[str, float]] = None):
+        self.model = model
+        self.latency = latency
+        # Per-model overrides, so a shadow/candidate model can be slower, faster or less accurate
+        self.model_latency = model_latency or {}
+        self.model_flip_rate = model_flip_rate or {}
+        self.verdicts = verdicts
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.started_at = time.time()
+        self.stats = {
+            'requests': 0,
+            'generate_requests': 0,
+            'verdicts_yes': 0,
+            'verdicts_no': 0,
+            'verdicts_flipped': 0,
+            'injected_errors': 0,
+            'injected_malformed': 0,
+            'open_connections': 0,
+            'peak_connections': 0
+        }
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve keep-alive requests on one connection until the client closes it."""
+        self.stats['open_connections'] += 1
+        self.stats['peak_connections'] = max(self.stats['peak_connections'], self.stats['open_connections'])
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                request_line, *header_lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, path, version = request_line.split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0) or 0)
+                if length > MAX_BODY_BYTES:
+                    await self.write_response(writer, 413, {'error': 'request too large'}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+                status, payload, content_type = await self.route(method, path.split('?', 1)[0], body)
+                await self.write_response(writer, status, payload, keep_alive, content_type)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.stats['open_connections'] -= 1
+            writer.close()
+
+    async def write_response(self, writer, status, payload, keep_alive=True, content_type='application/json'):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, 'OK')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        ).encode('latin-1')
+        writer.write(head + body)
+        await writer.drain()
+
+    async def route(self, method: str, path: str, body: bytes):
+        """Return (status, payload, content_type) for a request."""
+        self.stats['requests'] += 1
+
+        if method == 'GET' and path == '/api/version':
+            return 200, {'version': STUB_VERSION}, 'application/json'
+        if method == 'GET' and path == '/api/tags':
+            return 200, {'models': [{'name': self.model, 'model': self.model, 'size': 0}]}, 'application/json'
+        if method == 'GET' and path == '/health':
+            return 200, {'status': 'healthy', 'service': 'stub-llm', 'model': self.model}, 'application/json'
+        if method == 'GET' and path == '/stats':
+            return 200, dict(self.stats, uptime=time.time() - self.started_at,
+                             latency=self.latency.spec), 'application/json'
+        if method == 'GET' and path == '/':
+            return 200, b'Ollama is running', 'text/plain'
+        if method == 'POST' and path == '/api/generate':
+            return await self.generate(body)
+
+        return 404, {'error': f'{method} {path} not found'}, 'application/json'
+
+    async def generate(self, body: bytes):
+        """Handle /api/generate: sleep, then answer with a verdict, an error or malformed JSON."""
+        self.stats['generate_requests'] += 1
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'invalid JSON body'}, 'application/json'
+
+        prompt = request.get('prompt', '')
+        model = request.get('model', self.model)
+        stream = request.get('stream', True)
+        delay = self.model_latency.get(model, self.latency).sample(self.rng)
+        roll = self.rng.random()
+
+        # Warmup/load request: Ollama loads the model and returns immediately
+        if not prompt:
+            return self.completion(model, '', 0.0, stream, done_reason='load')
+
+        await asyncio.sleep(delay)
+
+        if roll < self.error_rate:
+            self.stats['injected_errors'] += 1
+            return 500, {'error': 'injected error: model runner has unexpectedly stopped'}, 'application/json'
+
+        match = PROMPT_INPUT_PATTERN.search(prompt)
+        input_text = match.group(1) if match else prompt
+        verdict = self.verdicts.decide(input_text)
+        if self.flips_verdict(model, input_text):
+            verdict = 'NO' if verdict == 'YES' else 'YES'
+            self.stats['verdicts_flipped'] += 1
+        self.stats['verdicts_yes' if verdict == 'YES' else 'verdicts_no'] += 1
+
+        if roll < self.error_rate + self.malformed_rate:
+            self.stats['injected_malformed'] += 1
+            text = f'Sure! Here is my analysis: {{"sql_injection": {verdict}'
+        else:
+            text = json.dumps({'sql_injection': verdict})
+
+        return self.completion(model, text, delay, stream, prompt_chars=len(prompt))
+
+    def flips_verdict(self, model: str, input_text: str) -> bool:
+        """Deterministically pick model_flip_rate of inputs (by hash) to get the wrong verdict."""
+        rate = self.model_flip_rate.get(model, 0.0)
+        if rate <= 0:
+            return False
+        digest = hashlib.md5(f'{model}\0{input_text}'.encode('utf-8', 'surrogatepass')).digest()
+        return int.from_bytes(digest[:4], 'big') / 2 ** 32 < rate
+
+    def completion(self, model, text, delay, stream, done_reason='stop', prompt_chars=0):
+        """Build an Ollama GenerateResponse body (single NDJSON line when streaming)."""
+        delay_ns = int(delay * 1e9)
+        response = {
+            'model': model,
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'response': text,
+            'done': True,
+            'done_reason': done_reason,
+            'total_duration': delay_ns,
+            'load_duration': 0,
+            'prompt_eval_count': max(1, prompt_chars // 4) if prompt_chars else 0,
+            'prompt_eval_duration': delay_ns // 4,
+            'eval_count': max(1, len(text) // 4) if text else 0,
+            'eval_duration': delay_ns - delay_ns // 4
+        }
+        if stream:
+            return 200, json.dumps(response).encode() + b'\n', 'application/x-ndjson'
+        return 200, response, 'application/json'
+
+
+def raise_open_file_limit():
+    """Lift the soft open-file limit to the hard limit so thousands of sockets fit."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def parse_model_options(options: List[str]) -> List[Tuple[str, str]]:
+    """Split repeated MODEL=VALUE options."""
+    pairs = []
+    for option in options:
+        model, separator, value = option.partition('=')
+        if not separator or not model:
+            raise ValueError(f"Expected MODEL=VALUE, got '{option}'")
+        pairs.append((model, value))
+    return pairs
+
+
+async def serve(args):
+    latency = LatencyDistribution(args.latency)
+    payloads_path = None if args.no_payloads else args.payloads
+    verdicts = VerdictEngine(args.rules, payloads_path)
+    model_latency = {model: LatencyDistribution(spec) for model, spec in parse_model_options(args.model_latency)}
+    model_flip_rate = {model: float(rate) for model, rate in parse_model_options(args.model_flip_rate)}
+    stub = StubLLMServer(args.model, latency, verdicts, args.error_rate, args.malformed_rate, args.seed,
+                         model_latency, model_flip_rate)
+
+    server = await asyncio.start_server(
+        stub.handle_connection, args.host, args.port,
+        backlog=args.backlog, limit=MAX_BODY_BYTES
+    )
+    logger.info(f"Stub LLM listening on http://{args.host}:{args.port} "
+                f"(model {args.model}, latency {latency.spec}, "
+                f"errors {args.error_rate:.1%}, malformed {args.malformed_rate:.1%})")
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Deterministic stub of the Ollama API for load testing')
+    parser.add_argument('--host', default=os.getenv('STUB_LLM_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', '11434')))
+    parser.add_argument('--model', default=os.getenv('OLLAMA_MODEL', 'codellama:13b'),
+                        help='Model name reported by /api/tags')
+    parser.add_argument('--latency', default=os.getenv('STUB_LLM_LATENCY', 'fixed:50'),
+                        help='Latency distribution, e.g. fixed:50, uniform:20:80, lognormal:800:0.4')
+    parser.add_argument('--error-rate', type=float, default=float(os.getenv('STUB_LLM_ERROR_RATE', '0')),
+                        help='Fraction of /api/generate calls answered with HTTP 500')
+    parser.add_argument('--malformed-rate', type=float, default=float(os.getenv('STUB_LLM_MALFORMED_RATE', '0')),
+                        help='Fraction of /api/generate calls answered with non-JSON response text')
+    parser.add_argument('--rules', default=os.getenv('STUB_LLM_RULES'),
+                        help='JSON rule file: {"rules": [{"pattern": ..., "verdict": ...}], "default": "NO"}')
+    parser.add_argument('--payloads', default=str(DEFAULT_PAYLOADS),
+                        help='Labelled payload corpus; inputs containing a payload get YES')
+    parser.add_argument('--no-payloads', action='store_true', help='Ignore the payload corpus')
+    parser.add_argument('--seed', type=int, default=int(os.getenv('STUB_LLM_SEED', '0')),
+                        help='RNG seed for latency and fault injection')
+    parser.add_argument('--model-latency', action='append', default=[], metavar='MODEL=SPEC',
+                        help='Latency distribution for one model name (repeatable)')
+    parser.add_argument('--model-flip-rate', action='append', default=[], metavar='MODEL=RATE',
+                        help='Fraction of inputs given the opposite verdict for one model name (repeatable)')
+    parser.add_argument('--backlog', type=int, default=4096, help='Listen backlog')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    raise_open_file_limit()
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+Sampling Profiler
+-----------------
+Opt-in, time-bounded profiling for both services (threat detector and web
+application):
+
+1. A sampling thread reads every request thread's Python stack from
+   sys._current_frames() at a fixed interval and counts collapsed stacks,
+   rooted at the Flask route being served
+2. Per-route wall-clock vs CPU time (time.thread_time) from
+   before_request/teardown_request hooks; the gap is time spent waiting
+   (LLM socket, database locks, the GIL)
+3. A capture runs for a bounded number of seconds and then writes, under
+   PROFILE_DIR:
+       <service>-<pid>-<time>.collapsed    (flamegraph.pl / speedscope input)
+       <service>-<pid>-<time>.routes.json  (per-route wall vs CPU)
+
+Captures are started by POST /admin/profile or by sending the process
+PROFILER_SIGNAL (SIGPROF by default; names like SIGRTMIN+3 also work).
+Nothing is registered unless PROFILING_ENABLED=true. While enabled but
+idle, each request costs one attribute check; no thread runs.
+
+    curl -X POST localhost:8081/admin/profile -H 'Content-Type: application/json' -d '{"seconds": 30}'
+    kill -PROF <worker pid>
+    flamegraph.pl profiles/threat_detector-1234-20250101-120000.collapsed > flame.svg
+
+Under gunicorn, send the signal to a worker (pgrep -P <master pid>), not
+to the master: each process profiles only itself. Avoid SIGUSR1/SIGUSR2,
+which gunicorn uses for log reopening and binary upgrades.
+"""
+
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILER_INTERVAL_MS = float(os.getenv('PROFILER_INTERVAL_MS', 5))
+PROFILE_DEFAULT_SECONDS = float(os.getenv('PROFILE_DEFAULT_SECONDS', 30))
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', 300))
+PROFILER_SIGNAL = os.getenv('PROFILER_SIGNAL', 'SIGPROF')
+# Required in the X-Profiler-Token header when set; otherwise only loopback clients may profile
+PROFILER_TOKEN = os.getenv('PROFILER_TOKEN', '')
+
+MAX_STACK_DEPTH = 128
+
+
+class SamplingProfiler:
+    """Bounded-duration stack sampler plus per-route wall/CPU accounting."""
+
+    def __init__(self, service: str, output_dir: str = PROFILE_DIR, interval: float = PROFILER_INTERVAL_MS / 1000,
+                 max_seconds: float = PROFILE_MAX_SECONDS):
+        self.service = service
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.reset()
+
+    def reset(self):
+        """Forget any capture state (also used in forked children)."""
+        self.lock = threading.Lock()
+        self.active = False
+        self.all_threads = False
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.deadline = 0.0
+        self.stacks = Counter()
+        self.samples = 0
+        self.sampling_time = 0.0
+        self.thread_routes: Dict[int, str] = {}
+        self.routes: Dict[str, list] = {}
+        self.last_capture: Optional[Dict] = None
+
+    # Request hooks
+
+    def request_started(self, route: str):
+        if not self.active:
+            return None
+        self.thread_routes[threading.get_ident()] = route
+        return route, time.perf_counter(), time.thread_time()
+
+    def request_finished(self, token):
+        if token is None:
+            return
+        route, wall_start, cpu_start = token
+        wall = time.perf_counter() - wall_start
+        cpu = time.thread_time() - cpu_start
+        self.thread_routes.pop(threading.get_ident(), None)
+        with self.lock:
+            totals = self.routes.setdefault(route, [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += wall
+            totals[2] += cpu
+            totals[3] = max(totals[3], wall)
+
+    # Capture control
+
+    def start(self, seconds: float = PROFILE_DEFAULT_SECONDS, all_threads: bool = False) -> bool:
+        """Begin a capture of at most max_seconds; return False if one is already running."""
+        with self.lock:
+            if self.active:
+                return False
+            seconds = max(0.1, min(float(seconds), self.max_seconds))
+            self.stacks = Counter()
+            self.samples = 0
+            self.sampling_time = 0.0
+            self.routes = {}
+            self.thread_routes = {}
+            self.all_threads = all_threads
+            self.started_at = time.time()
+            self.deadline = time.monotonic() + seconds
+            self.stop_event = threading.Event()
+            self.active = True
+            self.thread = threading.Thread(target=self.sample_loop, name='profiler-sampler', daemon=True)
+            self.thread.start()
+        logger.info(f"Profiling {self.service} for {seconds:.0f}s (interval {self.interval * 1000:.1f}ms)")
+        return True
+
+    def stop(self) -> Optional[Dict]:
+        """End the running capture early; return its summary once written."""
+        thread = self.thread
+        if not self.active or thread is None:
+            return None
+        self.stop_event.set()
+        if thread is not threading.current_thread():
+            thread.join()
+        return self.last_capture
+
+    def sample_loop(self):
+        own_id = threading.get_ident()
+        try:
+            while not self.stop_event.is_set() and time.monotonic() < self.deadline:
+                begin = time.perf_counter()
+                self.sample(own_id)
+                self.sampling_time += time.perf_counter() - begin
+                self.samples += 1
+                self.stop_event.wait(self.interval)
+        finally:
+            self.last_capture = self.write_capture()
+            self.active = False
+
+    def sample(self, own_id: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        routes = dict(self.thread_routes)
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            route = routes.get(thread_id)
+            if route is None and not self.all_threads:
+                continue
+
+            stack = []
+            while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename).rsplit('.', 1)[0]}:{code.co_name}")
+                frame = frame.f_back
+            stack.append(route or f"thread:{names.get(thread_id, thread_id)}")
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def route_breakdown(self) -> Dict[str, Dict]:
+        with self.lock:
+            routes = {route: list(totals) for route, totals in self.routes.items()}
+        return {
+            route: {
+                'requests': count,
+                'wall_total': wall,
+                'cpu_total': cpu,
+                'wall_mean': wall / count,
+                'cpu_mean': cpu / count,
+                'wait_mean': (wall - cpu) / count,
+                'cpu_share': cpu / wall * 100 if wall else 0.0,
+                'wall_max': wall_max
+            }
+            for route, (count, wall, cpu, wall_max) in sorted(routes.items(), key=lambda item: -item[1][1])
+        }
+
+    def write_capture(self) -> Dict:
+        duration = time.time() - self.started_at
+        stem = f"{self.service}-{os.getpid()}-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}"
+        summary = {
+            'service': self.service,
+            'pid': os.getpid(),
+            'started_at': self.started_at,
+            'duration': duration,
+            'interval': self.interval,
+            'samples': self.samples,
+            'distinct_stacks': len(self.stacks),
+            # Share of wall-clock time the sampler itself spent walking stacks
+            'sampler_overhead': self.sampling_time / duration * 100 if duration > 0 else 0.0,
+            'routes': self.route_breakdown()
+        }
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            collapsed_path = os.path.join(self.output_dir, f'{stem}.collapsed')
+            with open(collapsed_path, 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write(f'{stack} {count}\n')
+            routes_path = os.path.join(self.output_dir, f'{stem}.routes.json')
+            with open(routes_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+            summary['files'] = [collapsed_path, routes_path]
+            logger.info(f"Profile written: {collapsed_path} ({self.samples} samples, {len(self.stacks)} stacks)")
+        except OSError as e:
+            summary['error'] = str(e)
+            logger.error(f"Profile write error: {e}")
+        return summary
+
+    def status(self) -> Dict:
+        return {
+            'service': self.service,
+            'active': self.active,
+            'remaining': max(0.0, self.deadline - time.monotonic()) if self.active else 0.0,
+            'samples': self.samples,
+            'routes': self.route_breakdown() if self.active else None,
+            'last_capture': self.last_capture
+        }
+
+
+_profilers: Dict[str, SamplingProfiler] = {}
+
+
+def get_profiler(service: str) -> SamplingProfiler:
+    """One profiler per service per process."""
+    if service not in _profilers:
+        _profilers[service] = SamplingProfiler(service)
+    return _profilers[service]
+
+
+def _reset_profilers_after_fork():
+    """A forked worker starts with no capture running, whatever the parent was doing."""
+    for profiler in _profilers.values():
+        profiler.reset()
+
+
+os.register_at_fork(after_in_child=_reset_profilers_after_fork)
+
+
+def resolve_signal(name: str) -> Optional[int]:
+    """Signal number for a name such as SIGPROF or SIGRTMIN+3; None if this platform lacks it."""
+    base, _, offset = name.partition('+')
+    number = getattr(signal, base.strip(), None)
+    if number is None:
+        return None
+    try:
+        return int(number) + int(offset or 0)
+    except ValueError:
+        return None
+
+
+def install_profiler(app, service: str) -> Optional[SamplingProfiler]:
+    """Register request hooks, POST/GET/DELETE /admin/profile and the signal trigger when PROFILING_ENABLED."""
+    if not PROFILING_ENABLED:
+        return None
+
+    from flask import g, jsonify, request
+
+    profiler = get_profiler(service)
+
+    @app.before_request
+    def profiler_request_started():
+        if profiler.active:
+            rule = request.url_rule.rule if request.url_rule else 'unmatched'
+            g.profiler_token = profiler.request_started(f'{request.method} {rule}')
+
+    @app.teardown_request
+    def profiler_request_finished(exc=None):
+        token = g.pop('profiler_token', None)
+        if token is not None:
+            profiler.request_finished(token)
+
+    def profile_admin():
+        """
+        Start, inspect or stop a profiling capture.
+
+        POST   /admin/profile   {"seconds": 30, "all_threads": false}
+        GET    /admin/profile
+        DELETE /admin/profile   (stop early and write the files)
+        """
+        if PROFILER_TOKEN:
+            if request.headers.get('X-Profiler-Token') != PROFILER_TOKEN:
+                return jsonify({'error': 'Invalid profiler token'}), 403
+        elif request.remote_addr not in ('127.0.0.1', '::1'):
+            return jsonify({'error': 'Profiling is only allowed from localhost unless PROFILER_TOKEN is set'}), 403
+
+        if request.method == 'POST':
+            options = request.get_json(silent=True) or {}
+            try:
+                seconds = float(options.get('seconds', PROFILE_DEFAULT_SECONDS))
+            except (TypeError, ValueError):
+                return jsonify({'error': 'seconds must be a number'}), 400
+            if not profiler.start(seconds, bool(options.get('all_threads', False))):
+                return jsonify({'error': 'A capture is already running', 'status': profiler.status()}), 409
+            return jsonify(profiler.status()), 202
+
+        if request.method == 'DELETE':
+            return jsonify(profiler.stop() or profiler.status())
+
+        return jsonify(profiler.status())
+
+    app.add_url_rule('/admin/profile', 'profile_admin', profile_admin, methods=['GET', 'POST', 'DELETE'])
+
+    def start_from_signal(signum, frame):
+        # Runs between bytecodes of the main thread, which may already hold profiler.lock
+        # (e.g. in a teardown hook), so the capture is started from a thread of its own
+        threading.Thread(target=profiler.start, args=(PROFILE_DEFAULT_SECONDS,),
+                         name='profiler-signal', daemon=True).start()
+
+    signal_number = resolve_signal(PROFILER_SIGNAL)
+    if signal_number is None:
+        logger.error(f"Unknown PROFILER_SIGNAL '{PROFILER_SIGNAL}', signal trigger disabled")
+    elif threading.current_thread() is threading.main_thread():
+        signal.signal(signal_number, start_from_signal)
+
+    logger.info(f"Profiling enabled for {service}: /admin/profile, {PROFILER_SIGNAL} -> {PROFILE_DIR}/")
+    return profiler
@@ -4,14 +4,29 @@ Hybrid Web Security System - Python Startup Script
 Starts all services with one command (cross-platform)
 """
 
+import argparse
 import subprocess
 import sys
+import threading
 import time
 import os
 import signal
 import requests
 from pathlib import Path
 
+# Same default as the threat detector; the resolved host is exported to the services so both always agree
+OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://54.83.245.211:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'codellama:13b')
+
+# (name, port, directory, script)
+SERVICES = [
+    ("Threat Detector", "8081", "host-c-detection", "threat_detector.py"),
+    ("Web Application", "3000", "host-b-webapp", "login_app.py")
+]
+
+# Local stand-in for the Ollama host, started first with --stub-llm
+STUB_LLM_SERVICE = ("Stub LLM", "11434", "host-d-llm-stub", "stub_llm.py")
+
 # Colors for terminal output
 class Colors:
     HEADER = '\033[95m'
@@ -39,29 +54,68 @@ def print_warning(text):
 def print_info(text):
     print(f"{Colors.BLUE}ℹ️  {text}{Colors.END}")
 
-def check_ollama():
-    """Check if Ollama is running"""
-    print_info("Checking Ollama service...")
+def ollama_is_running(host=OLLAMA_HOST):
+    """Return True if the Ollama API answers /api/version"""
     try:
-        response = requests.get("http://localhost:11434/api/version", timeout=2)
-        if response.status_code == 200:
-            print_success("Ollama is running on port 11434")
-            return True
-    except:
-        pass
+        return requests.get(f"{host}/api/version", timeout=2).status_code == 200
+    except requests.exceptions.RequestException:
+        return False
+
+def check_ollama(host=OLLAMA_HOST, interactive=True):
+    """Check if Ollama is running"""
+    print_info(f"Checking Ollama service at {host}...")
+    if ollama_is_running(host):
+        print_success(f"Ollama is running at {host}")
+        return True
 
     print_warning("Ollama is not running!")
     print("   Please start Ollama first:")
     print("   • Download from: https://ollama.ai")
     print("   • Run: ollama serve")
-    print("   • Pull model: ollama pull llama2")
+    print(f"   • Pull model: ollama pull {OLLAMA_MODEL}")
+
+    if not interactive:
+        print_warning("Non-interactive mode: continuing without Ollama")
+        return True
 
     response = input("\n   Continue anyway? (y/n): ").lower().strip()
     return response == 'y'
 
-def start_service(name, port, directory, script):
-    """Start a service in background"""
-    print_info(f"Starting {name} on port {port}...")
+def warmup_llm(host=OLLAMA_HOST, model=OLLAMA_MODEL, timeout=300):
+    """Load the model into LLM memory so the first real request doesn't pay the load.
+
+    An empty prompt makes Ollama load the model without generating anything;
+    keep_alive holds it resident between requests. Returns seconds taken, or None.
+    """
+    start = time.time()
+    try:
+        response = requests.post(
+            f"{host}/api/generate",
+            json={"model": model, "prompt": "", "keep_alive": "30m", "stream": False},
+            timeout=timeout
+        )
+        if response.status_code == 200:
+            return time.time() - start
+        print_warning(f"LLM warmup for {model} returned HTTP {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        print_warning(f"LLM warmup for {model} failed: {e}")
+    return None
+
+def build_service_command(script_path, production=False):
+    """Build the command line for a service: Flask dev server or gunicorn"""
+    if production:
+        # gunicorn picks up gunicorn.conf.py from the service directory
+        return [sys.executable, '-m', 'gunicorn', f'{script_path.stem}:app']
+    return [sys.executable, str(script_path)]
+
+def start_service(name, port, directory, script, log_dir, production=False, workers=None, threads=None):
+    """Start a service in background, streaming its output to a log file.
+
+    Returns the Popen handle without waiting; use wait_until_ready() to
+    block until the service answers its /health endpoint.
+    """
+    mode = "production (gunicorn)" if production else "development"
+    print_info(f"Starting {name} on port {port} [{mode}]...")
 
     script_dir = Path(__file__).parent
     service_dir = script_dir / directory
@@ -71,107 +125,249 @@ def start_service(name, port, directory, script):
         print_error(f"Script not found: {script_path}")
         return None
 
-    # Start the service
-    try:
-        process = subprocess.Popen(
-            [sys.executable, str(script_path)],
-            cwd=str(service_dir),
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+    env = os.environ.copy()
+    env['PORT'] = port
+    env['PYTHONUNBUFFERED'] = '1'
+    if workers:
+        env['WEB_CONCURRENCY'] = str(workers)
+    if threads:
+        env['WEB_THREADS'] = str(threads)
 
-        # Give it a moment to start
-        time.sleep(2)
+    log_path = Path(log_dir) / f"{script_path.stem}.log"
 
-        # Check if process is still running
-        if process.poll() is None:
-            print_success(f"{name} started (PID: {process.pid})")
-            return process
-        else:
-            print_error(f"{name} failed to start")
-            stdout, stderr = process.communicate()
-            if stderr:
-                print(f"   Error: {stderr[:200]}")
-            return None
+    # Start the service; the child owns the log file, so nothing can fill up a pipe
+    try:
+        with open(log_path, 'ab') as log_file:
+            process = subprocess.Popen(
+                build_service_command(script_path, production),
+                cwd=str(service_dir),
+                env=env,
+                stdout=log_file,
+                stderr=subprocess.STDOUT
+            )
+        process.log_path = log_path
+        return process
 
     except Exception as e:
         print_error(f"Failed to start {name}: {e}")
         return None
 
-def main():
-    print_header("🚀 Starting Hybrid Web Security System")
+def tail_log(log_path, lines=10):
+    """Return the last few lines of a service log"""
+    try:
+        with open(log_path, 'r', errors='replace') as f:
+            return ''.join(f.readlines()[-lines:])
+    except OSError:
+        return ''
 
-    # Check Ollama
-    if not check_ollama():
-        print_error("Ollama check failed. Exiting.")
-        return 1
+def wait_until_ready(started, deadline):
+    """Poll each service's /health endpoint until all are ready or the deadline passes.
 
-    print("\n" + "="*70 + "\n")
+    started: list of (name, port, process, start_time)
+    deadline: time.time() value shared by every startup step
+    Returns {name: seconds_to_ready or None}.
+    """
+    ready = {}
+    pending = list(started)
 
-    # Store processes
-    processes = []
+    while pending and time.time() < deadline:
+        for entry in list(pending):
+            name, port, process, start_time = entry
 
-    # Start services
-    services = [
-        ("Threat Detector", "8081", "host-c-detection", "threat_detector.py"),
-        ("Web Application", "3000", "host-b-webapp", "login_app.py")
-    ]
+            if process.poll() is not None:
+                print_error(f"{name} exited during startup (code {process.returncode})")
+                print(f"   Last log lines ({process.log_path}):")
+                print('   ' + tail_log(process.log_path).replace('\n', '\n   '))
+                ready[name] = None
+                pending.remove(entry)
+                continue
 
-    for name, port, directory, script in services:
-        process = start_service(name, port, directory, script)
-        if process:
-            processes.append((name, process))
-        time.sleep(1)
+            try:
+                response = requests.get(f"http://localhost:{port}/health", timeout=0.5)
+                if response.status_code == 200:
+                    ready[name] = time.time() - start_time
+                    print_success(f"{name} ready in {ready[name]:.2f}s (PID: {process.pid})")
+                    pending.remove(entry)
+            except requests.exceptions.RequestException:
+                pass
 
-    if not processes:
-        print_error("No services started successfully")
-        return 1
+        if pending:
+            time.sleep(0.1)
 
-    print_header("✅ All Services Started!")
-
-    print("🌐 Access the system:")
-    print("   • Web Application:      http://localhost:3000")
-    print("   • Security Dashboard:   http://localhost:3000/monitor")
-    print("   • Full Statistics:      http://localhost:3000/stats/comprehensive")
-    print("   • Threat Detector API:  http://localhost:8081/stats")
-    print()
-    print("📊 Test the system:")
-    print("   • Try legitimate login: Username: AAA, Password: winchester1")
-    print("   • Try SQL injection:    Username: admin' OR '1'='1")
-    print()
-    print("🧪 Run automated tests:")
-    print(f"   python3 jsonl_threat_tester.py --url http://localhost:3000 --max-payloads 100")
-    print()
-    print("🛑 Press Ctrl+C to stop all services")
-    print("="*70 + "\n")
-
-    # Keep script running and monitor processes
+    for name, port, process, start_time in pending:
+        print_error(f"{name} not ready before the startup deadline (see {process.log_path})")
+        ready[name] = None
+
+    return ready
+
+def stop_services(processes):
+    """Terminate services, force-killing any that don't exit within 5 seconds"""
+    for name, process in processes:
+        print_info(f"Stopping {name}...")
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+            print_success(f"{name} stopped")
+        except subprocess.TimeoutExpired:
+            process.kill()
+            print_warning(f"{name} force killed")
+
+def handle_termination(signum, frame):
+    """Treat SIGTERM/SIGHUP like Ctrl+C so services are never orphaned"""
+    raise KeyboardInterrupt
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Start all Hybrid Web Security System services")
+    parser.add_argument("--production", action="store_true",
+                        help="Serve each service with gunicorn instead of the Flask development server")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes per service in production mode (default: CPU count)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Threads per worker process in production mode (default: 8)")
+    parser.add_argument("--non-interactive", "-y", action="store_true",
+                        help="Never prompt; continue if Ollama is unreachable (default when stdin is not a TTY)")
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="Overall deadline in seconds for all services to become ready")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Skip preloading the LLM model")
+    parser.add_argument("--stub-llm", action="store_true",
+                        help="Start the local stub LLM (host-d-llm-stub) and point OLLAMA_HOST at it")
+    parser.add_argument("--log-dir", default=str(Path(__file__).parent / "logs"),
+                        help="Directory for per-service log files")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    interactive = not args.non_interactive and sys.stdin.isatty()
+    signal.signal(signal.SIGTERM, handle_termination)
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, handle_termination)
+    print_header("🚀 Starting Hybrid Web Security System")
+    os.makedirs(args.log_dir, exist_ok=True)
+    # One deadline for the whole startup: the stub LLM, the services and the LLM warmup share it
+    deadline = time.time() + args.timeout
+    started = []
+    monitoring = False
+
+    # Everything after the first spawn runs under this try, so an error or signal never orphans a child
     try:
+        stub_ready = {}
+        ollama_host = OLLAMA_HOST
+
+        # Optional local stub LLM; services inherit OLLAMA_HOST pointing at it
+        if args.stub_llm:
+            name, port, directory, script = STUB_LLM_SERVICE
+            process = start_service(name, port, directory, script, args.log_dir)
+            if process:
+                started.append((name, port, process, time.time()))
+                stub_ready = wait_until_ready(started, deadline)
+                if stub_ready.get(name) is not None:
+                    ollama_host = f"http://localhost:{port}"
+
+        # Services inherit the host that is checked and warmed up here
+        os.environ['OLLAMA_HOST'] = ollama_host
+
+        # Check Ollama
+        if not check_ollama(host=ollama_host, interactive=interactive):
+            print_error("Ollama check failed. Exiting.")
+            return 1
+
+        print("\n" + "="*70 + "\n")
+
+        # Preload the model in the background while the services start
+        warmup_result = {}
+        warmup_thread = None
+        if not args.no_warmup and ollama_is_running(ollama_host):
+            print_info(f"Warming up LLM model {OLLAMA_MODEL}...")
+            warmup_thread = threading.Thread(
+                target=lambda: warmup_result.update(seconds=warmup_llm(ollama_host)),
+                daemon=True
+            )
+            warmup_thread.start()
+
+        # Start all services at once, then wait for their health checks together
+        services_started = []
+        for name, port, directory, script in SERVICES:
+            process = start_service(name, port, directory, script, args.log_dir,
+                                    production=args.production,
+                                    workers=args.workers,
+                                    threads=args.threads)
+            if process:
+                services_started.append((name, port, process, time.time()))
+                started.append(services_started[-1])
+
+        ready = dict(stub_ready, **wait_until_ready(services_started, deadline))
+
+        # Services that missed the deadline but are still running stay monitored and get stopped on exit
+        processes = [(name, process) for name, port, process, start_time in started if process.poll() is None]
+
+        if warmup_thread:
+            warmup_thread.join(timeout=max(0.0, deadline - time.time()))
+            if warmup_result.get('seconds') is not None:
+                print_success(f"LLM model {OLLAMA_MODEL} loaded in {warmup_result['seconds']:.2f}s")
+            else:
+                print_warning(f"LLM model {OLLAMA_MODEL} still loading at the startup deadline")
+
+        if not any(seconds is not None for seconds in ready.values()):
+            print_error("No services started successfully")
+            return 1
+
+        failed = [name for name, seconds in ready.items() if seconds is None]
+        if failed:
+            print_warning(f"Partial startup: {', '.join(failed)} not ready")
+            if not interactive:
+                print_error("Exiting: every service must start in non-interactive mode")
+                return 1
+            print_header("⚠️  Some Services Failed to Start")
+        else:
+            print_header("✅ All Services Started!")
+
+        print("⏱️  Time to ready:")
+        for name, seconds in ready.items():
+            print(f"   • {name + ':':<22}{f'{seconds:.2f}s' if seconds is not None else 'FAILED'}")
+        if warmup_result.get('seconds') is not None:
+            print(f"   • {'LLM warmup:':<22}{warmup_result['seconds']:.2f}s")
+        print()
+        print(f"📄 Service logs: {args.log_dir}")
+        print()
+        print("🌐 Access the system:")
+        print("   • Web Application:      http://localhost:3000")
+        print("   • Security Dashboard:   http://localhost:3000/monitor")
+        print("   • Full Statistics:      http://localhost:3000/stats/comprehensive")
+        print("   • Threat Detector API:  http://localhost:8081/stats")
+        print()
+        print("📊 Test the system:")
+        print("   • Try legitimate login: Username: AAA, Password: winchester1")
+        print("   • Try SQL injection:    Username: admin' OR '1'='1")
+        print()
+        print("🧪 Run automated tests:")
+        print(f"   python3 jsonl_threat_tester.py --url http://localhost:3000 --max-payloads 100")
+        print()
+        print("🛑 Press Ctrl+C to stop all services")
+        print("="*70 + "\n")
+
+        # Keep script running and monitor processes
+        monitoring = True
         while True:
             time.sleep(5)
             # Check if processes are still alive
             for name, process in processes:
                 if process.poll() is not None:
-                    print_error(f"{name} has stopped unexpectedly")
+                    print_error(f"{name} has stopped unexpectedly (see {process.log_path})")
 
     except KeyboardInterrupt:
-        print("\n" + "="*70)
-        print_info("Shutting down services...")
+        if monitoring:
+            print("\n" + "="*70)
+            print_info("Shutting down services...")
+            return 0
+        print_info("Startup interrupted, stopping services...")
+        return 1
 
+    finally:
         # Terminate all processes
-        for name, process in processes:
-            print_info(f"Stopping {name}...")
-            process.terminate()
-            try:
-                process.wait(timeout=5)
-                print_success(f"{name} stopped")
-            except subprocess.TimeoutExpired:
-                process.kill()
-                print_warning(f"{name} force killed")
-
-        print_header("✅ All Services Stopped!")
-        return 0
+        stop_services([(name, process) for name, port, process, start_time in started if process.poll() is None])
+        if monitoring:
+            print_header("✅ All Services Stopped!")
 
 if __name__ == "__main__":
     try:
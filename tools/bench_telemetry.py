@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Detector Telemetry Memory Benchmark
+-----------------------------------
+Feeds synthetic requests straight into the threat detector's telemetry
+(host-c-detection/telemetry.py), in a forked child process, and samples
+the child's RSS as it goes. Each request exercises what
+comprehensive_security_scan does per request:
+
+1. observe_request (per-IP counts, top IPs, distinct IPs and inputs)
+2. first_seen_input (admission priority for LLM-bound inputs)
+3. threat_count / record_threat (IP reputation) and record_detection
+
+Traffic: every IP in --ips appears (in scrambled order) plus 10 heavy
+hitters sending --heavy-share of all requests; inputs cycle through
+--inputs distinct values. Checks that RSS stays flat once the structures
+are allocated, that the footprint stays under --max-bytes, that the
+distinct counts are within 3% and that the heavy hitters are the top IPs.
+
+--baseline runs the same traffic through unbounded dicts/sets (per-IP
+counters and seen inputs, as before) for comparison.
+
+Usage:
+    python3 tools/bench_telemetry.py
+    python3 tools/bench_telemetry.py --requests 1000000 --ips 100000 --baseline
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'host-c-detection'))
+
+from telemetry import DetectorTelemetry  # noqa: E402
+
+HEAVY_HITTERS = 10
+DETECTION_TYPES = ('oversized_input', 'legitimate_login', 'verdict_cache_hit',
+                   'shed_queue_full', 'shed_deadline', 'shed_preempted')
+# Prime above 2^24, so coprime with any --ips: visits every IP once per cycle, in scrambled order
+SCRAMBLE = 2654435761
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def ip_for(n: int) -> str:
+    return f'10.{(n >> 16) & 255}.{(n >> 8) & 255}.{n & 255}'
+
+
+class UnboundedTracking:
+    """The shape telemetry.py replaces: plain dicts/sets keyed by every IP and input ever seen."""
+
+    def __init__(self):
+        self.detections_by_type = {}
+        self.ip_requests = {}
+        self.ip_threats = {}
+        self.seen_inputs = set()
+
+    def record_detection(self, detection_type, processing_time):
+        self.detections_by_type[detection_type] = self.detections_by_type.get(detection_type, 0) + 1
+
+    def observe_request(self, ip_address, normalized_input):
+        self.ip_requests[ip_address] = self.ip_requests.get(ip_address, 0) + 1
+
+    def first_seen_input(self, normalized_input):
+        first_seen = normalized_input not in self.seen_inputs
+        self.seen_inputs.add(normalized_input)
+        return first_seen
+
+    def record_threat(self, ip_address):
+        self.ip_threats[ip_address] = self.ip_threats.get(ip_address, 0) + 1
+
+    def threat_count(self, ip_address):
+        return self.ip_threats.get(ip_address, 0)
+
+
+def ingest(args, structure: str, connection):
+    """Child process: run the traffic, send back RSS samples and the final snapshot."""
+    baseline_rss = rss_bytes()
+    tracker = (DetectorTelemetry(args.max_bytes, DETECTION_TYPES, top_k=HEAVY_HITTERS)
+               if structure == 'telemetry' else UnboundedTracking())
+    samples = [(0, rss_bytes() - baseline_rss)]
+
+    heavy_every = max(1, round(1 / args.heavy_share)) if args.heavy_share > 0 else 0
+    ip_sequence = 0
+    started = time.perf_counter()
+    for i in range(1, args.requests + 1):
+        if heavy_every and i % heavy_every == 0:
+            # Heavy hitters take turns, from a range outside the normal IPs
+            ip_address = f'172.16.0.{(i // heavy_every) % HEAVY_HITTERS + 1}'
+        else:
+            ip_address = ip_for((ip_sequence * SCRAMBLE) % args.ips)
+            ip_sequence += 1
+        normalized_input = f'username: user{i % args.inputs}, password: pw{i % args.inputs}'
+
+        tracker.observe_request(ip_address, normalized_input)
+        tracker.threat_count(ip_address)
+        tracker.first_seen_input(normalized_input)
+        if i % 20 == 0:
+            tracker.record_threat(ip_address)
+        tracker.record_detection(DETECTION_TYPES[i % len(DETECTION_TYPES)], 0.001)
+
+        if i % args.report_every == 0:
+            samples.append((i, rss_bytes() - baseline_rss))
+    elapsed = time.perf_counter() - started
+
+    snapshot = tracker.snapshot() if structure == 'telemetry' else {
+        'distinct_ips_estimate': len(tracker.ip_requests),
+        'distinct_inputs_estimate': len(tracker.seen_inputs),
+        'top_ips': [{'ip_address': ip, 'requests_estimate': count} for ip, count in
+                    sorted(tracker.ip_requests.items(), key=lambda item: -item[1])[:HEAVY_HITTERS]],
+        'memory_bytes': None
+    }
+    connection.send({'samples': samples, 'elapsed': elapsed, 'snapshot': snapshot})
+    connection.close()
+
+
+def run(args, structure: str) -> dict:
+    context = multiprocessing.get_context('fork')
+    parent, child = context.Pipe(duplex=False)
+    process = context.Process(target=ingest, args=(args, structure, child))
+    process.start()
+    child.close()
+    result = parent.recv()
+    process.join()
+    return result
+
+
+def print_samples(name: str, result: dict, requests: int):
+    print(f"\n{name}: {requests / result['elapsed']:,.0f} requests/s")
+    print(f"{'requests':>12} {'RSS growth MiB':>15}")
+    for count, growth in result['samples']:
+        print(f"{count:>12,} {growth / 2 ** 20:>15.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show detector telemetry memory stays flat under many IPs')
+    parser.add_argument('--requests', type=int, default=10_000_000, help='Synthetic requests to ingest')
+    parser.add_argument('--ips', type=int, default=1_000_000, help='Distinct client IPs (besides heavy hitters)')
+    parser.add_argument('--inputs', type=int, default=3_000_000, help='Distinct normalized inputs')
+    parser.add_argument('--heavy-share', type=float, default=0.05, help='Share of requests from the heavy hitters')
+    parser.add_argument('--max-bytes', type=int, default=int(os.getenv('TELEMETRY_MAX_BYTES', 8 * 1024 * 1024)))
+    parser.add_argument('--report-every', type=int, default=1_000_000, help='Requests between RSS samples')
+    parser.add_argument('--baseline', action='store_true', help='Also run unbounded dicts/sets for comparison')
+    args = parser.parse_args()
+    if not 0 < args.ips <= 2 ** 24:
+        parser.error('--ips must be between 1 and 2^24')
+    args.report_every = min(args.report_every, args.requests)
+
+    failures = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failures.append(message)
+
+    print(f"{args.requests:,} requests, {args.ips:,} IPs + {HEAVY_HITTERS} heavy hitters "
+          f"({args.heavy_share:.0%} of traffic), {args.inputs:,} inputs, budget {args.max_bytes / 2 ** 20:.1f} MiB")
+
+    result = run(args, 'telemetry')
+    print_samples('telemetry.py', result, args.requests)
+    if args.baseline:
+        baseline = run(args, 'unbounded')
+        print_samples('unbounded dicts/sets', baseline, args.requests)
+    print()
+
+    snapshot = result['snapshot']
+    growth = [size for _, size in result['samples']]
+    # The first sample after allocation is the footprint; everything after it must stay flat
+    settled = growth[1] if len(growth) > 1 else growth[0]
+    check(max(growth) - settled <= 2 * 2 ** 20,
+          f"RSS flat after first {args.report_every:,} requests: +{(max(growth) - settled) / 2 ** 20:.2f} MiB "
+          f"(footprint {settled / 2 ** 20:.1f} MiB)")
+    check(snapshot['memory_bytes'] <= args.max_bytes,
+          f"structures use {snapshot['memory_bytes']:,} of {args.max_bytes:,} bytes")
+
+    heavy_requests = args.requests // max(1, round(1 / args.heavy_share)) if args.heavy_share > 0 else 0
+    expected_ips = min(args.ips, args.requests - heavy_requests) + (HEAVY_HITTERS if heavy_requests else 0)
+    ip_error = abs(snapshot['distinct_ips_estimate'] - expected_ips) / expected_ips * 100
+    check(ip_error <= 3, f"distinct IPs {snapshot['distinct_ips_estimate']:,} vs {expected_ips:,} ({ip_error:.2f}% off)")
+    expected_inputs = min(args.inputs, args.requests)
+    input_error = abs(snapshot['distinct_inputs_estimate'] - expected_inputs) / expected_inputs * 100
+    check(input_error <= 3,
+          f"distinct inputs {snapshot['distinct_inputs_estimate']:,} vs {expected_inputs:,} ({input_error:.2f}% off)")
+    if heavy_requests:
+        top = {entry['ip_address'] for entry in snapshot['top_ips']}
+        found = sum(1 for h in range(HEAVY_HITTERS) if f'172.16.0.{h + 1}' in top)
+        check(found == HEAVY_HITTERS, f"top IPs are the {found}/{HEAVY_HITTERS} heavy hitters: "
+              + ', '.join(f"{entry['ip_address']}={entry['requests_estimate']}" for entry in snapshot['top_ips'][:5]))
+
+    print(f"\n{'All checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Threat Detector Worker Scaling Benchmark
+----------------------------------------
+Runs the threat detector under gunicorn at several worker counts against the
+bundled stub LLM (host-d-llm-stub) with a fixed response latency, and reports throughput and
+latency percentiles for /analyze at each setting.
+
+Every request carries a unique input, so each one goes through the full
+normalization -> whitelist -> LLM -> SQLite path.
+
+Usage:
+    python3 tools/bench_workers.py
+    python3 tools/bench_workers.py --workers 1 4 8 --threads 1 --duration 10 --llm-latency 0.05
+"""
+
+import argparse
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from service_harness import gunicorn_command, spawn, start_stub_llm, stop_processes, wait_healthy
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECTOR_DIR = ROOT / 'host-c-detection'
+
+
+def start_detector(port, workers, threads, llm_url, workdir):
+    """Launch the detector under gunicorn and wait for /health."""
+    process = spawn(gunicorn_command(DETECTOR_DIR, 'threat_detector:app', port), {
+        'OLLAMA_HOST': llm_url,
+        'WEB_CONCURRENCY': str(workers),
+        'WEB_THREADS': str(threads),
+        'LOG_LEVEL': 'warning'
+    }, workdir)
+    wait_healthy(f'http://127.0.0.1:{port}', process, f'Detector with {workers} workers')
+    return process
+
+
+def run_load(url, concurrency, duration):
+    """Closed-loop load: `concurrency` clients posting unique inputs for `duration` seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(client_id):
+        session = requests.Session()
+        seq = 0
+        while time.perf_counter() < stop_at:
+            seq += 1
+            payload = {'input': f'username: bench{client_id}_{seq}, password: pw{seq}'}
+            start = time.perf_counter()
+            try:
+                ok = session.post(url, json=payload, timeout=30).status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0.0
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'throughput': len(latencies) / wall,
+        'p50': pick(0.50),
+        'p99': pick(0.99)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare detector throughput across gunicorn worker counts')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8], help='Worker counts to compare')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per worker')
+    parser.add_argument('--concurrency', type=int, default=64, help='Concurrent load-generating clients')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per worker count')
+    parser.add_argument('--llm-latency', type=float, default=0.05, help='Stub LLM response latency (seconds)')
+    parser.add_argument('--port', type=int, default=18081, help='Port for the detector under test')
+    parser.add_argument('--llm-port', type=int, default=18434, help='Port for the stub LLM')
+    args = parser.parse_args()
+
+    stub = start_stub_llm(args.llm_port, f'fixed:{args.llm_latency * 1000:g}')
+    llm_url = f'http://127.0.0.1:{args.llm_port}'
+    print(f"Stub LLM at {llm_url} ({args.llm_latency * 1000:.0f}ms per call), "
+          f"{args.threads} thread(s)/worker, {args.concurrency} clients, {args.duration:.0f}s per run\n")
+    print(f"{'workers':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'ok':>8} {'errors':>7}")
+
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory(prefix='bench_workers_') as workdir:
+            process = start_detector(args.port, workers, args.threads, llm_url, workdir)
+            try:
+                result = run_load(f'http://127.0.0.1:{args.port}/analyze', args.concurrency, args.duration)
+            finally:
+                stop_processes([process])
+
+        print(f"{workers:>7} {result['throughput']:>9.1f} {result['p50'] * 1000:>9.1f} "
+              f"{result['p99'] * 1000:>9.1f} {result['requests']:>8} {result['errors']:>7}")
+
+    stop_processes([stub])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Threat Detector Import-Time Budget Check
+----------------------------------------
+Imports threat_detector in a fresh interpreter under `python -X importtime`
+and fails if the module's cumulative import time goes over the budget, or if
+any deferred dependency (the Ollama client by default) is loaded at import.
+
+The best of several runs is used, so a single slow run (cold disk cache,
+busy CI box) doesn't fail the check.
+
+Usage:
+    python3 tools/check_import_time.py
+    python3 tools/check_import_time.py --budget-ms 250 --runs 5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECTOR_DIR = ROOT / 'host-c-detection'
+
+
+def measure_import(module, runs):
+    """Return (best cumulative microseconds, {module: self_us} for that run)."""
+    best_total, best_modules = None, {}
+
+    for _ in range(runs):
+        # Run from an empty directory so nothing is written next to the service
+        with tempfile.TemporaryDirectory(prefix='importtime_') as workdir:
+            env = dict(os.environ, PYTHONPATH=str(DETECTOR_DIR), PYTHONDONTWRITEBYTECODE='1')
+            completed = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                cwd=workdir, env=env, capture_output=True, text=True
+            )
+        if completed.returncode != 0:
+            raise RuntimeError(f'import {module} failed:\n{completed.stderr[-2000:]}')
+
+        total, modules = None, {}
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(self_us)
+            if name.strip() == module:
+                total = int(cumulative_us)
+
+        if total is not None and (best_total is None or total < best_total):
+            best_total, best_modules = total, modules
+
+    return best_total, best_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fail if importing the detector exceeds its time budget')
+    parser.add_argument('--module', default='threat_detector', help='Module to import')
+    parser.add_argument('--budget-ms', type=float, default=250.0, help='Cumulative import time budget (ms)')
+    parser.add_argument('--runs', type=int, default=3, help='Runs to take the best of')
+    parser.add_argument('--forbid', nargs='*', default=['ollama'],
+                        help='Modules that must not be imported at module load')
+    args = parser.parse_args()
+
+    total_us, modules = measure_import(args.module, args.runs)
+    if total_us is None:
+        print(f"❌ {args.module} did not appear in the -X importtime output")
+        return 1
+
+    total_ms = total_us / 1000
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.1f}ms, budget is {args.budget_ms:.0f}ms")
+    loaded = [name for name in args.forbid if name in modules]
+    if loaded:
+        failures.append(f"deferred modules imported eagerly: {', '.join(loaded)}")
+
+    print(f"import {args.module}: {total_ms:.1f}ms (best of {args.runs}, budget {args.budget_ms:.0f}ms)")
+    print("Slowest modules (self time):")
+    for name, self_us in sorted(modules.items(), key=lambda item: item[1], reverse=True)[:8]:
+        print(f"   {self_us / 1000:>8.1f}ms  {name}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Within budget")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
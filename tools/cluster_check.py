@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Detector Cluster Check
+----------------------
+Starts the stub LLM and several threat detector processes locally, then
+drives them through host-b-webapp/detector_cluster.py to check that:
+
+1. Repeated inputs hit the verdict cache on the node that owns them
+2. Killing a node ejects it, and only that node's keys move elsewhere
+3. A restarted node is re-admitted and gets its keys back
+4. Merged /stats counts and histograms add up across nodes
+
+Exits non-zero if any check fails.
+
+Usage:
+    python3 tools/cluster_check.py --nodes 3 --inputs 60
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from service_harness import spawn, start_stub_llm, stop_processes, wait_healthy
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECTOR = ROOT / 'host-c-detection' / 'threat_detector.py'
+sys.path.insert(0, str(ROOT / 'host-b-webapp'))
+
+from detector_cluster import DetectorCluster  # noqa: E402
+
+
+def start_detector(port, llm_url, workdir):
+    process = spawn([sys.executable, str(DETECTOR)],
+                    {'PORT': str(port), 'NODE_ID': f'node-{port}', 'OLLAMA_HOST': llm_url}, workdir)
+    wait_healthy(f'http://127.0.0.1:{port}', process, f'Detector on port {port}')
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check consistent-hash routing across local detector processes')
+    parser.add_argument('--nodes', type=int, default=3, help='Number of detector processes')
+    parser.add_argument('--inputs', type=int, default=60, help='Distinct inputs to route')
+    parser.add_argument('--base-port', type=int, default=18091, help='First detector port')
+    parser.add_argument('--llm-port', type=int, default=18435, help='Stub LLM port')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failures.append(message)
+
+    llm_url = f'http://127.0.0.1:{args.llm_port}'
+    ports = [args.base_port + i for i in range(args.nodes)]
+    urls = [f'http://127.0.0.1:{port}' for port in ports]
+    workdirs = [tempfile.mkdtemp(prefix=f'cluster_node_{port}_') for port in ports]
+
+    stub = start_stub_llm(args.llm_port)
+    processes = {}
+    try:
+        for port, url, workdir in zip(ports, urls, workdirs):
+            processes[url] = start_detector(port, llm_url, workdir)
+
+        cluster = DetectorCluster(urls, ejection_seconds=1.0, health_interval=0.5, request_timeout=10)
+        inputs = [f'username: user{i}, password: pw{i}' for i in range(args.inputs)]
+
+        # 1. Routing and verdict cache locality
+        owners = {text: cluster.route(text)[0] for text in inputs}
+        for text in inputs:
+            cluster.analyze({'input': text})
+        repeats = [cluster.analyze({'input': text}).json() for text in inputs]
+        cached = sum(1 for result in repeats if result.get('detection_method') == 'llm_analysis_cached')
+        check(cached == len(inputs), f"repeats served from the owning node's cache: {cached}/{len(inputs)}")
+        spread = {url: sum(1 for owner in owners.values() if owner == url) for url in urls}
+        check(all(spread.values()), f"every node owns keys: {spread}")
+
+        # 4. Merged stats
+        merged = cluster.merged_stats()
+        check(merged['total_requests'] == 2 * len(inputs),
+              f"merged total_requests {merged['total_requests']} == {2 * len(inputs)}")
+        check(merged['processing_time_histogram']['counts'][-1] == merged['total_requests'],
+              "merged histogram total matches merged request count")
+        check(merged['verdict_cache']['hits'] == len(inputs), f"merged cache hits {merged['verdict_cache']['hits']}")
+
+        # 2. Kill a node: it is ejected and only its keys move
+        victim = urls[0]
+        stop_processes([processes[victim]])
+        for text in inputs:
+            cluster.analyze({'input': text})
+        moved = [text for text in inputs if cluster.route(text)[0] != owners[text]]
+        check(victim in cluster.ejected_until, f"killed node {victim} ejected")
+        check(all(owners[text] == victim for text in moved) and len(moved) == spread[victim],
+              f"only the killed node's keys moved: {len(moved)} moved, {spread[victim]} owned")
+
+        # 3. Restart it: re-admitted after the ejection window, keys return
+        processes[victim] = start_detector(ports[0], llm_url, workdirs[0])
+        deadline = time.time() + 10
+        while victim in cluster.ejected_until and time.time() < deadline:
+            time.sleep(0.2)
+        check(victim not in cluster.ejected_until, f"restarted node {victim} re-admitted")
+        check(all(cluster.route(text)[0] == owners[text] for text in inputs), "original key ownership restored")
+    finally:
+        stop_processes([stub] + list(processes.values()))
+
+    print(f"\n{'All checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
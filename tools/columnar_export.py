@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Columnar Export of Detection History
+------------------------------------
+Copies hybrid_detections (threat detector) and login_sessions (web
+application) into one flat binary file per column, read back as NumPy
+memmaps by tools/detection_report.py:
+
+1. Incremental: only rows with id above the table's high-water mark are
+   read, in id order and in chunks, and appended to the column files
+2. Crash-safe: manifest.json (row count, high-water mark, column dtypes,
+   dictionary sizes) is replaced atomically after each chunk; column bytes
+   and dictionary entries past the manifest's counts are truncated on the
+   next run
+3. Compact: strings are dictionary-encoded (<column>.dict.jsonl, one JSON
+   string per line, only new entries appended per chunk), booleans
+   are int8 (-1 for NULL), timestamps are epoch seconds, and inputs are
+   reduced to their length, a 64-bit hash and the payload type they match
+   in WEB_APPLICATION_PAYLOADS.jsonl
+
+Layout:
+    <out>/<table>/manifest.json
+    <out>/<table>/<column>.bin
+    <out>/<table>/<column>.dict.jsonl
+
+Requires NumPy (pip install numpy).
+
+Usage:
+    python3 tools/columnar_export.py
+    python3 tools/columnar_export.py --out data/columnar --detector-db sqlite:///host-c-detection/data/regex_analytics.db
+    python3 tools/columnar_export.py --synthetic 50000000 --out /tmp/columnar
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+PAYLOADS_FILE = ROOT / 'WEB_APPLICATION_PAYLOADS.jsonl'
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'host-c-detection'))
+sys.path.insert(0, str(ROOT / 'host-d-llm-stub'))
+
+from detection_labels import DETECTION_METHOD_THREAT_TYPES  # noqa: E402
+from storage import open_storage  # noqa: E402
+from stub_llm import load_labelled_payloads  # noqa: E402
+
+NO_PAYLOAD = ''
+DETECTOR_INPUT_PATTERN = re.compile(r'^username: (.*), password: (.*)$', re.DOTALL)
+
+# Column name -> dtype. Columns listed in DICTIONARY_COLUMNS hold int32 codes into <column>.dict.jsonl.
+TABLE_COLUMNS = {
+    'hybrid_detections': {
+        'id': 'int64',
+        'timestamp': 'int64',
+        'threat_detected': 'int8',
+        'api_called': 'int8',
+        'processing_time': 'float32',
+        'input_length': 'int32',
+        'input_hash': 'uint64',
+        'threat_type': 'int32',
+        'detection_method': 'int32',
+        'ip_address': 'int32',
+        'payload_type': 'int32',
+    },
+    'login_sessions': {
+        'id': 'int64',
+        'timestamp': 'int64',
+        'threat_detected': 'int8',
+        'login_blocked': 'int8',
+        'input_length': 'int32',
+        'input_hash': 'uint64',
+        'ip_address': 'int32',
+        'payload_type': 'int32',
+    },
+}
+DICTIONARY_COLUMNS = {'threat_type', 'detection_method', 'ip_address', 'payload_type'}
+
+TABLE_QUERIES = {
+    'hybrid_detections': '''
+        SELECT id, timestamp, threat_detected, api_called, processing_time,
+               input_data, threat_type, detection_method, ip_address
+        FROM hybrid_detections
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+    'login_sessions': '''
+        SELECT id, timestamp, threat_detected, login_blocked, username, password, ip_address
+        FROM login_sessions
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+}
+
+
+def input_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+def to_int8(values) -> np.ndarray:
+    return np.array([-1 if value is None else int(bool(value)) for value in values], dtype=np.int8)
+
+
+def read_dictionary(path: Path, size: Optional[int] = None):
+    """Return (first size entries of a .dict.jsonl file, their length in bytes); all entries if size is None."""
+    values = []
+    length = 0
+    if path.exists():
+        with open(path, 'rb') as f:
+            for line in f:
+                if len(values) == size or not line.endswith(b'\n'):
+                    break
+                values.append(json.loads(line))
+                length += len(line)
+    return values, length
+
+
+def to_epoch_seconds(values) -> np.ndarray:
+    """SQLite returns 'YYYY-MM-DD HH:MM:SS' strings, PostgreSQL returns datetimes; both parse via str()."""
+    parsed = np.array(['NaT' if value is None else str(value) for value in values], dtype='datetime64[us]')
+    return parsed.astype('datetime64[s]').astype(np.int64)
+
+
+class ColumnarTable:
+    """Append-only column files plus manifest for one table."""
+
+    def __init__(self, directory: Path, columns: Dict[str, str]):
+        self.directory = directory
+        self.columns = columns
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        manifest_path = self.directory / 'manifest.json'
+        if manifest_path.exists():
+            manifest = json.loads(manifest_path.read_text())
+            if manifest['columns'] != columns:
+                raise ValueError(f'{directory}: column layout changed, export into a new directory')
+            self.rows = manifest['rows']
+            self.high_water_mark = manifest['high_water_mark']
+            dictionary_sizes = manifest['dictionary_sizes']
+        else:
+            self.rows = 0
+            self.high_water_mark = 0
+            dictionary_sizes = {}
+
+        self.dictionaries: Dict[str, List[str]] = {}
+        self.dictionary_index: Dict[str, Dict[str, int]] = {}
+        for name in columns:
+            self.truncate_to_manifest(name)
+            if name in DICTIONARY_COLUMNS:
+                self.dictionaries[name] = self.truncate_dictionary(name, dictionary_sizes.get(name, 0))
+                self.dictionary_index[name] = {value: code for code, value in enumerate(self.dictionaries[name])}
+        self.saved_dictionary_sizes = {name: len(values) for name, values in self.dictionaries.items()}
+
+    def truncate_to_manifest(self, name: str):
+        """Drop bytes appended by a run that died before updating the manifest."""
+        path = self.directory / f'{name}.bin'
+        expected = self.rows * np.dtype(self.columns[name]).itemsize
+        if not path.exists():
+            path.touch()
+        elif path.stat().st_size != expected:
+            with open(path, 'r+b') as f:
+                f.truncate(expected)
+
+    def truncate_dictionary(self, name: str, size: int) -> List[str]:
+        """Load a dictionary, dropping entries appended by a run that died before updating the manifest."""
+        path = self.directory / f'{name}.dict.jsonl'
+        values, length = read_dictionary(path, size)
+        if len(values) != size:
+            raise ValueError(f'{path}: {len(values)} entries, manifest expects {size}')
+        if not path.exists():
+            path.touch()
+        elif path.stat().st_size != length:
+            with open(path, 'r+b') as f:
+                f.truncate(length)
+        return values
+
+    def encode(self, name: str, values) -> np.ndarray:
+        """Map strings to dictionary codes, growing the dictionary as needed."""
+        index = self.dictionary_index[name]
+        dictionary = self.dictionaries[name]
+        codes = np.empty(len(values), dtype=np.int32)
+        for position, value in enumerate(values):
+            value = '' if value is None else str(value)
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(dictionary)
+                dictionary.append(value)
+            codes[position] = code
+        return codes
+
+    def append(self, arrays: Dict[str, np.ndarray], high_water_mark: int):
+        """Append one chunk to every column file, then commit it in the manifest."""
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1 or set(arrays) != set(self.columns):
+            raise ValueError('chunk must contain every column with equal lengths')
+
+        for name, array in arrays.items():
+            with open(self.directory / f'{name}.bin', 'ab') as f:
+                f.write(np.ascontiguousarray(array, dtype=self.columns[name]).tobytes())
+        for name, dictionary in self.dictionaries.items():
+            saved = self.saved_dictionary_sizes[name]
+            if saved != len(dictionary):
+                with open(self.directory / f'{name}.dict.jsonl', 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(value) + '\n' for value in dictionary[saved:]))
+                self.saved_dictionary_sizes[name] = len(dictionary)
+
+        self.rows += lengths.pop()
+        self.high_water_mark = high_water_mark
+        self.write_json('manifest.json', {
+            'rows': self.rows,
+            'high_water_mark': self.high_water_mark,
+            'columns': self.columns,
+            'dictionary_sizes': self.saved_dictionary_sizes,
+            'exported_at': time.time()
+        })
+
+    def write_json(self, filename: str, data):
+        temporary = self.directory / f'{filename}.tmp'
+        temporary.write_text(json.dumps(data))
+        os.replace(temporary, self.directory / filename)
+
+
+def load_table(directory: Path) -> Dict:
+    """Open an exported table as read-only memmaps: {'rows', 'columns': {name: array}, 'dictionaries'}."""
+    manifest = json.loads((directory / 'manifest.json').read_text())
+    rows = manifest['rows']
+    columns = {}
+    dictionaries = {}
+    for name, dtype in manifest['columns'].items():
+        if rows:
+            columns[name] = np.memmap(directory / f'{name}.bin', dtype=dtype, mode='r', shape=(rows,))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)
+        if name in DICTIONARY_COLUMNS:
+            dictionaries[name] = read_dictionary(directory / f'{name}.dict.jsonl', manifest['dictionary_sizes'][name])[0]
+    return {'rows': rows, 'high_water_mark': manifest['high_water_mark'], 'columns': columns,
+            'dictionaries': dictionaries}
+
+
+class PayloadClassifier:
+    """Exact-match lookup of inputs against the labelled payload corpus."""
+
+    def __init__(self, path: Path = PAYLOADS_FILE):
+        self.types: Dict[str, str] = {}
+        if path.exists():
+            for entry in load_labelled_payloads(str(path)):
+                if entry.get('payload'):
+                    self.types[entry['payload']] = entry.get('type') or 'unlabelled'
+
+    def classify(self, *fields: Optional[str]) -> str:
+        for field in fields:
+            payload_type = self.types.get(field or '')
+            if payload_type:
+                return payload_type
+        return NO_PAYLOAD
+
+
+def convert_detections(rows, table: ColumnarTable, classifier: PayloadClassifier) -> Dict[str, np.ndarray]:
+    ids, timestamps, threats, api_called, times, inputs, threat_types, methods, ips = zip(*rows)
+    payload_types = []
+    for text in inputs:
+        match = DETECTOR_INPUT_PATTERN.match(text or '')
+        payload_types.append(classifier.classify(*match.groups()) if match else classifier.classify(text))
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'timestamp': to_epoch_seconds(timestamps),
+        'threat_detected': to_int8(threats),
+        'api_called': to_int8(api_called),
+        'processing_time': np.array([t or 0.0 for t in times], dtype=np.float32),
+        'input_length': np.array([len(text or '') for text in inputs], dtype=np.int32),
+        'input_hash': np.array([input_hash(text or '') for text in inputs], dtype=np.uint64),
+        'threat_type': table.encode('threat_type', threat_types),
+        'detection_method': table.encode('detection_method', methods),
+        'ip_address': table.encode('ip_address', ips),
+        'payload_type': table.encode('payload_type', payload_types),
+    }
+
+
+def convert_sessions(rows, table: ColumnarTable, classifier: PayloadClassifier) -> Dict[str, np.ndarray]:
+    ids, timestamps, threats, blocked, usernames, passwords, ips = zip(*rows)
+    inputs = [f'username: {u or ""}, password: {p or ""}' for u, p in zip(usernames, passwords)]
+    return {
+        'id': np.array(ids, dtype=np.int64),
+        'timestamp': to_epoch_seconds(timestamps),
+        'threat_detected': to_int8(threats),
+        'login_blocked': to_int8(blocked),
+        'input_length': np.array([len(text) for text in inputs], dtype=np.int32),
+        'input_hash': np.array([input_hash(text) for text in inputs], dtype=np.uint64),
+        'ip_address': table.encode('ip_address', ips),
+        'payload_type': table.encode('payload_type', [classifier.classify(u, p) for u, p in zip(usernames, passwords)]),
+    }
+
+
+CONVERTERS = {'hybrid_detections': convert_detections, 'login_sessions': convert_sessions}
+
+
+def export_table(storage, name: str, out: Path, chunk: int, classifier: PayloadClassifier) -> int:
+    """Export rows above the high-water mark; return how many were appended."""
+    table = ColumnarTable(out / name, TABLE_COLUMNS[name])
+    exported = 0
+    while True:
+        try:
+            rows = storage.query(TABLE_QUERIES[name], (table.high_water_mark, chunk))
+        except Exception as e:
+            print(f"{name}: skipped ({e})")
+            return exported
+        if not rows:
+            break
+        table.append(CONVERTERS[name](rows, table, classifier), rows[-1][0])
+        exported += len(rows)
+    print(f"{name}: +{exported} rows, {table.rows} total, high-water mark id {table.high_water_mark}")
+    return exported
+
+
+# Share of synthetic rows per detector detection_method
+SYNTHETIC_METHOD_SHARES = {
+    'legitimate_pattern_whitelist': 0.30,
+    'llm_analysis': 0.50,
+    'llm_analysis_cached': 0.15,
+    'degraded_prefilter': 0.04,
+    'input_size_guard': 0.01,
+}
+
+
+def write_synthetic(out: Path, rows: int, chunk: int = 5_000_000, seed: int = 0):
+    """
+    Generate a synthetic hybrid_detections export for report benchmarking.
+
+    Labels are the detector's own detection methods and threat types, and the
+    payload types of the labelled corpus the stub LLM uses, so reports read the
+    same as on real exports. Refuses to write into a non-empty export.
+    """
+    table = ColumnarTable(out / 'hybrid_detections', TABLE_COLUMNS['hybrid_detections'])
+    if table.rows:
+        raise ValueError(f"{out / 'hybrid_detections'} already holds {table.rows} rows; "
+                         f"write synthetic data to an empty --out directory")
+
+    rng = np.random.default_rng(seed)
+    distinct_ips = 1_000_000
+    ip_codes = table.encode('ip_address', [f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(distinct_ips)])
+    payload_types = sorted({entry.get('type') or 'unlabelled' for entry in load_labelled_payloads(str(PAYLOADS_FILE))
+                            if entry.get('payload')}) if PAYLOADS_FILE.exists() else ['unlabelled']
+    payload_codes = table.encode('payload_type', [NO_PAYLOAD] + payload_types)
+
+    methods = list(SYNTHETIC_METHOD_SHARES)
+    method_codes = table.encode('detection_method', methods)
+    # Per method: threat_type codes for threat / no threat, and whether the verdict is fixed
+    threat_type_codes = np.zeros((len(methods), 2), dtype=np.int32)
+    forced_verdict = np.full(len(methods), -1, dtype=np.int8)
+    for position, method in enumerate(methods):
+        when_threat, when_clean = DETECTION_METHOD_THREAT_TYPES[method]
+        threat_type_codes[position] = table.encode('threat_type', [when_threat or when_clean, when_clean or when_threat])
+        if when_threat is None or when_clean is None:
+            forced_verdict[position] = when_clean is None
+    llm_method = methods.index('llm_analysis')
+
+    start = int(time.time()) - 30 * 86400
+    next_id = table.high_water_mark + 1
+    for offset in range(0, rows, chunk):
+        n = min(chunk, rows - offset)
+        # A few hundred scanner IPs send most of the attacks
+        scanner = rng.random(n) < 0.2
+        ips = np.where(scanner, rng.integers(0, 500, n), rng.integers(0, distinct_ips, n))
+        method = rng.choice(len(methods), n, p=list(SYNTHETIC_METHOD_SHARES.values()))
+        threat = (scanner & (rng.random(n) < 0.9)) | (rng.random(n) < 0.02)
+        threat = np.where(forced_verdict[method] >= 0, forced_verdict[method] == 1, threat)
+        length = np.where(threat, rng.integers(20, 400, n), rng.integers(20, 60, n)).astype(np.int32)
+        llm = method == llm_method
+        processing_time = np.where(llm, rng.lognormal(np.log(0.8) + length / 800, 0.4), rng.exponential(0.002, n))
+        table.append({
+            'id': np.arange(next_id, next_id + n, dtype=np.int64),
+            'timestamp': start + (np.arange(offset, offset + n, dtype=np.int64) * 30 * 86400) // rows,
+            'threat_detected': threat.astype(np.int8),
+            'api_called': llm.astype(np.int8),
+            'processing_time': processing_time.astype(np.float32),
+            'input_length': length,
+            'input_hash': rng.integers(0, 2 ** 63, n, dtype=np.uint64),
+            'threat_type': threat_type_codes[method, (~threat).astype(np.intp)],
+            'detection_method': method_codes[method],
+            'ip_address': ip_codes[ips],
+            'payload_type': payload_codes[np.where(threat, rng.integers(1, len(payload_codes), n), 0)],
+        }, next_id + n - 1)
+        next_id += n
+    print(f"hybrid_detections: {table.rows} synthetic rows in {out / 'hybrid_detections'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incrementally export detection history to columnar files')
+    parser.add_argument('--out', help='Export directory (default: data/columnar; required with --synthetic)')
+    parser.add_argument('--detector-db',
+                        default=os.getenv('DATABASE_URL') or f"sqlite:///{ROOT / 'host-c-detection' / 'data' / 'regex_analytics.db'}",
+                        help='Threat detector database URL (default: DATABASE_URL or the detector SQLite file)')
+    parser.add_argument('--webapp-db',
+                        default=os.getenv('DATABASE_URL') or f"sqlite:///{ROOT / 'host-b-webapp' / 'data' / 'web_sessions.db'}",
+                        help='Web application database URL (default: DATABASE_URL or the webapp SQLite file)')
+    parser.add_argument('--chunk', type=int, default=50000, help='Rows read per query')
+    parser.add_argument('--synthetic', type=int, metavar='ROWS',
+                        help='Instead of exporting, append ROWS synthetic detections (for report benchmarks)')
+    args = parser.parse_args()
+    if args.synthetic and not args.out:
+        parser.error('--synthetic needs its own --out directory, so it never mixes with the real export')
+
+    out = Path(args.out or ROOT / 'data' / 'columnar')
+    start = time.perf_counter()
+    if args.synthetic:
+        try:
+            write_synthetic(out, args.synthetic)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+    else:
+        classifier = PayloadClassifier()
+        export_table(open_storage('regex_analytics.db', args.detector_db), 'hybrid_detections', out, args.chunk, classifier)
+        export_table(open_storage('web_sessions.db', args.webapp_db), 'login_sessions', out, args.chunk, classifier)
+    print(f"Done in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Detection History Report
+------------------------
+Vectorized report over the columnar export written by
+tools/columnar_export.py. Columns are read as NumPy memmaps in fixed-size
+chunks and folded into counters and histograms, so memory stays bounded
+whatever the row count (50M rows take seconds, not a Python object each).
+
+Per table:
+1. Summary: rows, time range, threats, LLM calls
+2. Time-bucketed request and threat rates, with latency p50/p95 for the
+   most recent buckets
+3. Processing-time percentiles (all requests, LLM calls, cache hits)
+4. Verdicts per payload type and per detection method
+5. Top-N offending IPs by threat count
+6. LLM latency against input length
+
+Percentiles come from log-spaced histograms with 1% wide bins, so they are
+accurate to about 1%.
+
+Requires NumPy (pip install numpy).
+
+Usage:
+    python3 tools/detection_report.py
+    python3 tools/detection_report.py --dir /tmp/columnar --bucket 86400 --buckets 7 --top 20
+    python3 tools/detection_report.py --json > report.json
+"""
+
+import argparse
+import datetime
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from columnar_export import load_table  # noqa: E402
+
+CHUNK_ROWS = 4_000_000
+PERCENTILES = [50, 90, 95, 99, 99.9]
+
+# Log-spaced latency bins: 10us .. ~3h, each 1% wider than the last
+LATENCY_MIN = 1e-5
+LATENCY_GROWTH = 1.01
+LATENCY_BINS = int(np.ceil(np.log(1e9) / np.log(LATENCY_GROWTH))) + 1
+
+
+def latency_bins(seconds: np.ndarray) -> np.ndarray:
+    scaled = np.log(np.maximum(seconds, LATENCY_MIN) / LATENCY_MIN) / np.log(LATENCY_GROWTH)
+    return np.minimum(scaled.astype(np.int64), LATENCY_BINS - 1)
+
+
+def histogram_percentiles(counts: np.ndarray, percentiles=PERCENTILES) -> np.ndarray:
+    """Percentiles from latency histograms; counts is (..., LATENCY_BINS). Empty rows give NaN."""
+    cumulative = np.cumsum(counts, axis=-1)
+    totals = cumulative[..., -1:]
+    result = []
+    for q in percentiles:
+        index = np.argmax(cumulative >= np.maximum(totals * q / 100.0, 1), axis=-1)
+        value = LATENCY_MIN * LATENCY_GROWTH ** (index + 0.5)
+        result.append(np.where(totals[..., 0] > 0, value, np.nan))
+    return np.stack(result, axis=-1)
+
+
+def chunks(table: Dict, names) -> Iterator[Dict[str, np.ndarray]]:
+    columns = table['columns']
+    for start in range(0, table['rows'], CHUNK_ROWS):
+        yield {name: np.asarray(columns[name][start:start + CHUNK_ROWS]) for name in names if name in columns}
+
+
+def format_time(epoch: Optional[int]) -> str:
+    if epoch is None:
+        return '-'
+    return datetime.datetime.fromtimestamp(int(epoch), datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def analyze_table(table: Dict, bucket_seconds: int, recent_buckets: int, top: int) -> Dict:
+    """Compute every report section for one exported table in two chunked passes."""
+    columns = table['columns']
+    dictionaries = table['dictionaries']
+    has_latency = 'processing_time' in columns
+    ip_count = len(dictionaries.get('ip_address', []))
+    payload_count = len(dictionaries.get('payload_type', []))
+    method_count = len(dictionaries.get('detection_method', []))
+
+    # Pass 1: time range (ids are in insertion order, but NULL timestamps are stored as NaT)
+    first, last = None, None
+    for chunk in chunks(table, ['timestamp']):
+        valid = chunk['timestamp'][chunk['timestamp'] > 0]
+        if valid.size:
+            first = int(valid.min()) if first is None else min(first, int(valid.min()))
+            last = int(valid.max()) if last is None else max(last, int(valid.max()))
+
+    bucket_total = int((last - first) // bucket_seconds) + 1 if first is not None else 0
+    window_start = max(0, bucket_total - recent_buckets)
+    window_size = bucket_total - window_start
+
+    requests_per_bucket = np.zeros(bucket_total, dtype=np.int64)
+    threats_per_bucket = np.zeros(bucket_total, dtype=np.int64)
+    window_latency = np.zeros((window_size, LATENCY_BINS), dtype=np.int64)
+    latency = {name: np.zeros(LATENCY_BINS, dtype=np.int64) for name in ('all', 'llm', 'cached')}
+    length_latency = np.zeros((32, LATENCY_BINS), dtype=np.int64)
+    ip_requests = np.zeros(ip_count, dtype=np.int64)
+    ip_threats = np.zeros(ip_count, dtype=np.int64)
+    payload_requests = np.zeros(payload_count, dtype=np.int64)
+    payload_threats = np.zeros(payload_count, dtype=np.int64)
+    method_requests = np.zeros(method_count, dtype=np.int64)
+    method_threats = np.zeros(method_count, dtype=np.int64)
+    threats = llm_calls = 0
+    max_latency = 0.0
+    cached_code = (dictionaries.get('detection_method') or []).index('llm_analysis_cached') \
+        if 'llm_analysis_cached' in (dictionaries.get('detection_method') or []) else -1
+
+    # Pass 2: everything else
+    for chunk in chunks(table, ['timestamp', 'threat_detected', 'api_called', 'processing_time', 'input_length',
+                                'ip_address', 'payload_type', 'detection_method']):
+        threat = chunk['threat_detected'] == 1
+        threats += int(threat.sum())
+
+        timed = chunk['timestamp'] > 0
+        bucket = (chunk['timestamp'][timed] - first) // bucket_seconds if first is not None else np.empty(0, np.int64)
+        requests_per_bucket += np.bincount(bucket, minlength=bucket_total)
+        threats_per_bucket += np.bincount(bucket, weights=threat[timed], minlength=bucket_total).astype(np.int64)
+
+        if ip_count:
+            ip_requests += np.bincount(chunk['ip_address'], minlength=ip_count)
+            ip_threats += np.bincount(chunk['ip_address'][threat], minlength=ip_count)
+        if payload_count:
+            payload_requests += np.bincount(chunk['payload_type'], minlength=payload_count)
+            payload_threats += np.bincount(chunk['payload_type'][threat], minlength=payload_count)
+        if method_count:
+            method_requests += np.bincount(chunk['detection_method'], minlength=method_count)
+            method_threats += np.bincount(chunk['detection_method'][threat], minlength=method_count)
+
+        if not has_latency:
+            continue
+
+        seconds = chunk['processing_time']
+        bins = latency_bins(seconds)
+        max_latency = max(max_latency, float(seconds.max(initial=0.0)))
+        latency['all'] += np.bincount(bins, minlength=LATENCY_BINS)
+
+        llm = chunk['api_called'] == 1
+        llm_calls += int(llm.sum())
+        latency['llm'] += np.bincount(bins[llm], minlength=LATENCY_BINS)
+        latency['cached'] += np.bincount(bins[chunk['detection_method'] == cached_code], minlength=LATENCY_BINS)
+
+        length_bins = np.minimum(np.log2(np.maximum(chunk['input_length'][llm], 1)).astype(np.int64), 31)
+        length_latency += np.bincount(length_bins * LATENCY_BINS + bins[llm],
+                                      minlength=32 * LATENCY_BINS).reshape(32, LATENCY_BINS)
+
+        in_window = bucket >= window_start
+        window_index = (bucket[in_window] - window_start) * LATENCY_BINS + bins[timed][in_window]
+        window_latency += np.bincount(window_index, minlength=window_size * LATENCY_BINS).reshape(window_size, LATENCY_BINS)
+
+    report = {
+        'rows': table['rows'],
+        'high_water_mark': table['high_water_mark'],
+        'first_timestamp': format_time(first),
+        'last_timestamp': format_time(last),
+        'threats': threats,
+        'threat_rate': threats / max(table['rows'], 1) * 100,
+        'distinct_ips': int(np.count_nonzero(ip_requests)),
+    }
+
+    window_percentiles = histogram_percentiles(window_latency, [50, 95]) if has_latency else None
+    report['time_buckets'] = [
+        {
+            'start': format_time(first + index * bucket_seconds),
+            'requests': int(requests_per_bucket[index]),
+            'requests_per_second': requests_per_bucket[index] / bucket_seconds,
+            'threats': int(threats_per_bucket[index]),
+            'threat_rate': threats_per_bucket[index] / max(requests_per_bucket[index], 1) * 100,
+            'p50': float(window_percentiles[index - window_start][0]) if has_latency else None,
+            'p95': float(window_percentiles[index - window_start][1]) if has_latency else None,
+        }
+        for index in range(window_start, bucket_total)
+    ]
+
+    if has_latency:
+        report['llm_calls'] = llm_calls
+        report['max_processing_time'] = max_latency
+        report['latency_percentiles'] = {
+            name: dict(zip([f'p{q:g}' for q in PERCENTILES], map(float, histogram_percentiles(counts))),
+                       count=int(counts.sum()))
+            for name, counts in latency.items()
+        }
+        length_counts = length_latency.sum(axis=1)
+        length_percentiles = histogram_percentiles(length_latency, [50, 95])
+        report['llm_latency_by_input_length'] = [
+            {'input_length': f'{2 ** index}-{2 ** (index + 1) - 1}', 'count': int(length_counts[index]),
+             'p50': float(length_percentiles[index][0]), 'p95': float(length_percentiles[index][1])}
+            for index in np.flatnonzero(length_counts)
+        ]
+
+    def by_label(name, requests, flagged):
+        labels = dictionaries.get(name, [])
+        order = np.argsort(-requests)
+        return [
+            {name: labels[code] or '(none)', 'requests': int(requests[code]), 'threats': int(flagged[code]),
+             'threat_rate': flagged[code] / max(requests[code], 1) * 100}
+            for code in order if requests[code]
+        ]
+
+    report['payload_types'] = by_label('payload_type', payload_requests, payload_threats)
+    if method_count:
+        report['detection_methods'] = by_label('detection_method', method_requests, method_threats)
+
+    if ip_count:
+        candidates = np.argpartition(-ip_threats, min(top, ip_count - 1))[:top] if ip_count > top else np.arange(ip_count)
+        offenders = candidates[np.argsort(-ip_threats[candidates])]
+        report['top_offenders'] = [
+            {'ip_address': dictionaries['ip_address'][code] or '(none)', 'threats': int(ip_threats[code]),
+             'requests': int(ip_requests[code]), 'threat_rate': ip_threats[code] / max(ip_requests[code], 1) * 100}
+            for code in offenders if ip_threats[code]
+        ]
+    return report
+
+
+def print_rows(title, rows, columns):
+    if not rows:
+        return
+    print(f"\n  {title}")
+    print('  ' + '  '.join(f'{label:>{width}}' for label, _, width, _ in columns))
+    for row in rows:
+        cells = []
+        for _, key, width, spec in columns:
+            value = row.get(key)
+            cells.append(f"{'-' if value is None or value != value else format(value, spec):>{width}}")
+        print('  ' + '  '.join(cells))
+
+
+def print_report(name: str, report: Dict):
+    print(f"\n{'=' * 70}\n{name}\n{'=' * 70}")
+    print(f"  rows {report['rows']:,} (high-water mark id {report['high_water_mark']}), "
+          f"{report['first_timestamp']} .. {report['last_timestamp']} UTC")
+    print(f"  threats {report['threats']:,} ({report['threat_rate']:.2f}%), distinct IPs {report['distinct_ips']:,}"
+          + (f", LLM calls {report['llm_calls']:,}" if 'llm_calls' in report else ''))
+
+    print_rows('Time buckets (latency percentiles in seconds)', report['time_buckets'], [
+        ('start', 'start', 19, ''), ('requests', 'requests', 10, ','), ('req/s', 'requests_per_second', 8, '.2f'),
+        ('threats', 'threats', 10, ','), ('threat%', 'threat_rate', 8, '.1f'), ('p50', 'p50', 8, '.3f'),
+        ('p95', 'p95', 8, '.3f')])
+
+    if 'latency_percentiles' in report:
+        rows = [dict(values, name=name) for name, values in report['latency_percentiles'].items()]
+        print_rows(f"Processing time percentiles in seconds (max {report['max_processing_time']:.3f})", rows,
+                   [('requests', 'name', 8, ''), ('count', 'count', 12, ',')]
+                   + [(f'p{q:g}', f'p{q:g}', 8, '.3f') for q in PERCENTILES])
+        print_rows('LLM latency by input length (chars)', report['llm_latency_by_input_length'], [
+            ('length', 'input_length', 12, ''), ('count', 'count', 12, ','), ('p50', 'p50', 8, '.3f'),
+            ('p95', 'p95', 8, '.3f')])
+
+    label_columns = [('requests', 'requests', 12, ','), ('threats', 'threats', 12, ','), ('threat%', 'threat_rate', 8, '.1f')]
+    print_rows('Verdicts by payload type', report['payload_types'], [('payload type', 'payload_type', 20, '')] + label_columns)
+    print_rows('Verdicts by detection method', report.get('detection_methods'),
+               [('method', 'detection_method', 28, '')] + label_columns)
+    print_rows('Top offenders', report.get('top_offenders'), [('ip address', 'ip_address', 20, '')] + label_columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Vectorized report over the columnar detection export')
+    parser.add_argument('--dir', default=str(ROOT / 'data' / 'columnar'), help='Export directory')
+    parser.add_argument('--bucket', type=int, default=3600, help='Time bucket width in seconds')
+    parser.add_argument('--buckets', type=int, default=24, help='Most recent buckets to show')
+    parser.add_argument('--top', type=int, default=10, help='Top-N offenders')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    reports = {}
+    for name in ('hybrid_detections', 'login_sessions'):
+        directory = Path(args.dir) / name
+        if (directory / 'manifest.json').exists():
+            reports[name] = analyze_table(load_table(directory), args.bucket, args.buckets, args.top)
+    elapsed = time.perf_counter() - start
+
+    if not reports:
+        print(f"No export found in {args.dir}; run tools/columnar_export.py first", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(dict(reports, elapsed_seconds=elapsed), indent=2, default=float))
+    else:
+        for name, report in reports.items():
+            print_report(name, report)
+        print(f"\nReport over {sum(r['rows'] for r in reports.values()):,} rows in {elapsed:.2f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Login Load Generator
+--------------------
+Open-loop load against the web application's POST /login, the full path:
+form parsing -> record_attempt -> threat detector (normalization, whitelist,
+LLM) -> both database writes. Finds the login rate the stack sustains.
+
+1. Traffic: a synthetic mix (benign logins plus --malicious-ratio of
+   payloads from WEB_APPLICATION_PAYLOADS.jsonl) or a replay of recorded
+   login_sessions rows, cycled in recorded order
+2. Open-loop scheduling: every request has an intended send time from the
+   target rate (Poisson or uniform arrivals), fixed before the run starts.
+   Latency is measured from that intended time, not from when a client got
+   round to sending, so a stalled server is charged for the requests it
+   held back (no coordinated omission)
+3. HDR-style latency histograms (log-linear buckets, ~1.6% precision,
+   fixed memory), optionally written as .hgrm percentile distributions
+4. A saturation curve across --rates: achieved throughput and latency per
+   target rate, and the highest rate that met --slo-ms at p99
+
+Runs against services that are already up (python3 start_all.py --stub-llm)
+or, with --spawn, starts the stub LLM, a detector and the web application
+under gunicorn itself with throwaway databases.
+
+Usage:
+    python3 tools/load_generator.py --spawn --rates 5 10 20 40 80 --duration 20
+    python3 tools/load_generator.py --target http://localhost:3000 --rates 10 --malicious-ratio 0.3
+    python3 tools/load_generator.py --source replay --db sqlite:///host-b-webapp/data/web_sessions.db --rates 5
+    python3 tools/load_generator.py --spawn --rates 20 40 --hgrm-dir data/hgrm --json
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import requests
+
+from service_harness import gunicorn_command, spawn, start_stub_llm, stop_processes, wait_healthy
+
+ROOT = Path(__file__).resolve().parent.parent
+WEBAPP_DIR = ROOT / 'host-b-webapp'
+DETECTOR_DIR = ROOT / 'host-c-detection'
+PAYLOADS_FILE = ROOT / 'WEB_APPLICATION_PAYLOADS.jsonl'
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'host-d-llm-stub'))
+
+from storage import open_storage  # noqa: E402
+from stub_llm import load_labelled_payloads  # noqa: E402
+
+REPORT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of microsecond values in fixed memory.
+
+    Values below 2 * SUB_BUCKETS are exact; above that each power-of-two
+    range is split into SUB_BUCKETS linear buckets, so every recorded value
+    is within 1 / SUB_BUCKETS of its bucket (64 -> ~1.6%).
+    """
+
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    MAX_VALUE_US = 3600 * 1000 * 1000  # one hour; larger values are clamped
+
+    def __init__(self):
+        self.counts = [0] * self.index(self.MAX_VALUE_US) + [0]
+        self.total = 0
+        self.sum = 0
+        self.sum_squares = 0
+        self.max = 0
+
+    def index(self, value: int) -> int:
+        shift = max(0, value.bit_length() - self.SUB_BUCKET_BITS - 1)
+        return shift * self.SUB_BUCKETS + (value >> shift)
+
+    def bucket_value(self, index: int) -> int:
+        """Highest value that lands in bucket index."""
+        shift = max(0, index // self.SUB_BUCKETS - 1)
+        return ((index - shift * self.SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        value = min(max(0, int(seconds * 1e6)), self.MAX_VALUE_US)
+        self.counts[self.index(value)] += 1
+        self.total += 1
+        self.sum += value
+        self.sum_squares += value * value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Value at percentile q, in seconds."""
+        if not self.total:
+            return 0.0
+        rank = max(1, math.ceil(q / 100.0 * self.total))
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_value(i), self.max) / 1e6
+        return self.max / 1e6
+
+    def mean(self) -> float:
+        return self.sum / self.total / 1e6 if self.total else 0.0
+
+    def stddev(self) -> float:
+        if not self.total:
+            return 0.0
+        mean = self.sum / self.total
+        return math.sqrt(max(0.0, self.sum_squares / self.total - mean * mean)) / 1e6
+
+    def to_hgrm(self, ticks_per_half: int = 5) -> str:
+        """Percentile distribution in HdrHistogram's text format (values in milliseconds)."""
+        lines = [f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}", '']
+        if self.total:
+            levels = [0.0]
+            half_distance = 50.0
+            while half_distance > 100.0 / self.total / 2 and half_distance > 1e-4:
+                start = 100.0 - 2 * half_distance
+                levels.extend(start + half_distance * i / ticks_per_half for i in range(1, ticks_per_half + 1))
+                half_distance /= 2
+            seen_counts = 0
+            cumulative = []
+            for i, count in enumerate(self.counts):
+                if count:
+                    seen_counts += count
+                    cumulative.append((self.bucket_value(i), seen_counts))
+            for level in sorted(set(levels)):
+                rank = max(1, math.ceil(level / 100.0 * self.total))
+                value, count = next(item for item in cumulative if item[1] >= rank)
+                inverse = f'{1 / (1 - level / 100.0):14.2f}' if level < 100 else ''
+                lines.append(f'{min(value, self.max) / 1000:12.3f} {level / 100.0:14.12f} {count:10d} {inverse}')
+            lines.append(f'{self.max / 1000:12.3f} {1.0:14.12f} {self.total:10d}')
+        lines.append(f'#[Mean    = {self.mean() * 1000:12.3f}, StdDeviation   = {self.stddev() * 1000:12.3f}]')
+        lines.append(f'#[Max     = {self.max / 1000:12.3f}, Total count    = {self.total:12d}]')
+        lines.append(f'#[Buckets = {len(self.counts) // self.SUB_BUCKETS:12d}, SubBuckets     = {self.SUB_BUCKETS:12d}]')
+        return '\n'.join(lines) + '\n'
+
+
+# Traffic sources
+
+def synthetic_logins(malicious_ratio: float, seed: int) -> Iterator[Tuple[str, str, bool]]:
+    """Endless (username, password, malicious) mix; benign usernames are unique, payloads repeat."""
+    payloads = [entry['payload'] for entry in load_labelled_payloads(str(PAYLOADS_FILE)) if entry.get('payload')]
+    rng = random.Random(seed)
+    sequence = 0
+    while True:
+        sequence += 1
+        if rng.random() < malicious_ratio:
+            payload = rng.choice(payloads)
+            if rng.random() < 0.5:
+                yield payload, f'pw{sequence}', True
+            else:
+                yield f'user{sequence}', payload, True
+        else:
+            yield f'user{sequence}', f'Passw0rd!{rng.randrange(10 ** 6)}', False
+
+
+def replayed_logins(db_url: str, limit: Optional[int]) -> Iterator[Tuple[str, str, Optional[bool]]]:
+    """Cycle through recorded login_sessions rows in recorded order."""
+    storage = open_storage('web_sessions.db', db_url)
+    try:
+        rows = storage.query(f"SELECT username, password, threat_detected FROM login_sessions ORDER BY id"
+                             f"{f' LIMIT {int(limit)}' if limit else ''}")
+    except Exception as e:
+        raise SystemExit(f"Cannot read login_sessions from {db_url.split('@')[-1]}: {e}")
+    finally:
+        storage.close()
+    rows = [(username, password, bool(threat)) for username, password, threat in rows if username and password]
+    if not rows:
+        raise SystemExit(f"No login_sessions rows to replay in {db_url.split('@')[-1]}")
+    while True:
+        yield from rows
+
+
+def arrival_offsets(rate: float, duration: float, arrivals: str, rng: random.Random) -> List[float]:
+    """Intended send times (seconds from start) for one run, fixed up front."""
+    if arrivals == 'uniform':
+        return [i / rate for i in range(int(rate * duration))]
+    offsets = []
+    t = rng.expovariate(rate)
+    while t < duration:
+        offsets.append(t)
+        t += rng.expovariate(rate)
+    return offsets
+
+
+# Load run
+
+def run_rate(url: str, logins: Iterator, rate: float, duration: float, arrivals: str, max_in_flight: int,
+             timeout: float, drain_timeout: float, seed: int) -> Dict:
+    """
+    Send logins at the target rate for duration seconds; latency runs from each intended send time.
+
+    Requests beyond max_in_flight wait in the executor queue, and that wait is
+    part of their latency. send_lag records how late requests actually left.
+    Logins not finished within drain_timeout of the last send are reported as
+    unfinished; queued ones are cancelled and in-flight ones (bounded by timeout)
+    are waited for, so none of them spill into the next rate's measurements.
+    """
+    offsets = arrival_offsets(rate, duration, arrivals, random.Random(seed))
+    histograms = {'all': LatencyHistogram(), 'benign': LatencyHistogram(), 'malicious': LatencyHistogram()}
+    send_lag = LatencyHistogram()
+    outcomes = {'ok': 0, 'http_errors': 0, 'failures': 0}
+    lock = threading.Lock()
+    sessions = threading.local()
+    closed = [False]
+
+    def send(intended: float, username: str, password: str, malicious: Optional[bool]):
+        if not hasattr(sessions, 'session'):
+            sessions.session = requests.Session()
+        lag = time.perf_counter() - intended
+        try:
+            status = sessions.session.post(url, data={'username': username, 'password': password},
+                                           timeout=timeout, allow_redirects=False).status_code
+            outcome = 'ok' if status == 200 else 'http_errors'
+        except requests.exceptions.RequestException:
+            outcome = 'failures'
+        latency = time.perf_counter() - intended
+        with lock:
+            if closed[0]:
+                return
+            send_lag.record(max(0.0, lag))
+            outcomes[outcome] += 1
+            if outcome == 'ok':
+                histograms['all'].record(latency)
+                histograms['malicious' if malicious else 'benign'].record(latency)
+
+    pool = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='login-load')
+    start = time.perf_counter() + 0.1
+    for offset in offsets:
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        username, password, malicious = next(logins)
+        pool.submit(send, intended, username, password, malicious)
+    sent_by = time.perf_counter()
+
+    # Wait for stragglers, then count whatever is still queued or in flight as unfinished
+    drain_deadline = time.perf_counter() + drain_timeout
+    while time.perf_counter() < drain_deadline:
+        with lock:
+            if sum(outcomes.values()) >= len(offsets):
+                break
+        time.sleep(0.05)
+    finished_at = time.perf_counter()
+    with lock:
+        done = dict(outcomes)
+        closed[0] = True
+
+    # Stragglers are already counted as unfinished; let them end before the next rate starts
+    pool.shutdown(wait=True, cancel_futures=True)
+    elapsed = max(finished_at - start, 1e-9)
+    return {
+        'target_rate': rate,
+        'scheduled': len(offsets),
+        'offered_rate': len(offsets) / max(sent_by - start, 1e-9),
+        'throughput': done['ok'] / elapsed,
+        'ok': done['ok'],
+        'http_errors': done['http_errors'],
+        'failures': done['failures'],
+        'unfinished': len(offsets) - sum(done.values()),
+        'elapsed': elapsed,
+        'latency': histograms['all'],
+        'latency_benign': histograms['benign'],
+        'latency_malicious': histograms['malicious'],
+        'send_lag': send_lag
+    }
+
+
+def summarize_latency(histogram: LatencyHistogram) -> Dict:
+    summary = {f'p{q:g}': histogram.percentile(q) for q in REPORT_PERCENTILES}
+    summary.update({'mean': histogram.mean(), 'max': histogram.max / 1e6, 'count': histogram.total})
+    return summary
+
+
+def meets_slo(result: Dict, slo: float) -> bool:
+    """A rate is sustained if nearly every login completed and p99 stayed within the SLO."""
+    completed = result['ok'] / result['scheduled'] if result['scheduled'] else 0.0
+    return completed >= 0.99 and result['latency'].percentile(99) <= slo
+
+
+# Local stack
+
+def start_stack(args, workdir: str) -> Tuple[str, List[subprocess.Popen]]:
+    """Start stub LLM, detector and web application under gunicorn; return the webapp URL and processes."""
+    llm_url = f'http://127.0.0.1:{args.llm_port}'
+    detector_url = f'http://127.0.0.1:{args.detector_port}'
+    webapp_url = f'http://127.0.0.1:{args.webapp_port}'
+    processes = []
+
+    def gunicorn(directory, module, port, extra_env):
+        env = {'DATA_DIR': os.path.join(workdir, directory.name), 'LOG_LEVEL': 'warning',
+               'WEB_CONCURRENCY': str(args.workers), 'WEB_THREADS': str(args.threads)}
+        env.update(extra_env)
+        return spawn(gunicorn_command(directory, module, port), env, workdir)
+
+    try:
+        processes.append(start_stub_llm(args.llm_port, args.llm_latency))
+        processes.append(gunicorn(DETECTOR_DIR, 'threat_detector:app', args.detector_port, {'OLLAMA_HOST': llm_url}))
+        wait_healthy(detector_url, processes[-1], 'Threat detector')
+        processes.append(gunicorn(WEBAPP_DIR, 'login_app:app', args.webapp_port,
+                                  {'THREAT_DETECTOR_URL': f'{detector_url}/analyze'}))
+        wait_healthy(webapp_url, processes[-1], 'Web application')
+    except Exception:
+        stop_processes(processes)
+        raise
+    return webapp_url, processes
+
+
+# Reporting
+
+def print_curve(results: List[Dict], slo: float):
+    print(f"\n{'target':>8} {'offered':>8} {'achieved':>9} {'ok':>7} {'errors':>7} {'unfin':>6}"
+          + ''.join(f"{f'p{q:g} ms':>10}" for q in REPORT_PERCENTILES) + f"{'max ms':>10} {'lag p99':>8}  SLO")
+    for result in results:
+        latency = result['latency']
+        print(f"{result['target_rate']:>8g} {result['offered_rate']:>8.1f} {result['throughput']:>9.1f} "
+              f"{result['ok']:>7} {result['http_errors'] + result['failures']:>7} {result['unfinished']:>6}"
+              + ''.join(f'{latency.percentile(q) * 1000:>10.1f}' for q in REPORT_PERCENTILES)
+              + f"{latency.percentile(100) * 1000:>10.1f} {result['send_lag'].percentile(99) * 1000:>7.1f}ms"
+              + f"  {'✅' if meets_slo(result, slo) else '❌'}")
+
+    sustained = [result['target_rate'] for result in results if meets_slo(result, slo)]
+    print(f"\nHighest rate meeting p99 <= {slo * 1000:.0f}ms with >= 99% completed: "
+          f"{f'{max(sustained):g} logins/s' if sustained else 'none of the tested rates'}")
+    if any(result['send_lag'].percentile(99) > 0.05 for result in results):
+        print("⚠️  Generator send lag p99 above 50ms: the client is a bottleneck too; "
+              "raise --max-in-flight or run it on another host")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Open-loop login load generator for the web application')
+    parser.add_argument('--target', default='http://localhost:3000', help='Web application base URL')
+    parser.add_argument('--rates', type=float, nargs='+', default=[5, 10, 20, 40], help='Target logins/second')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per target rate')
+    parser.add_argument('--arrivals', choices=['poisson', 'uniform'], default='poisson')
+    parser.add_argument('--source', choices=['synthetic', 'replay'], default='synthetic')
+    parser.add_argument('--malicious-ratio', type=float, default=0.2, help='Synthetic share of attack payloads')
+    parser.add_argument('--db', default=os.getenv('DATABASE_URL')
+                        or f"sqlite:///{WEBAPP_DIR / 'data' / 'web_sessions.db'}",
+                        help='Database holding login_sessions, for --source replay')
+    parser.add_argument('--replay-limit', type=int, default=None, help='Replay only the first N recorded logins')
+    parser.add_argument('--slo-ms', type=float, default=1000, help='p99 latency target for the saturation verdict')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='Concurrent client connections')
+    parser.add_argument('--timeout', type=float, default=30, help='Per-request timeout (seconds)')
+    parser.add_argument('--drain-timeout', type=float, default=30, help='Wait for in-flight logins after each rate')
+    parser.add_argument('--warmup', type=float, default=3, help='Unrecorded seconds at the lowest rate first')
+    parser.add_argument('--keep-going', action='store_true', help='Continue to higher rates after saturation')
+    parser.add_argument('--hgrm-dir', default=None, help='Write one .hgrm percentile distribution per rate')
+    parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+    parser.add_argument('--seed', type=int, default=0)
+    spawn_group = parser.add_argument_group('local stack (--spawn)')
+    spawn_group.add_argument('--spawn', action='store_true', help='Start stub LLM, detector and web application')
+    spawn_group.add_argument('--llm-latency', default='lognormal:50:0.5', help='Stub LLM latency spec')
+    spawn_group.add_argument('--workers', type=int, default=2, help='Gunicorn workers per service')
+    spawn_group.add_argument('--threads', type=int, default=8, help='Gunicorn threads per worker')
+    spawn_group.add_argument('--webapp-port', type=int, default=13000)
+    spawn_group.add_argument('--detector-port', type=int, default=18121)
+    spawn_group.add_argument('--llm-port', type=int, default=18465)
+    args = parser.parse_args()
+
+    if args.source == 'replay':
+        logins = replayed_logins(args.db, args.replay_limit)
+    else:
+        logins = synthetic_logins(args.malicious_ratio, args.seed)
+
+    processes = []
+    workdir = tempfile.mkdtemp(prefix='load_generator_')
+    target = args.target
+    if args.spawn:
+        target, processes = start_stack(args, workdir)
+        print(f"Local stack: web application {target}, stub LLM latency {args.llm_latency}, "
+              f"{args.workers} worker(s) x {args.threads} threads per service, databases in {workdir}")
+
+    results = []
+    try:
+        url = f"{target.rstrip('/')}/login"
+        if args.warmup > 0:
+            # Connection pools, lazy singletons and the detector cache fill up before anything is measured
+            run_rate(url, logins, min(args.rates), args.warmup, args.arrivals, args.max_in_flight,
+                     args.timeout, args.drain_timeout, args.seed - 1)
+        for i, rate in enumerate(sorted(args.rates)):
+            print(f"→ {rate:g} logins/s for {args.duration:g}s ({args.arrivals} arrivals, {args.source})", flush=True)
+            result = run_rate(url, logins, rate, args.duration, args.arrivals, args.max_in_flight,
+                              args.timeout, args.drain_timeout, args.seed + i)
+            results.append(result)
+            if args.hgrm_dir:
+                os.makedirs(args.hgrm_dir, exist_ok=True)
+                with open(os.path.join(args.hgrm_dir, f'login-{rate:g}rps.hgrm'), 'w') as f:
+                    f.write(result['latency'].to_hgrm())
+            if not meets_slo(result, args.slo_ms / 1000) and not args.keep_going:
+                print("   saturated; skipping higher rates (--keep-going to run them)")
+                break
+    finally:
+        stop_processes(processes)
+
+    if args.json:
+        print(json.dumps([
+            dict({key: value for key, value in result.items() if not isinstance(value, LatencyHistogram)},
+                 latency=summarize_latency(result['latency']),
+                 latency_benign=summarize_latency(result['latency_benign']),
+                 latency_malicious=summarize_latency(result['latency_malicious']),
+                 send_lag_p99=result['send_lag'].percentile(99),
+                 meets_slo=meets_slo(result, args.slo_ms / 1000))
+            for result in results
+        ], indent=2))
+    else:
+        print_curve(results, args.slo_ms / 1000)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
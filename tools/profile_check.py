@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Profiler Check
+--------------
+Starts the stub LLM and the threat detector and drives /analyze with a fixed
+concurrency in three modes:
+
+1. PROFILING_ENABLED=false (no hooks registered)
+2. PROFILING_ENABLED=true, idle (hooks registered, no capture running)
+3. A capture running (POST /admin/profile)
+
+Modes 1 and 2 run as two detectors side by side, measured in alternating
+rounds.
+
+It reports throughput for each mode and checks that the idle overhead is
+negligible, that the capture wrote a non-empty collapsed-stack file and a
+per-route wall/CPU breakdown, and that it stopped by itself. Exits non-zero
+if any check fails.
+
+Usage:
+    python3 tools/profile_check.py --duration 5 --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from service_harness import spawn, start_stub_llm, stop_processes, wait_healthy
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECTOR = ROOT / 'host-c-detection' / 'threat_detector.py'
+
+
+def drive(url, duration, concurrency):
+    """Send unique inputs from concurrency threads for duration seconds; return requests/second."""
+    stop_at = time.monotonic() + duration
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+    completed = [0]
+
+    def worker(_):
+        session = requests.Session()
+        while time.monotonic() < stop_at:
+            with lock:
+                i = next(counter)
+            session.post(f'{url}/analyze', json={'input': f'username: user{i}-{time.time()}, password: pw{i}'},
+                         timeout=30)
+            with lock:
+                completed[0] += 1
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    return completed[0] / (time.monotonic() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the sampling profiler and its overhead')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds of load per mode')
+    parser.add_argument('--rounds', type=int, default=3, help='Alternating rounds for the off/idle comparison')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+    parser.add_argument('--port', type=int, default=18111, help='First detector port (two are used)')
+    parser.add_argument('--llm-port', type=int, default=18455, help='Stub LLM port')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failures.append(message)
+
+    llm_url = f'http://127.0.0.1:{args.llm_port}'
+    workdir = tempfile.mkdtemp(prefix='profile_check_')
+    profile_dir = os.path.join(workdir, 'profiles')
+
+    stub = start_stub_llm(args.llm_port)
+    detectors = {}
+    rates = {'disabled': 0.0, 'enabled, idle': 0.0}
+    try:
+        # Both detectors run side by side and are measured in alternating rounds, best of each
+        # kept, so warm-up and drift in the shared stub affect both modes alike
+        for offset, (mode, enabled) in enumerate((('disabled', 'false'), ('enabled, idle', 'true'))):
+            port = args.port + offset
+            detectors[mode] = (f'http://127.0.0.1:{port}', spawn([sys.executable, str(DETECTOR)], {
+                'PORT': str(port), 'OLLAMA_HOST': llm_url, 'DATA_DIR': os.path.join(workdir, enabled),
+                'PROFILING_ENABLED': enabled, 'PROFILE_DIR': profile_dir, 'LLM_MAX_CONCURRENCY': '64'
+            }, str(ROOT / 'host-c-detection')))
+        for mode, (mode_url, process) in detectors.items():
+            wait_healthy(mode_url, process, f'Detector ({mode})')
+            drive(mode_url, 1, args.concurrency)  # warm up
+        for _ in range(args.rounds):
+            for mode, (mode_url, _) in detectors.items():
+                rates[mode] = max(rates[mode], drive(mode_url, args.duration / args.rounds, args.concurrency))
+
+        url = detectors['enabled, idle'][0]
+        check(requests.get(f'{url}/admin/profile', timeout=5).json()['active'] is False, "profiler idle until started")
+        response = requests.post(f'{url}/admin/profile', json={'seconds': args.duration + 1}, timeout=5)
+        check(response.status_code == 202, f"POST /admin/profile started a capture (HTTP {response.status_code})")
+        check(requests.post(f'{url}/admin/profile', json={'seconds': 1}, timeout=5).status_code == 409,
+              "a second capture is refused while one runs")
+        rates['capturing'] = drive(url, args.duration, args.concurrency)
+
+        deadline = time.time() + 10
+        status = requests.get(f'{url}/admin/profile', timeout=5).json()
+        while status['active'] and time.time() < deadline:
+            time.sleep(0.2)
+            status = requests.get(f'{url}/admin/profile', timeout=5).json()
+        capture = status['last_capture'] or {}
+        check(not status['active'] and capture.get('files'), "capture stopped by itself and wrote its files")
+
+        for mode, rate in rates.items():
+            print(f"   {mode:<15} {rate:8.1f} req/s")
+        idle_overhead = (1 - rates['enabled, idle'] / rates['disabled']) * 100
+        check(idle_overhead < 5, f"idle overhead {idle_overhead:.1f}% < 5%")
+        print(f"   capture: {capture.get('samples')} samples, {capture.get('distinct_stacks')} stacks, "
+              f"sampler overhead {capture.get('sampler_overhead', 0):.2f}% of wall time")
+
+        if capture.get('files'):
+            collapsed, routes_file = capture['files']
+            with open(collapsed) as f:
+                lines = f.read().splitlines()
+            check(lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines),
+                  f"collapsed stacks: {len(lines)} lines")
+            check(any(line.startswith('POST /analyze;') for line in lines), "stacks are rooted at the route")
+            with open(routes_file) as f:
+                routes = json.load(f)['routes']
+            analyze = routes.get('POST /analyze', {})
+            check(analyze.get('requests', 0) > 0, f"route breakdown for POST /analyze: {analyze}")
+            hottest = sorted(((int(line.rsplit(' ', 1)[1]), line.rsplit(' ', 1)[0].split(';')[-1]) for line in lines),
+                             reverse=True)[:5]
+            print("   hottest leaf frames:", ', '.join(f'{frame} ({count})' for count, frame in hottest))
+    finally:
+        stop_processes([stub] + [process for _, process in detectors.values()])
+
+    print(f"\n{'All checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
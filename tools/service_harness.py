@@ -0,0 +1,78 @@
+"""
+Service Harness for Tools
+-------------------------
+Starting and stopping local services, shared by the check and benchmark
+scripts in tools/:
+
+1. spawn: run a service with extra environment variables, output discarded
+2. wait_healthy: poll <url>/health until it answers 200, failing fast if
+   the process exits first
+3. start_stub_llm / gunicorn_command: the stub Ollama server and the
+   gunicorn command line for either service
+4. stop_processes: terminate, then kill anything that doesn't exit in time
+"""
+
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+STUB_LLM = ROOT / 'host-d-llm-stub' / 'stub_llm.py'
+
+
+def spawn(command: List[str], env: Optional[Dict[str, str]] = None, cwd=None) -> subprocess.Popen:
+    """Start a process with os.environ plus env, discarding its output."""
+    return subprocess.Popen(command, env=dict(os.environ, **(env or {})), cwd=cwd,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_healthy(url: str, process: Optional[subprocess.Popen] = None, name: Optional[str] = None,
+                 timeout: float = 30):
+    """Poll url/health until it answers 200. On failure the process is killed and RuntimeError raised."""
+    name = name or url
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'{name} exited with code {process.returncode}')
+        try:
+            if requests.get(f'{url}/health', timeout=1).status_code == 200:
+                return
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.1)
+
+    if process is not None:
+        process.kill()
+    raise RuntimeError(f'{name} did not become healthy')
+
+
+def start_stub_llm(port: int, latency: str = 'fixed:5', *extra_args: str) -> subprocess.Popen:
+    """Start the stub Ollama server on 127.0.0.1:port (latency is a stub_llm.py spec) and wait for it."""
+    process = spawn([sys.executable, str(STUB_LLM), '--host', '127.0.0.1', '--port', str(port),
+                     '--latency', latency, *extra_args], cwd=str(ROOT))
+    wait_healthy(f'http://127.0.0.1:{port}', process, 'Stub LLM')
+    return process
+
+
+def gunicorn_command(directory: Path, module: str, port: int) -> List[str]:
+    """gunicorn command line for a service directory using its gunicorn.conf.py."""
+    return [sys.executable, '-m', 'gunicorn', '-c', str(directory / 'gunicorn.conf.py'),
+            '--pythonpath', str(directory), '--bind', f'127.0.0.1:{port}', module]
+
+
+def stop_processes(processes: Iterable[subprocess.Popen], timeout: float = 15):
+    """Terminate every process, then kill those still running after timeout seconds."""
+    processes = list(processes)
+    for process in reversed(processes):
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Shadow Evaluation Check
+-----------------------
+Starts the stub LLM and one threat detector with shadow mode on, sends a
+mix of labelled payloads and benign logins to /analyze, and checks that:
+
+1. Every LLM-analysed input gets a shadow evaluation recorded
+2. The recorded disagreement rate matches the candidate's injected flip rate
+3. Candidate latency is measured separately and never adds to /analyze latency
+4. Token counts are recorded, so tools/shadow_report.py can price verdicts
+
+The stub is given a slower, less accurate candidate model
+(--model-latency / --model-flip-rate). Exits non-zero if any check fails.
+
+Usage:
+    python3 tools/shadow_check.py --inputs 200 --flip-rate 0.2
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from service_harness import spawn, start_stub_llm, stop_processes, wait_healthy
+
+ROOT = Path(__file__).resolve().parent.parent
+DETECTOR = ROOT / 'host-c-detection' / 'threat_detector.py'
+PAYLOADS_FILE = ROOT / 'WEB_APPLICATION_PAYLOADS.jsonl'
+sys.path.insert(0, str(ROOT / 'host-d-llm-stub'))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from shadow_report import load_summaries, print_summaries  # noqa: E402
+from stub_llm import load_labelled_payloads  # noqa: E402
+
+CANDIDATE_MODEL = 'candidate:7b'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check shadow model evaluation against the stub LLM')
+    parser.add_argument('--inputs', type=int, default=200, help='Distinct inputs to analyse')
+    parser.add_argument('--flip-rate', type=float, default=0.2, help="Candidate's injected wrong-verdict rate")
+    parser.add_argument('--primary-latency-ms', type=int, default=10)
+    parser.add_argument('--candidate-latency-ms', type=int, default=200)
+    parser.add_argument('--port', type=int, default=18101, help='Detector port')
+    parser.add_argument('--llm-port', type=int, default=18445, help='Stub LLM port')
+    args = parser.parse_args()
+
+    failures = []
+
+    def check(condition, message):
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            failures.append(message)
+
+    llm_url = f'http://127.0.0.1:{args.llm_port}'
+    detector_url = f'http://127.0.0.1:{args.port}'
+    workdir = tempfile.mkdtemp(prefix='shadow_check_')
+
+    payloads = [entry['payload'] for entry in load_labelled_payloads(str(PAYLOADS_FILE)) if entry.get('payload')]
+    rng = random.Random(0)
+    inputs = [
+        f"username: {rng.choice(payloads) if i % 2 else f'user{i}'}, password: pw{i}"
+        for i in range(args.inputs)
+    ]
+
+    stub = start_stub_llm(args.llm_port, f'fixed:{args.primary_latency_ms}',
+                          '--model-latency', f'{CANDIDATE_MODEL}=fixed:{args.candidate_latency_ms}',
+                          '--model-flip-rate', f'{CANDIDATE_MODEL}={args.flip_rate}')
+    detector = None
+    try:
+        detector = spawn([sys.executable, str(DETECTOR)], {
+            'PORT': str(args.port), 'OLLAMA_HOST': llm_url, 'DATA_DIR': workdir,
+            'SHADOW_FRACTION': '1.0', 'SHADOW_MODEL': CANDIDATE_MODEL, 'SHADOW_PROMPT_VARIANT': 'strict',
+            'SHADOW_MAX_PENDING': str(args.inputs)
+        }, str(ROOT / 'host-c-detection'))
+        wait_healthy(detector_url, detector, 'Threat detector')
+
+        latencies = []
+        session = requests.Session()
+        for text in inputs:
+            start = time.perf_counter()
+            session.post(f'{detector_url}/analyze', json={'input': text}, timeout=30).raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        deadline = time.time() + 30 + args.inputs * args.candidate_latency_ms / 1000
+        while time.time() < deadline:
+            shadow = session.get(f'{detector_url}/stats', timeout=10).json()['shadow']
+            if shadow['pending'] == 0 and shadow['completed'] >= shadow['sampled'] - shadow['dropped_backlog'] - shadow['dropped_busy']:
+                break
+            time.sleep(0.2)
+
+        print(f"shadow stats: {shadow}")
+        check(shadow['sampled'] == args.inputs, f"every LLM-analysed input sampled: {shadow['sampled']}/{args.inputs}")
+        check(shadow['completed'] == args.inputs, f"every sample evaluated: {shadow['completed']}/{args.inputs}")
+
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        check(p95 < args.candidate_latency_ms / 1000,
+              f"/analyze p95 {p95 * 1000:.1f}ms stays below candidate latency {args.candidate_latency_ms}ms")
+
+        summaries = load_summaries(f"sqlite:///{os.path.join(workdir, 'regex_analytics.db')}", {CANDIDATE_MODEL: 0.001})
+        print_summaries(summaries)
+        check(len(summaries) == 1 and summaries[0]['evaluations'] == args.inputs,
+              f"{args.inputs} evaluations recorded for one candidate")
+        if summaries:
+            summary = summaries[0]
+            disagreement = 100 - summary['agreement_rate']
+            expected = args.flip_rate * 100
+            check(abs(disagreement - expected) <= max(5.0, expected * 0.5),
+                  f"disagreement {disagreement:.1f}% matches injected flip rate {expected:.0f}%")
+            check(summary['candidate_latency']['p50'] >= args.candidate_latency_ms / 1000 > summary['primary_latency']['p50'],
+                  f"candidate p50 {summary['candidate_latency']['p50']:.3f}s vs primary p50 {summary['primary_latency']['p50']:.3f}s")
+            check(summary['candidate_cost_per_verdict'] is not None and summary['candidate_tokens_per_verdict'] > 0,
+                  f"candidate tokens per verdict {summary['candidate_tokens_per_verdict']}")
+    finally:
+        stop_processes([process for process in (stub, detector) if process])
+
+    print(f"\n{'All checks passed' if not failures else f'{len(failures)} check(s) failed'}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Shadow Evaluation Report
+------------------------
+Compares the primary LLM configuration with each shadowed candidate
+(model + prompt variant) recorded in the threat detector's
+shadow_evaluations table (see host-c-detection/shadow.py):
+
+1. Agreement rate, and which way the disagreements go (candidate missed a
+   primary YES, or flagged a primary NO)
+2. Latency percentiles for primary and candidate on the same inputs
+3. Tokens and, with --price, cost per verdict
+
+Usage:
+    python3 tools/shadow_report.py
+    python3 tools/shadow_report.py --db sqlite:///host-c-detection/data/regex_analytics.db --price codellama:13b=0.0004
+    python3 tools/shadow_report.py --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from storage import open_storage  # noqa: E402
+
+PERCENTILES = [50, 90, 95, 99]
+
+EVALUATIONS_QUERY = '''
+    SELECT primary_model, primary_prompt, candidate_model, candidate_prompt,
+           primary_verdict, candidate_verdict, agreed, primary_latency, candidate_latency,
+           primary_prompt_tokens, primary_completion_tokens,
+           candidate_prompt_tokens, candidate_completion_tokens
+    FROM shadow_evaluations
+    WHERE id > ?
+    ORDER BY id
+'''
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(q / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def tokens_per_verdict(rows, prompt_index, completion_index) -> Optional[float]:
+    counted = [(row[prompt_index] or 0) + (row[completion_index] or 0) for row in rows
+               if row[prompt_index] is not None or row[completion_index] is not None]
+    return sum(counted) / len(counted) if counted else None
+
+
+def summarize(rows: List, prices: Dict[str, float]) -> List[Dict]:
+    """Group evaluations by (primary, candidate) configuration and compare them."""
+    groups: Dict[tuple, List] = {}
+    for row in rows:
+        groups.setdefault(tuple(row[:4]), []).append(row)
+
+    summaries = []
+    for (primary_model, primary_prompt, candidate_model, candidate_prompt), group in groups.items():
+        compared = [row for row in group if row[6] is not None]
+        agreed = sum(1 for row in compared if row[6])
+        primary_latency = sorted(row[7] for row in group if row[7] is not None)
+        candidate_latency = sorted(row[8] for row in group if row[8] is not None)
+        primary_tokens = tokens_per_verdict(group, 9, 10)
+        candidate_tokens = tokens_per_verdict(group, 11, 12)
+
+        def cost(model, tokens):
+            return tokens / 1000.0 * prices[model] if tokens is not None and model in prices else None
+
+        summaries.append({
+            'primary': f'{primary_model} / {primary_prompt}',
+            'candidate': f'{candidate_model} / {candidate_prompt}',
+            'evaluations': len(group),
+            'candidate_errors': len(group) - len(compared),
+            'agreement_rate': agreed / len(compared) * 100 if compared else None,
+            'candidate_missed': sum(1 for row in compared if row[4] and not row[5]),
+            'candidate_extra_flags': sum(1 for row in compared if not row[4] and row[5]),
+            'primary_latency': {f'p{q}': percentile(primary_latency, q) for q in PERCENTILES},
+            'candidate_latency': {f'p{q}': percentile(candidate_latency, q) for q in PERCENTILES},
+            'primary_tokens_per_verdict': primary_tokens,
+            'candidate_tokens_per_verdict': candidate_tokens,
+            'primary_cost_per_verdict': cost(primary_model, primary_tokens),
+            'candidate_cost_per_verdict': cost(candidate_model, candidate_tokens),
+        })
+    return summaries
+
+
+def load_summaries(db_url: str, prices: Dict[str, float], after_id: int = 0) -> List[Dict]:
+    storage = open_storage('regex_analytics.db', db_url)
+    try:
+        rows = storage.query(EVALUATIONS_QUERY, (after_id,))
+    except Exception as e:
+        raise SystemExit(f"Cannot read shadow_evaluations from {db_url.split('@')[-1]}: {e}")
+    finally:
+        storage.close()
+    return summarize(rows, prices)
+
+
+def fmt(value, spec='.3f'):
+    return '-' if value is None else format(value, spec)
+
+
+def print_summaries(summaries: List[Dict]):
+    if not summaries:
+        print("No shadow evaluations recorded (set SHADOW_FRACTION and SHADOW_MODEL/SHADOW_PROMPT_VARIANT)")
+        return
+
+    for summary in summaries:
+        print(f"\n{summary['primary']}  vs  {summary['candidate']}")
+        print(f"  evaluations {summary['evaluations']}, candidate errors {summary['candidate_errors']}")
+        print(f"  agreement {fmt(summary['agreement_rate'], '.2f')}%  "
+              f"(candidate missed {summary['candidate_missed']} primary YES, "
+              f"flagged {summary['candidate_extra_flags']} primary NO)")
+        print(f"  {'latency (s)':<12}" + ''.join(f'{f"p{q}":>9}' for q in PERCENTILES)
+              + f"{'tokens':>9}{'cost':>11}")
+        for role in ('primary', 'candidate'):
+            print(f"  {role:<12}" + ''.join(f"{fmt(summary[f'{role}_latency'][f'p{q}']):>9}" for q in PERCENTILES)
+                  + f"{fmt(summary[f'{role}_tokens_per_verdict'], '.1f'):>9}"
+                  + f"{fmt(summary[f'{role}_cost_per_verdict'], '.6f'):>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare primary and shadow candidate LLM verdicts')
+    parser.add_argument('--db', default=os.getenv('DATABASE_URL')
+                        or f"sqlite:///{ROOT / 'host-c-detection' / 'data' / 'regex_analytics.db'}",
+                        help='Threat detector database URL')
+    parser.add_argument('--price', action='append', default=[], metavar='MODEL=USD_PER_1K_TOKENS',
+                        help='Token price for cost per verdict (repeatable)')
+    parser.add_argument('--after-id', type=int, default=0, help='Only evaluations with a larger id')
+    parser.add_argument('--json', action='store_true', help='Print the summaries as JSON')
+    args = parser.parse_args()
+
+    prices = {}
+    for option in args.price:
+        model, _, price = option.rpartition('=')
+        prices[model] = float(price)
+
+    summaries = load_summaries(args.db, prices, args.after_id)
+    if args.json:
+        print(json.dumps(summaries, indent=2))
+    else:
+        print_summaries(summaries)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Input Size Limit Stress Check
+-----------------------------
+Sends huge and deeply nested bodies to /analyze (threat detector) and /login
+(web application) through Flask's in-process test clients, and reports the
+latency and peak Python memory allocated per request.
+
+Each case must finish under --max-latency seconds and allocate less than
+--max-memory-mb, no matter how large the payload is. The script exits
+non-zero if any case goes over budget.
+
+Usage:
+    python3 tools/stress_input_limits.py
+    python3 tools/stress_input_limits.py --max-latency 0.5 --max-memory-mb 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from werkzeug.test import EnvironBuilder
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def load_apps():
+    """Import both services with an unreachable LLM host so nothing leaves the machine."""
+    os.environ.setdefault('OLLAMA_HOST', 'http://127.0.0.1:9')
+    os.chdir(tempfile.mkdtemp(prefix='stress_limits_'))
+    sys.path.insert(0, str(ROOT / 'host-c-detection'))
+    sys.path.insert(0, str(ROOT / 'host-b-webapp'))
+
+    import threat_detector
+    import login_app
+    login_app.app.template_folder = str(ROOT / 'host-b-webapp' / 'templates')
+    return threat_detector, login_app
+
+
+def measure(client, environ):
+    """Replay a pre-built WSGI environ and return (status_code, latency_seconds, peak_mb)."""
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    response = client.open(environ)
+    latency = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return response.status_code, latency, peak / (1024 * 1024)
+
+
+def warm_up(threat_detector, login_app):
+    """Send one ordinary request to each service, so one-off setup (analyzer, telemetry, database) isn't measured."""
+    threat_detector.app.test_client().post('/analyze', json={'input': 'username: AAA, password: Aston1'})
+    login_app.app.test_client().post('/login', data={'username': 'AAA', 'password': 'Aston1'})
+
+
+def build_cases(threat_detector, login_app):
+    """Return (name, expected_status, client, environ) tuples.
+
+    Request bodies are encoded here, outside measure(), so the reported peak
+    only covers what the service allocates while handling the request.
+    """
+    detector = threat_detector.app.test_client()
+    webapp = login_app.app.test_client()
+
+    over_input = 'A' * (threat_detector.MAX_INPUT_CHARS + 100)
+    # Fills most of the body cap, far past MAX_INPUT_CHARS
+    pathological = "' OR 1=1 -- " * (threat_detector.MAX_REQUEST_BYTES // 16)
+    ten_mb = json.dumps({'input': 'x' * (10 * 1024 * 1024)})
+    nested = '[' * (threat_detector.MAX_REQUEST_BYTES - 1)
+    nested_small = '{"input": ' + '[' * 5000 + ']' * 5000 + '}'
+    login_ten_mb = {'username': 'admin', 'password': 'p' * (10 * 1024 * 1024)}
+    login_long = {'username': 'u' * (login_app.MAX_FIELD_CHARS * 4), 'password': 'secret'}
+
+    expected_oversized = 413 if threat_detector.OVERSIZED_INPUT_STRATEGY == 'reject' else 200
+
+    def post_detector(body):
+        builder = EnvironBuilder(path='/analyze', method='POST', data=body, content_type='application/json')
+        return detector, builder.get_environ()
+
+    def post_login(form):
+        builder = EnvironBuilder(path='/login', method='POST', data=form)
+        return webapp, builder.get_environ()
+
+    return [
+        ('analyze: 10 MB input', 413, *post_detector(ten_mb)),
+        ('analyze: pathological input under body cap', expected_oversized, *post_detector(json.dumps({'input': pathological}))),
+        ('analyze: input just over MAX_INPUT_CHARS', expected_oversized, *post_detector(json.dumps({'input': over_input}))),
+        ('analyze: nesting filling body cap', 400, *post_detector(nested)),
+        ('analyze: 5000-deep nested input', 400, *post_detector(nested_small)),
+        ('login: 10 MB password', 302, *post_login(login_ten_mb)),
+        ('login: oversized username', 200, *post_login(login_long)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stress /analyze and /login with oversized bodies')
+    parser.add_argument('--max-latency', type=float, default=2.0, help='Per-request latency budget (seconds)')
+    parser.add_argument('--max-memory-mb', type=float, default=16.0, help='Per-request peak allocation budget (MB)')
+    args = parser.parse_args()
+
+    threat_detector, login_app = load_apps()
+    warm_up(threat_detector, login_app)
+    failures = 0
+
+    print(f"{'case':<46} {'status':>6} {'latency':>10} {'peak MB':>9}")
+    for name, expected_status, client, environ in build_cases(threat_detector, login_app):
+        status, latency, peak_mb = measure(client, environ)
+        ok = status == expected_status and latency <= args.max_latency and peak_mb <= args.max_memory_mb
+        failures += 0 if ok else 1
+        flag = 'ok' if ok else f'FAIL (expected {expected_status})'
+        print(f"{name:<46} {status:>6} {latency * 1000:>8.1f}ms {peak_mb:>9.2f}  {flag}")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())